@@ -1,13 +1,19 @@
+import argparse
 import os
+import sys
 
-from app.web.app import setup_app
-from aiohttp.web import run_app
+from app.web.config import setup_app_config
+from app.web.workers import serve
 
 if __name__ == "__main__":
-    run_app(
-        setup_app(
-            config_path=os.path.join(
-                os.path.dirname(os.path.realpath(__file__)), "config.yml"
-            )
-        )
-    )
+    config_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.yml")
+    app_config = setup_app_config(config_path)
+    parser = argparse.ArgumentParser(description="MP3 converter web service")
+    parser.add_argument("--host", default=app_config.host)
+    parser.add_argument("--port", type=int, default=app_config.port)
+    parser.add_argument("--workers", type=int, default=app_config.workers,
+                        help="Количество процессов веб-сервиса")
+    parser.add_argument("--shutdown-timeout", type=float, default=app_config.shutdown_timeout,
+                        help="Время ожидания завершения текущих запросов при остановке в секундах")
+    args = parser.parse_args()
+    sys.exit(serve(config_path, args.workers, args.host, args.port, args.shutdown_timeout))
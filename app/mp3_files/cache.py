@@ -0,0 +1,128 @@
+import asyncio
+import sys
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+from app.mp3_files.models import Mp3FileModel
+from app.store.cache import TTLCache
+from app.web.stats import CacheStats, register_stats
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.database.database import Database
+    from app.web.config import Config
+
+
+# Примерный размер записи кэша без учета строк: ключ, кортеж записи, экземпляр RecordMeta.
+_ENTRY_OVERHEAD = 400
+
+
+@dataclass(frozen=True)
+class RecordMeta:
+    """
+    Класс, содержащий данные mp3 файла, необходимые для его скачивания.
+    Args:
+        file_path: путь к файлу в файловом хранилище.
+        filename: имя файла.
+        size: размер файла в байтах.
+        etag: значение заголовка ETag для файла.
+    """
+    file_path: str
+    filename: str
+    size: Optional[int]
+    etag: Optional[str]
+
+    @classmethod
+    def from_model(cls, mp3_model: Mp3FileModel) -> "RecordMeta":
+        return cls(file_path=mp3_model.file_path, filename=mp3_model.filename,
+                   size=mp3_model.size, etag=mp3_model.etag)
+
+
+def _record_cost(meta: Optional[RecordMeta]) -> int:
+    if meta is None:
+        return _ENTRY_OVERHEAD
+    return _ENTRY_OVERHEAD + sys.getsizeof(meta.file_path) + sys.getsizeof(meta.filename) + \
+        sys.getsizeof(meta.etag)
+
+
+class RecordCache:
+    """
+    Кэш данных mp3 файлов для конечной точки /files.record с чтением из базы данных при промахе.
+    Записи в таблице "mp3_files" не изменяются после добавления, поэтому данные хранятся до вытеснения
+    или удаления записи. Одновременные промахи по одному ключу выполняют один запрос к базе данных.
+    Ненайденные записи не кэшируются, так как запись с таким идентификатором может быть добавлена позже.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        cache: Кэш, ключом которого является пара (user_id, record_id).
+    """
+
+    def __init__(self, app: "Application", cache: TTLCache[RecordMeta]):
+        self.app = app
+        self.cache = cache
+        self._pending: Dict[Tuple[int, int], "asyncio.Future[Optional[RecordMeta]]"] = {}
+
+    @property
+    def database(self) -> "Database":
+        return self.app["database"]
+
+    async def get(self, user_id: int, record_id: int) -> Optional[RecordMeta]:
+        """
+        Возвращает данные mp3 файла пользователя или None, если запись не существует.
+        """
+        key = (user_id, record_id)
+        found, meta = self.cache.get(key)
+        if found:
+            return meta
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(user_id, record_id))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Запрос к базе данных выполняется отдельной задачей и не отменяется,
+        # если клиент, вызвавший промах, отключился раньше остальных.
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: int, record_id: int) -> Optional[RecordMeta]:
+        mp3_model = await Mp3FileModel.get_mp3_by_user(self.database, user_id, record_id)
+        if not mp3_model:
+            return None
+        meta = RecordMeta.from_model(mp3_model)
+        key = (user_id, record_id)
+        # Если запись была удалена, пока выполнялся запрос, результат не кэшируется.
+        if self._pending.get(key) is asyncio.current_task():
+            self.cache.set(key, meta)
+        return meta
+
+    def _forget(self, key: Tuple[int, int], task: "asyncio.Future[Optional[RecordMeta]]") -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+    def invalidate(self, user_id: int, record_id: int) -> None:
+        """
+        Удаляет запись из кэша.
+        """
+        self.cache.invalidate((user_id, record_id))
+        self._pending.pop((user_id, record_id), None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Удаляет из кэша все записи пользователя.
+        """
+        self.cache.invalidate_where(lambda key, _: key[0] == user_id)
+        for key in [key for key in self._pending if key[0] == user_id]:
+            del self._pending[key]
+
+
+def setup_record_cache(app: "Application"):
+    """
+    Устанавливает экземпляр класса RecordCache для текущего экземпляра приложения.
+    """
+    config: "Config" = app["config"]
+    stats = register_stats(app, "records", CacheStats())
+    cache: TTLCache[RecordMeta] = TTLCache(max_size=config.cache.record_max_size,
+                                           ttl=config.cache.record_ttl,
+                                           stats=stats,
+                                           max_cost=config.cache.record_max_bytes,
+                                           cost=_record_cost)
+    app["record_cache"] = RecordCache(app, cache)
@@ -0,0 +1,195 @@
+import logging
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from aiohttp.web import StreamResponse
+    from app.mp3_files.models import Mp3FileModel
+    from app.store.storage import StorageBackend
+
+
+logger = logging.getLogger(__name__)
+
+# Максимальное значение 4-байтовых полей ZIP. Большие значения записываются в расширение ZIP64.
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+# Бит 3 - CRC-32 и размеры записываются после данных (data descriptor), бит 11 - имя файла в UTF-8.
+_FLAGS = 0x0008 | 0x0800
+_VERSION = 20
+_VERSION_ZIP64 = 45
+# Версия 4.5, файлы созданы в Unix, права доступа 0644.
+_VERSION_MADE_BY = (3 << 8) | _VERSION_ZIP64
+_EXTERNAL_ATTR = 0o100644 << 16
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_DATA_DESCRIPTOR_ZIP64 = struct.Struct("<IIQQ")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+_ZIP64_END_OF_CENTRAL_DIR = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_LOCATOR = struct.Struct("<IIQI")
+
+
+@dataclass
+class ZipEntry:
+    """
+    Класс, содержащий данные файла в архиве, необходимые для центрального каталога.
+    Args:
+        name: имя файла в архиве в кодировке UTF-8.
+        offset: смещение локального заголовка файла от начала архива.
+        dos_time: время изменения файла в формате MS-DOS.
+        dos_date: дата изменения файла в формате MS-DOS.
+        zip64: размеры файла в data descriptor записаны в формате ZIP64.
+        crc: CRC-32 содержимого файла.
+        size: размер файла в байтах.
+    """
+    name: bytes
+    offset: int
+    dos_time: int
+    dos_date: int
+    zip64: bool
+    crc: int = 0
+    size: int = 0
+
+
+class ZipStream:
+    """
+    Класс, формирующий ZIP архив без сжатия (store) последовательно, без перемещения по уже записанным данным.
+    CRC-32 и размер файла записываются после его содержимого (data descriptor), поэтому архив можно
+    отправлять клиенту по мере чтения файлов. Для архивов и файлов больше 4 Гб используется формат ZIP64.
+    Методы возвращают байты, которые нужно записать в архив, и учитывают их в текущем смещении.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self._entries: List[ZipEntry] = []
+
+    def start_entry(self, name: str, modified: datetime, size_hint: int) -> bytes:
+        """
+        Возвращает локальный заголовок файла.
+
+        Args:
+            name: имя файла в архиве.
+            modified: время изменения файла.
+            size_hint: ожидаемый размер файла. Если он не помещается в 4 байта, используется ZIP64.
+        """
+        dos_time, dos_date = _dos_date_time(modified)
+        entry = ZipEntry(name=name.encode("utf-8"), offset=self.offset, dos_time=dos_time, dos_date=dos_date,
+                         zip64=size_hint >= ZIP64_LIMIT)
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if entry.zip64 else b""
+        header = _LOCAL_HEADER.pack(0x04034B50, _VERSION_ZIP64 if entry.zip64 else _VERSION, _FLAGS, 0,
+                                    entry.dos_time, entry.dos_date, 0, 0, 0, len(entry.name), len(extra))
+        self._entries.append(entry)
+        return self._advance(header + entry.name + extra)
+
+    def end_entry(self, crc: int, size: int) -> bytes:
+        """
+        Возвращает data descriptor текущего файла после того, как было записано size байт его содержимого.
+        """
+        entry = self._entries[-1]
+        entry.crc, entry.size = crc, size
+        self.offset += size
+        if entry.zip64:
+            return self._advance(_DATA_DESCRIPTOR_ZIP64.pack(0x08074B50, crc, size, size))
+        return self._advance(_DATA_DESCRIPTOR.pack(0x08074B50, crc, size, size))
+
+    def finish(self) -> bytes:
+        """
+        Возвращает центральный каталог и запись о конце центрального каталога.
+        """
+        start = self.offset
+        records = [self._central_header(entry) for entry in self._entries]
+        directory = b"".join(records)
+        self._advance(directory)
+        count = len(self._entries)
+        size = len(directory)
+        end = b""
+        if count >= ZIP_FILECOUNT_LIMIT or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+            zip64_end_offset = self.offset
+            end += _ZIP64_END_OF_CENTRAL_DIR.pack(0x06064B50, _ZIP64_END_OF_CENTRAL_DIR.size - 12,
+                                                  _VERSION_MADE_BY, _VERSION_ZIP64, 0, 0, count, count, size, start)
+            end += _ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_end_offset, 1)
+            count = min(count, ZIP_FILECOUNT_LIMIT)
+            size = min(size, ZIP64_LIMIT)
+            start = min(start, ZIP64_LIMIT)
+        end += _END_OF_CENTRAL_DIR.pack(0x06054B50, 0, 0, count, count, size, start, 0)
+        return directory + self._advance(end)
+
+    def _central_header(self, entry: ZipEntry) -> bytes:
+        extra_values = []
+        size = entry.size
+        offset = entry.offset
+        if size >= ZIP64_LIMIT:
+            extra_values += [size, size]
+            size = ZIP64_LIMIT
+        if offset >= ZIP64_LIMIT:
+            extra_values.append(offset)
+            offset = ZIP64_LIMIT
+        extra = b""
+        if extra_values:
+            extra = struct.pack(f"<HH{len(extra_values)}Q", 0x0001, 8 * len(extra_values), *extra_values)
+        version = _VERSION_ZIP64 if extra or entry.zip64 else _VERSION
+        header = _CENTRAL_HEADER.pack(0x02014B50, _VERSION_MADE_BY, version, _FLAGS, 0, entry.dos_time,
+                                      entry.dos_date, entry.crc, size, size, len(entry.name), len(extra), 0, 0, 0,
+                                      _EXTERNAL_ATTR, offset)
+        return header + entry.name + extra
+
+    def _advance(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+
+def _dos_date_time(value: datetime) -> Tuple[int, int]:
+    """
+    Преобразует время в формат MS-DOS. Формат не поддерживает даты раньше 1980 года.
+    """
+    if value.year < 1980:
+        value = datetime(1980, 1, 1)
+    dos_time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    dos_date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    return dos_time, dos_date
+
+
+def archive_name(mp3_model: "Mp3FileModel", names: Set[str]) -> str:
+    """
+    Возвращает имя файла в архиве. Если у пользователя несколько файлов с одинаковым именем,
+    к имени добавляется идентификатор записи.
+    """
+    name = f"{mp3_model.filename}.mp3"
+    if name in names:
+        name = f"{mp3_model.filename}_{mp3_model.id}.mp3"
+    names.add(name)
+    return name
+
+
+async def write_zip(response: "StreamResponse", storage: "StorageBackend", files: Iterable["Mp3FileModel"],
+                    chunk_size: int) -> None:
+    """
+    Записывает в ответ ZIP архив, содержащий mp3 файлы. Файлы читаются блоками по chunk_size байт,
+    и следующий блок читается только после того, как предыдущий был передан в сокет (StreamResponse.write),
+    поэтому объем используемой памяти не зависит от размера архива.
+    Файлы, отсутствующие в файловом хранилище, пропускаются.
+    """
+    archive = ZipStream()
+    names: Set[str] = set()
+    for mp3_model in files:
+        f = await storage.open(mp3_model.file_path)
+        if f is None:
+            logger.warning("File %s of record %s not found in storage", mp3_model.file_path, mp3_model.id)
+            continue
+        try:
+            await response.write(archive.start_entry(archive_name(mp3_model, names),
+                                                     mp3_model.created_at or datetime.now(), f.size))
+            crc = 0
+            size = 0
+            while chunk := await f.read(chunk_size):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                await response.write(chunk)
+            await response.write(archive.end_entry(crc, size))
+        finally:
+            await f.close()
+    await response.write(archive.finish())
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+import aiofiles.os
+
+from app.mp3_files.models import ConversionJobModel
+from app.wav_file.wav import WavFile
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.database.database import Database
+    from app.web.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionJobRunner:
+    """
+    Класс, выполняющий фоновые задачи на конвертацию файлов из таблицы "conversion_jobs".
+    Идентификаторы задач помещаются в очередь asyncio.Queue, которую разбирают workers обработчиков.
+    При запуске приложения в очередь возвращаются задачи, не завершенные до его остановки.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        workers: Количество фоновых обработчиков.
+    """
+
+    def __init__(self, app: "Application", workers: int):
+        self.app = app
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Идентификаторы задач, выполняемых обработчиками.
+        self._running: Dict[asyncio.Task, int] = {}
+        self._stopping = False
+        self._drain: Optional[asyncio.Task] = None
+
+    @property
+    def database(self) -> "Database":
+        return self.app["database"]
+
+    @property
+    def shutdown_timeout(self) -> float:
+        """
+        Время ожидания завершения выполняемых задач при остановке приложения в секундах.
+        """
+        return self.app["config"].app_config.shutdown_timeout
+
+    async def start(self, _: "Application") -> None:
+        """
+        Восстанавливает незавершенные задачи и запускает фоновые обработчики.
+        Метод вызывается один раз при запуске приложения.
+        """
+
+        self._queue = asyncio.Queue()
+        worker = self.app.get("worker")
+        reset_running = worker is None or worker.recovers_jobs
+        for job_id in await ConversionJobModel.requeue_unfinished(self.database, reset_running):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, _: "Application") -> None:
+        """
+        Останавливает фоновые обработчики: свободные сразу, занятые - после завершения текущей задачи,
+        но не позже чем через shutdown_timeout секунд. Задачи, прерванные по истечении этого времени,
+        возвращаются в статус "queued" и будут выполнены после перезапуска.
+        Метод вызывается при остановке приложения до завершения текущих HTTP запросов, поэтому ожидание
+        выполняется в фоне параллельно с ними, а его окончания дожидается метод wait_stopped.
+        """
+
+        self._stopping = True
+        for task in self._tasks:
+            if task not in self._running:
+                task.cancel()
+        self._drain = asyncio.ensure_future(self._drain_running())
+
+    async def wait_stopped(self, _: "Application") -> None:
+        """
+        Дожидается остановки фоновых обработчиков. Метод вызывается один раз при остановке приложения,
+        до отключения от базы данных.
+        """
+
+        if self._drain is not None:
+            await self._drain
+        self._tasks = []
+
+    async def _drain_running(self) -> None:
+        interrupted: List[int] = []
+        busy = list(self._running)
+        if busy:
+            _, pending = await asyncio.wait(busy, timeout=self.shutdown_timeout)
+            interrupted = [self._running[task] for task in pending if task in self._running]
+            for task in pending:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if interrupted:
+            logger.warning("Conversion jobs %s were interrupted by shutdown and requeued", interrupted)
+            await ConversionJobModel.requeue_jobs(self.database, interrupted)
+
+    @property
+    def pending(self) -> int:
+        """
+        Количество задач, ожидающих свободного обработчика.
+        """
+
+        return self._queue.qsize() if self._queue else 0
+
+    def enqueue(self, job_id: int) -> None:
+        """
+        Ставит задачу в очередь на выполнение.
+        """
+
+        self._queue.put_nowait(job_id)  # type: ignore
+
+    async def _worker(self) -> None:
+        task: asyncio.Task = asyncio.current_task()  # type: ignore
+        while not self._stopping:
+            job_id = await self._queue.get()  # type: ignore
+            self._running[task] = job_id
+            try:
+                await self._process(job_id)
+            except Exception:
+                logger.exception("Conversion job %s failed", job_id)
+            finally:
+                del self._running[task]
+                self._queue.task_done()  # type: ignore
+
+    async def _process(self, job_id: int) -> None:
+        """
+        Выполняет одну задачу. Задача берется в работу только если она все еще в статусе "queued".
+        """
+
+        job = await ConversionJobModel.claim_job(self.database, job_id)
+        if not job:
+            return
+        if not job.source_path or not await aiofiles.os.path.exists(job.source_path):
+            # Задача потоковой конвертации, прерванная остановкой приложения: исходный файл не сохранялся.
+            await ConversionJobModel.finish_job(self.database, job.id, error="Source file is missing.")
+            return
+        try:
+            wav_file = WavFile(job.filename, self.app, job.user_id)
+            mp3_file_model = await wav_file.convert_job(job)
+        except Exception as e:
+            await ConversionJobModel.finish_job(self.database, job.id, error=str(e) or type(e).__name__)
+            await self._remove_source(job)
+            raise
+        if mp3_file_model:
+            await ConversionJobModel.finish_job(self.database, job.id, mp3_file_id=mp3_file_model.id)
+        else:
+            await ConversionJobModel.finish_job(self.database, job.id,
+                                                error="Invalid file. Failed to convert file to mp3 format.")
+        await self._remove_source(job)
+
+    async def _remove_source(self, job: ConversionJobModel) -> None:
+        """
+        Удаляет файл в формате WAV завершенной задачи. Если обработчик был остановлен во время
+        конвертации, файл остается на диске, и задача будет выполнена после перезапуска.
+        """
+
+        if await aiofiles.os.path.exists(job.source_path):
+            await aiofiles.os.remove(job.source_path)
+
+
+def setup_job_runner(app: "Application"):
+    """
+    Устанавливает экземпляр класса ConversionJobRunner для текущего экземпляра приложения.
+    Обработчики запускаются после подключения к базе данных и останавливаются до отключения от нее.
+    """
+    config: "Config" = app["config"]
+    app["job_runner"] = ConversionJobRunner(app, workers=config.converter.job_workers)
+    app.on_startup.append(app["job_runner"].start)
+    app.on_shutdown.append(app["job_runner"].stop)
+    # Сигнал on_cleanup вызывает обработчики по порядку, а отключение от базы данных уже добавлено в него.
+    app.on_cleanup.insert(0, app["job_runner"].wait_stopped)
@@ -1,23 +1,30 @@
-from typing import Optional, TYPE_CHECKING
-from uuid import uuid4
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+from uuid import UUID, uuid4
 from datetime import datetime
 
 
 from sqlalchemy import (
+    BigInteger,
     Column,
     ForeignKey,
     Integer,
     String,
     Uuid,
     DateTime,
+    UniqueConstraint,
+    delete,
     insert,
-    select
+    select,
+    update
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.store.database.database import timed
 from app.store.database.sqlalchemy_base import db
 from sqlalchemy.orm import relationship
 
 if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
     from app.store.database.database import Database
 
 
@@ -32,6 +39,10 @@ class Mp3FileModel(db):
         file_path: путь к файлу в файловом хранилище.
         filename: имя файла.
         user_id: идентификатор записи в таблице "users".
+        content_id: идентификатор записи в таблице "mp3_contents". Несколько записей могут ссылаться
+        на один и тот же конвертированный файл.
+        size: размер файла в байтах.
+        etag: значение заголовка ETag для файла.
         user: экземпляр класс UserModel.
     """
     __tablename__ = "mp3_files"
@@ -41,10 +52,16 @@ class Mp3FileModel(db):
     file_path = Column(String(), nullable=False)
     filename = Column(String(), nullable=False)
     user_id = Column(Integer(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    content_id = Column(Integer(), ForeignKey("mp3_contents.id", ondelete="SET NULL"), nullable=True)
+    size = Column(BigInteger(), nullable=True)
+    etag = Column(String(64), nullable=True)
     user = relationship("UserModel", back_populates="mp3_files")
 
     @staticmethod
-    async def inser_file(database: "Database", user_id: int, file_path: str, filename: str) -> "Mp3FileModel":
+    @timed
+    async def inser_file(database: "Database", user_id: int, file_path: str, filename: str,
+                         content_id: Optional[int] = None, size: Optional[int] = None,
+                         etag: Optional[str] = None, uuid: Optional[UUID] = None) -> "Mp3FileModel":
         """
         Добавляет новй файл в таблицу "mp3_files" базы данных.
         Returns:
@@ -53,7 +70,8 @@ class Mp3FileModel(db):
 
         query = (insert(Mp3FileModel)
                  .returning(Mp3FileModel)
-                 .values(file_path=file_path, user_id=user_id, filename=filename))
+                 .values(file_path=file_path, user_id=user_id, filename=filename, content_id=content_id,
+                         size=size, etag=etag, uuid=uuid or uuid4()))
         async with database.session() as session:
             result = await session.execute(query)
             await session.commit()
@@ -61,6 +79,27 @@ class Mp3FileModel(db):
             return mp3_file_model
 
     @staticmethod
+    @timed
+    async def insert_files(database: "Database", rows: List[Dict[str, Any]]) -> List["Mp3FileModel"]:
+        """
+        Добавляет несколько файлов в таблицу "mp3_files" базы данных одним запросом INSERT ... RETURNING.
+        Args:
+            rows - значения колонок для каждой записи (user_id, file_path, filename, content_id, size, etag, uuid).
+        Returns:
+            Возвращает добавленные записи в том же порядке, что и rows.
+        """
+
+        # Порядок строк в RETURNING не гарантируется, поэтому записи сопоставляются по uuid.
+        rows = [dict(row, uuid=row.get("uuid") or uuid4()) for row in rows]
+        query = insert(Mp3FileModel).values(rows).returning(Mp3FileModel)
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            models = {mp3_model.uuid: mp3_model for mp3_model in result.scalars()}
+            return [models[row["uuid"]] for row in rows]
+
+    @staticmethod
+    @timed
     async def get_mp3_by_user(database: "Database", user_id: int, record_id: int) -> Optional["Mp3FileModel"]:
         """
         Делает запрос к базе данных и возвращает запись из таблице "mp3_files" базы данных.
@@ -77,3 +116,408 @@ class Mp3FileModel(db):
             await session.commit()
             mp3_model = result.scalar_one_or_none()
             return mp3_model
+
+    @staticmethod
+    @timed
+    async def get_files_by_user(database: "Database", user_id: int,
+                                record_ids: Optional[List[int]] = None) -> List["Mp3FileModel"]:
+        """
+        Возвращает записи пользователя из таблицы "mp3_files" в порядке их добавления.
+        Args:
+            user_id - идентификатор пользователя в базе данных.
+            record_ids - идентификаторы mp3 файлов. Если не переданы, возвращаются все файлы пользователя.
+        """
+
+        query = select(Mp3FileModel).where(Mp3FileModel.user_id == user_id).order_by(Mp3FileModel.id)
+        if record_ids:
+            query = query.where(Mp3FileModel.id.in_(record_ids))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return list(result.scalars())
+
+    @staticmethod
+    @timed
+    async def delete_file(database: "Database", user_id: int,
+                          record_id: int) -> Tuple[Optional["Mp3FileModel"], Optional[str]]:
+        """
+        Удаляет запись из таблицы "mp3_files" базы данных и освобождает ссылку на конвертированный файл.
+        Args:
+            record_id - идентификатор mp3 файла в базе данных.
+            user_id - идентификатор пользователя в базе данных.
+        Returns:
+            Удаленная запись (или None, если запись не существует) и путь к файлу, который нужно удалить
+            из файлового хранилища. Путь равен None, если на файл ссылаются другие записи.
+        """
+
+        query = (delete(Mp3FileModel)
+                 .where(Mp3FileModel.id == record_id, Mp3FileModel.user_id == user_id)
+                 .returning(Mp3FileModel))
+        async with database.session() as session:
+            result = await session.execute(query)
+            mp3_model = result.scalar_one_or_none()
+            orphan_path: Optional[str] = None
+            if mp3_model and mp3_model.content_id:
+                orphan_path = await Mp3ContentModel.release(session, mp3_model.content_id)
+            elif mp3_model:
+                orphan_path = mp3_model.file_path
+            await session.commit()
+            return mp3_model, orphan_path
+
+
+class Mp3ContentModel(db):
+    """
+    Класс, отображающий конвертированные файлы в таблице "mp3_contents" базы данных.
+    Файл однозначно определяется хэшем содержимого исходного файла в формате WAV и параметрами кодирования.
+    Записи таблицы "mp3_files" ссылаются на файл, ref_count хранит количество таких ссылок.
+    Файл удаляется из файлового хранилища, когда на него не осталось ссылок.
+    Args:
+        id: идентификатор записи.
+        content_hash: SHA-256 хэш содержимого исходного файла.
+        params: параметры кодирования ffmpeg.
+        file_path: путь к файлу в файловом хранилище.
+        ref_count: количество записей в таблице "mp3_files", ссылающихся на файл.
+        created_at: время создания записи.
+    """
+    __tablename__ = "mp3_contents"
+    __table_args__ = (UniqueConstraint("content_hash", "params"),)
+    id = Column(Integer(), primary_key=True)
+    content_hash = Column(String(64), nullable=False)
+    params = Column(String(), nullable=False)
+    file_path = Column(String(), nullable=False)
+    ref_count = Column(Integer(), nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    @staticmethod
+    @timed
+    async def reuse(database: "Database", content_hash: str, params: str) -> Optional["Mp3ContentModel"]:
+        """
+        Добавляет ссылку на уже конвертированный файл, если он существует.
+        Файл, на который не осталось ссылок, повторно не используется, так как он может быть уже удален.
+        Returns:
+            Экземпляр класса Mp3ContentModel или None, если файл не найден.
+        """
+
+        query = (update(Mp3ContentModel)
+                 .where(Mp3ContentModel.content_hash == content_hash,
+                        Mp3ContentModel.params == params,
+                        Mp3ContentModel.ref_count > 0)
+                 .values(ref_count=Mp3ContentModel.ref_count + 1)
+                 .returning(Mp3ContentModel))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def add_reference(database: "Database", content_hash: str, params: str,
+                            file_path: str) -> "Mp3ContentModel":
+        """
+        Добавляет запись о новом конвертированном файле или ссылку на существующий.
+        Если такой же файл был конвертирован параллельно, возвращается запись о нем,
+        и file_path в ней отличается от переданного.
+        """
+
+        query = pg_insert(Mp3ContentModel).values(content_hash=content_hash, params=params,
+                                                  file_path=file_path, ref_count=1)
+        query = (query
+                 .on_conflict_do_update(index_elements=[Mp3ContentModel.content_hash, Mp3ContentModel.params],
+                                        set_={"ref_count": Mp3ContentModel.ref_count + 1})
+                 .returning(Mp3ContentModel))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one()
+
+    @staticmethod
+    async def release(session: "AsyncSession", content_id: int) -> Optional[str]:
+        """
+        Уменьшает количество ссылок на конвертированный файл в рамках переданной сессии.
+        Returns:
+            Путь к файлу, если на него не осталось ссылок и его нужно удалить, иначе None.
+        """
+
+        await session.execute(update(Mp3ContentModel)
+                              .where(Mp3ContentModel.id == content_id)
+                              .values(ref_count=Mp3ContentModel.ref_count - 1))
+        result = await session.execute(delete(Mp3ContentModel)
+                                       .where(Mp3ContentModel.id == content_id, Mp3ContentModel.ref_count <= 0)
+                                       .returning(Mp3ContentModel.file_path))
+        return result.scalar_one_or_none()
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class ConversionJobModel(db):
+    """
+    Класс, отображающий задачи на конвертацию файлов в таблице "conversion_jobs" базы данных.
+    Задача создается, когда файл в формате WAV получен от клиента и сохранен на диск,
+    а конвертация выполняется в фоне.
+    Args:
+        id: идентификатор задачи.
+        uuid: UUID.
+        created_at: время создания задачи.
+        updated_at: время последнего изменения статуса задачи.
+        status: статус задачи (queued, running, done, failed).
+        source_path: путь к полученному от клиента файлу в формате WAV.
+        filename: имя файла.
+        error: описание ошибки, если конвертация завершилась неудачно.
+        content_hash: SHA-256 хэш содержимого файла, вычисленный при его получении.
+        user_id: идентификатор записи в таблице "users".
+        mp3_file_id: идентификатор конвертированного файла в таблице "mp3_files".
+    """
+    __tablename__ = "conversion_jobs"
+    id = Column(Integer(), primary_key=True)
+    uuid = Column(Uuid(as_uuid=True), default=uuid4)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    status = Column(String(16), nullable=False, default=JOB_QUEUED, index=True)
+    source_path = Column(String(), nullable=False)
+    filename = Column(String(), nullable=False)
+    error = Column(String(), nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    user_id = Column(Integer(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    mp3_file_id = Column(Integer(), ForeignKey("mp3_files.id", ondelete="SET NULL"), nullable=True)
+
+    @staticmethod
+    @timed
+    async def insert_job(database: "Database", user_id: int, source_path: str, filename: str,
+                         content_hash: Optional[str] = None, status: str = JOB_QUEUED) -> "ConversionJobModel":
+        """
+        Добавляет новую задачу в таблицу "conversion_jobs" базы данных. Задачи потоковой конвертации
+        (/files.convert?mode=stream) создаются сразу со статусом "running" и пустым source_path,
+        после перезапуска приложения они не возвращаются в очередь (см. requeue_unfinished).
+        Returns:
+            Возвращает экземпляр класса ConversionJobModel.
+        """
+
+        query = (insert(ConversionJobModel)
+                 .returning(ConversionJobModel)
+                 .values(source_path=source_path, user_id=user_id, filename=filename, status=status,
+                         content_hash=content_hash))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one()
+
+    @staticmethod
+    @timed
+    async def get_job_by_user(database: "Database", user_id: int, job_id: int) -> Optional["ConversionJobModel"]:
+        """
+        Возвращает задачу пользователя из таблицы "conversion_jobs" базы данных.
+        Если задача не существует, возвращает None.
+        Args:
+            job_id - идентификатор задачи в базе данных.
+            user_id - идентификатор пользователя в базе данных.
+        """
+
+        query = select(ConversionJobModel).where(ConversionJobModel.id == job_id,
+                                                 ConversionJobModel.user_id == user_id)
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def claim_job(database: "Database", job_id: int) -> Optional["ConversionJobModel"]:
+        """
+        Переводит задачу из статуса "queued" в статус "running".
+        Если задача уже взята в работу или не существует, возвращает None.
+        """
+
+        query = (update(ConversionJobModel)
+                 .where(ConversionJobModel.id == job_id, ConversionJobModel.status == JOB_QUEUED)
+                 .values(status=JOB_RUNNING, updated_at=datetime.utcnow())
+                 .returning(ConversionJobModel))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def finish_job(database: "Database", job_id: int, mp3_file_id: Optional[int] = None,
+                         error: Optional[str] = None) -> None:
+        """
+        Переводит задачу в статус "done", если передан mp3_file_id, иначе в статус "failed".
+        """
+
+        status = JOB_DONE if mp3_file_id is not None else JOB_FAILED
+        query = (update(ConversionJobModel)
+                 .where(ConversionJobModel.id == job_id)
+                 .values(status=status, mp3_file_id=mp3_file_id, error=error, updated_at=datetime.utcnow()))
+        async with database.session() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @staticmethod
+    @timed
+    async def requeue_jobs(database: "Database", job_ids: List[int]) -> None:
+        """
+        Возвращает в статус "queued" задачи, выполнение которых было прервано остановкой приложения.
+        """
+
+        query = (update(ConversionJobModel)
+                 .where(ConversionJobModel.id.in_(job_ids), ConversionJobModel.status == JOB_RUNNING)
+                 .values(status=JOB_QUEUED, updated_at=datetime.utcnow()))
+        async with database.session() as session:
+            await session.execute(query)
+            await session.commit()
+
+    @staticmethod
+    @timed
+    async def requeue_unfinished(database: "Database", reset_running: bool = True) -> List[int]:
+        """
+        Возвращает в очередь задачи, которые не были завершены до остановки приложения.
+        Args:
+            database: Экземпляр класса Database.
+            reset_running: Переводить ли задачи со статусом "running" в статус "queued". При работе нескольких
+                процессов это делает только один из них, иначе задачи, выполняемые соседними процессами,
+                были бы выполнены повторно.
+        Returns:
+            Список идентификаторов задач со статусом "queued".
+        """
+
+        # Задачи потоковой конвертации (пустой source_path) нельзя повторить: файл не сохранялся на диск.
+        # Они завершаются ошибкой, а не возвращаются в очередь.
+        interrupted = (update(ConversionJobModel)
+                       .where(ConversionJobModel.status.in_([JOB_QUEUED, JOB_RUNNING]),
+                              ConversionJobModel.source_path == "")
+                       .values(status=JOB_FAILED, error="Conversion was interrupted.", updated_at=datetime.utcnow()))
+        query = (update(ConversionJobModel)
+                 .where(ConversionJobModel.status == JOB_RUNNING, ConversionJobModel.source_path != "")
+                 .values(status=JOB_QUEUED, updated_at=datetime.utcnow()))
+        async with database.session() as session:
+            if reset_running:
+                await session.execute(interrupted)
+                await session.execute(query)
+            result = await session.execute(select(ConversionJobModel.id)
+                                           .where(ConversionJobModel.status == JOB_QUEUED)
+                                           .order_by(ConversionJobModel.id))
+            await session.commit()
+            return list(result.scalars())
+
+
+class UploadSessionModel(db):
+    """
+    Класс, отображающий сессии загрузки файлов по частям в таблице "upload_sessions" базы данных.
+    Полученные части записываются в файл part_path, offset - количество байт, которые уже сохранены на диск.
+    Сессия, в которую не поступали данные до expires_at, удаляется вместе с файлом.
+    Args:
+        id: идентификатор сессии.
+        uuid: UUID. Передается клиенту как идентификатор загрузки (upload_id).
+        created_at: время создания сессии.
+        expires_at: время, после которого незавершенная сессия удаляется.
+        filename: имя файла.
+        size: размер файла в байтах, заявленный клиентом.
+        offset: количество полученных байт.
+        part_path: путь к файлу с полученными данными.
+        user_id: идентификатор записи в таблице "users".
+    """
+    __tablename__ = "upload_sessions"
+    id = Column(Integer(), primary_key=True)
+    uuid = Column(Uuid(as_uuid=True), default=uuid4, nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    filename = Column(String(), nullable=False)
+    size = Column(BigInteger(), nullable=False)
+    offset = Column(BigInteger(), nullable=False, default=0)
+    part_path = Column(String(), nullable=False)
+    user_id = Column(Integer(), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    @staticmethod
+    @timed
+    async def insert_session(database: "Database", user_id: int, filename: str, size: int, part_path: str,
+                             expires_at: datetime) -> "UploadSessionModel":
+        """
+        Добавляет новую сессию загрузки в таблицу "upload_sessions" базы данных.
+        Returns:
+            Возвращает экземпляр класса UploadSessionModel.
+        """
+
+        query = (insert(UploadSessionModel)
+                 .returning(UploadSessionModel)
+                 .values(user_id=user_id, filename=filename, size=size, offset=0, part_path=part_path,
+                         expires_at=expires_at))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one()
+
+    @staticmethod
+    @timed
+    async def get_session(database: "Database", user_id: int, upload_id: UUID) -> Optional["UploadSessionModel"]:
+        """
+        Возвращает сессию загрузки пользователя. Если сессия не существует или истекла, возвращает None.
+        """
+
+        query = select(UploadSessionModel).where(UploadSessionModel.uuid == upload_id,
+                                                 UploadSessionModel.user_id == user_id,
+                                                 UploadSessionModel.expires_at > datetime.utcnow())
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def advance_offset(database: "Database", session_id: int, offset: int, expires_at: datetime,
+                             locked: Callable[[], Awaitable[int]]) -> Optional["UploadSessionModel"]:
+        """
+        Блокирует строку сессии со смещением offset (SELECT ... FOR UPDATE SKIP LOCKED), вызывает функцию locked,
+        которая записывает часть файла и возвращает количество записанных байт, переводит смещение сессии
+        на это количество байт и продлевает сессию до expires_at.
+        Если смещение сессии уже изменено, сессия удалена или заблокирована другим запросом, возвращает None,
+        функция locked не вызывается. Если она завершилась ошибкой, смещение не изменяется.
+        """
+
+        lock = (select(UploadSessionModel.id)
+                .where(UploadSessionModel.id == session_id, UploadSessionModel.offset == offset)
+                .with_for_update(skip_locked=True))
+        async with database.session() as session:
+            if (await session.execute(lock)).scalar_one_or_none() is None:
+                return None
+            received = await locked()
+            query = (update(UploadSessionModel)
+                     .where(UploadSessionModel.id == session_id)
+                     .values(offset=offset + received, expires_at=expires_at)
+                     .returning(UploadSessionModel))
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def delete_session(database: "Database", session_id: int) -> Optional["UploadSessionModel"]:
+        """
+        Удаляет сессию загрузки. Если сессия уже удалена другим запросом, возвращает None.
+        """
+
+        query = delete(UploadSessionModel).where(UploadSessionModel.id == session_id).returning(UploadSessionModel)
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return result.scalar_one_or_none()
+
+    @staticmethod
+    @timed
+    async def delete_expired(database: "Database") -> List[str]:
+        """
+        Удаляет истекшие сессии загрузки.
+        Returns:
+            Пути к файлам удаленных сессий.
+        """
+
+        query = (delete(UploadSessionModel)
+                 .where(UploadSessionModel.expires_at <= datetime.utcnow())
+                 .returning(UploadSessionModel.part_path))
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            return list(result.scalars())
@@ -1,7 +1,15 @@
 from typing import TYPE_CHECKING
 
 
-from app.mp3_files.views import ConvertFileView, DownloadMp3FileView
+from app.mp3_files.views import (
+    ConversionJobStatusView,
+    ConvertFileView,
+    DownloadMp3FileView,
+    ExportMp3FilesView,
+    UploadChunkView,
+    UploadCreateView,
+    UploadFinishView
+)
 
 if TYPE_CHECKING:
     from aiohttp.web import Application
@@ -15,3 +23,8 @@ def setup_routes(app: "Application"):
     cors: "CorsConfig" = app["cors"]
     cors.add(app.router.add_view("/files.convert", ConvertFileView))
     cors.add(app.router.add_view("/files.record", DownloadMp3FileView))
+    cors.add(app.router.add_view("/files.status", ConversionJobStatusView))
+    cors.add(app.router.add_view("/files.export", ExportMp3FilesView))
+    cors.add(app.router.add_view("/uploads.create", UploadCreateView))
+    cors.add(app.router.add_view("/uploads.chunk", UploadChunkView))
+    cors.add(app.router.add_view("/uploads.finish", UploadFinishView))
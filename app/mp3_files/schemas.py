@@ -15,6 +15,17 @@ class Mp3FileShcemaRequest(Schema):
                            validate=[validate.Length(min=1, error="Field cannot be blank")])
 
 
+class Mp3FileConvertQuerySchema(Schema):
+    """
+    Класс представляет параметры url адреса POST-запроса для конечной точки /files.convert.
+    Args:
+        mode: режим конвертации. sync - ответ отправляется после конвертации файла,
+        async - ответ с кодом 202 отправляется сразу после получения файла, а конвертация выполняется в фоне.
+        stream - mp3 файл передается клиенту в ответе по мере конвертации (chunked transfer encoding).
+    """
+    mode = fields.Str(load_default="sync", validate=validate.OneOf(["sync", "async", "stream"]))
+
+
 class Mp3FileShcemaResponse(OkResponseSchema):
     """
     Класс представляет ответ на POST-запроса для конечной точки /files.convert.
@@ -35,3 +46,135 @@ class RequestMp3DownloadFileSchema(Schema):
     """
     user_id = fields.Int(required=True, allow_none=False)
     record_id = fields.Int(required=True, allow_none=False)
+
+
+class RequestMp3DownloadProfileSchema(RequestMp3DownloadFileSchema):
+    """
+    Класс представляет параметры url адреса
+    /files.record?record_id=id_записи&user_id=id_пользователя&profile=профиль GET-запроса.
+    Args:
+        profile: профиль кодирования (см. секцию variants в app/config.yml). Если не передан,
+        отправляется сохраненный файл.
+    """
+    profile = fields.Str(load_default=None)
+
+
+class RequestMp3ExportSchema(Schema):
+    """
+    Класс представляет параметры url адреса
+    /files.export?user_id=id_пользователя&record_id=id_записи&record_id=id_записи GET-запроса.
+    Args:
+        user_id: идентификатор пользователя.
+        record_id: идентификаторы mp3 файлов. Если не переданы, в архив попадают все файлы пользователя.
+    """
+    user_id = fields.Int(required=True, allow_none=False)
+    record_id = fields.List(fields.Int(), load_default=list)
+
+
+class ConversionJobSchema(Schema):
+    """
+    Класс Schema для фоновой задачи на конвертацию.
+    Args:
+        id: идентификатор задачи.
+        status: статус задачи (queued, running, done, failed).
+        status_url: url-адрес для получения статуса задачи.
+        url: url-адрес для скачивания конвертированного файла. Заполняется, когда задача выполнена.
+        error: описание ошибки, если задача завершилась неудачно.
+    """
+    id = fields.Int()
+    status = fields.Str()
+    status_url = fields.Str()
+    url = fields.Str(allow_none=True)
+    error = fields.Str(allow_none=True)
+
+
+class ConversionJobResponseSchema(OkResponseSchema):
+    """
+    Класс представляет ответ для конечных точек /files.convert?mode=async и /files.status.
+    """
+    data = fields.Nested(ConversionJobSchema)
+
+
+class Mp3FileConvertResultSchema(Schema):
+    """
+    Класс Schema для результата конвертации одного файла из запроса с несколькими файлами.
+    Args:
+        filename: имя файла без расширения.
+        url: url-адрес для скачивания конвертированного файла.
+        job: фоновая задача на конвертацию (для mode=async).
+        error: описание ошибки, если файл не удалось конвертировать.
+    """
+    filename = fields.Str()
+    url = fields.Str(allow_none=True)
+    job = fields.Nested(ConversionJobSchema, allow_none=True)
+    error = fields.Str(allow_none=True)
+
+
+class Mp3FilesConvertResponseSchema(OkResponseSchema):
+    """
+    Класс представляет ответ на POST-запрос с несколькими файлами для конечной точки /files.convert.
+    """
+    data = fields.List(fields.Nested(Mp3FileConvertResultSchema))
+
+
+class RequestConversionJobStatusSchema(Schema):
+    """
+    Класс представляет параметры url адреса
+    /files.status?job_id=id_задачи&user_id=id_пользователя GET-запроса.
+    Args:
+        job_id: идентификатор задачи.
+        user_id: идентификатор пользователя.
+    """
+    user_id = fields.Int(required=True, allow_none=False)
+    job_id = fields.Int(required=True, allow_none=False)
+
+
+class UploadCreateRequestSchema(Schema):
+    """
+    Класс представляет тело POST-запроса для конечной точки /uploads.create.
+    Args:
+        filename: имя загружаемого WAV файла.
+        size: размер файла в байтах.
+    """
+    filename = fields.Str(required=True, validate=[validate.Length(min=1, error="Field cannot be blank")])
+    size = fields.Int(required=True, validate=validate.Range(min=1))
+
+
+class UploadQuerySchema(Schema):
+    """
+    Класс представляет параметры url адреса
+    /uploads.chunk?upload_id=id_загрузки&user_id=id_пользователя и /uploads.finish.
+    Args:
+        upload_id: идентификатор загрузки.
+        user_id: идентификатор пользователя.
+    """
+    user_id = fields.Int(required=True, allow_none=False)
+    upload_id = fields.UUID(required=True, allow_none=False)
+
+
+class UploadSchema(Schema):
+    """
+    Класс Schema для загрузки файла по частям.
+    Args:
+        id: идентификатор загрузки.
+        filename: имя файла.
+        size: размер файла в байтах.
+        offset: количество полученных байт. Следующая часть передается с этого смещения.
+        expires_at: время, после которого незавершенная загрузка удаляется.
+        upload_url: url-адрес для передачи частей файла (PATCH) и получения смещения (GET).
+        finish_url: url-адрес для завершения загрузки (POST).
+    """
+    id = fields.UUID()
+    filename = fields.Str()
+    size = fields.Int()
+    offset = fields.Int()
+    expires_at = fields.DateTime()
+    upload_url = fields.Str()
+    finish_url = fields.Str()
+
+
+class UploadResponseSchema(OkResponseSchema):
+    """
+    Класс представляет ответ для конечных точек /uploads.create и /uploads.chunk.
+    """
+    data = fields.Nested(UploadSchema)
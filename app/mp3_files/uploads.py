@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from os import path
+from typing import Optional, Tuple, TYPE_CHECKING
+from uuid import uuid4
+
+import aiofiles
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPConflict, HTTPNotFound
+
+from app.mp3_files.models import UploadSessionModel
+from app.store.storage import PARTIAL_SUFFIX, UPLOADS_ROOT, discard, ensure_directory
+from app.wav_file.wav import WavFile
+from app.web.timing import phase
+
+if TYPE_CHECKING:
+    from aiohttp import StreamReader
+    from aiohttp.web import Application
+    from app.mp3_files.models import ConversionJobModel
+    from app.store.database.database import Database
+    from app.web.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+# Алгоритмы контрольных сумм частей, которые принимает заголовок Upload-Checksum.
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256")
+# Размер блока, которым часть файла читается из сокета.
+CHUNK_READ_SIZE = 1024*1024
+
+
+class UploadManager:
+    """
+    Класс, принимающий файлы по частям. Клиент создает сессию загрузки с размером файла, передает части
+    с указанием смещения и, если соединение прервалось, запрашивает смещение, с которого нужно продолжить.
+    Полученные байты записываются на диск в файл сессии, а смещение хранится в базе данных,
+    поэтому загрузку можно продолжить в любом процессе веб-сервиса и после его перезапуска.
+    Когда получен весь файл, он ставится в очередь фоновых задач на конвертацию.
+    Незавершенные загрузки удаляются через ttl секунд после получения последней части.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        max_size: Максимальный размер файла в байтах.
+        ttl: Время жизни незавершенной загрузки в секундах.
+        cleanup_interval: Интервал удаления истекших загрузок в секундах.
+    """
+
+    def __init__(self, app: "Application", max_size: int, ttl: float, cleanup_interval: float):
+        self.app = app
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._cleaner: Optional[asyncio.Task] = None
+
+    @property
+    def database(self) -> "Database":
+        return self.app["database"]
+
+    async def start(self, _: "Application") -> None:
+        """
+        Запускает фоновое удаление истекших загрузок. Метод вызывается один раз при запуске приложения.
+        """
+
+        self._cleaner = asyncio.ensure_future(self._expire_loop())
+
+    async def stop(self, _: "Application") -> None:
+        """
+        Останавливает фоновое удаление истекших загрузок. Метод вызывается один раз при остановке приложения.
+        """
+
+        if self._cleaner is not None:
+            self._cleaner.cancel()
+            await asyncio.gather(self._cleaner, return_exceptions=True)
+
+    async def create(self, user_id: int, filename: str, size: int) -> UploadSessionModel:
+        """
+        Создает сессию загрузки файла размером size байт и пустой файл для ее данных.
+
+        Raises:
+            HTTPBadRequest: Размер файла превышает max_size.
+        """
+
+        if size > self.max_size:
+            raise HTTPBadRequest(reason=f"File is too large. Maximum size is {self.max_size} bytes.")
+        await ensure_directory(UPLOADS_ROOT)
+        part_path = path.join(UPLOADS_ROOT, f"{uuid4()}.wav{PARTIAL_SUFFIX}")
+        async with aiofiles.open(part_path, mode="wb"):
+            pass
+        try:
+            return await UploadSessionModel.insert_session(self.database, user_id, filename, size, part_path,
+                                                           self._expires_at())
+        except BaseException:
+            await discard(part_path)
+            raise
+
+    async def write(self, upload: UploadSessionModel, offset: int, content: "StreamReader",
+                    checksum: Optional[Tuple[str, bytes]] = None) -> UploadSessionModel:
+        """
+        Записывает часть файла из тела запроса content в файл сессии, начиная со смещения offset.
+        Часть принимается под блокировкой строки сессии в базе данных и записывается сразу на свое место
+        в файле сессии, поэтому одновременные попытки записать часть в разных процессах веб-сервиса
+        не перезаписывают данные друг друга: первая получает блокировку, остальные сразу получают 409.
+        Если передана контрольная сумма (алгоритм, значение), часть принимается только при ее совпадении.
+        Если соединение разорвано посреди части без контрольной суммы, сохраняются все полученные байты,
+        и клиент продолжает со следующего из них. Непринятая часть отрезается от файла сессии.
+
+        Raises:
+            HTTPConflict: offset не совпадает со смещением сессии или часть записывается другим запросом.
+            HTTPBadRequest: Часть выходит за пределы заявленного размера файла или контрольная сумма не совпала.
+
+        Returns:
+            Сессия с новым смещением.
+        """
+
+        if offset != upload.offset:
+            raise HTTPConflict(reason=f"Upload offset mismatch. Current offset is {upload.offset}.")
+        hasher = hashlib.new(checksum[0]) if checksum is not None else None
+        received = 0
+        interrupted: Optional[BaseException] = None
+
+        async def receive() -> int:
+            nonlocal received, interrupted
+            loop = asyncio.get_running_loop()
+            async with aiofiles.open(upload.part_path, mode="r+b") as f:
+                try:
+                    # Данные после offset остались от непринятых частей.
+                    await f.truncate(offset)
+                    await f.seek(offset)
+                    try:
+                        while chunk := await content.read(CHUNK_READ_SIZE):
+                            if offset + received + len(chunk) > upload.size:
+                                raise HTTPBadRequest(reason="Chunk exceeds the declared upload size.")
+                            if hasher is not None:
+                                with phase("hash"):
+                                    await loop.run_in_executor(self.app["executor"], hasher.update, chunk)
+                            await f.write(chunk)
+                            received += len(chunk)
+                    except (ConnectionResetError, asyncio.CancelledError) as e:
+                        # Соединение разорвано. Без контрольной суммы часть можно принять не целиком.
+                        if hasher is not None or not received:
+                            raise
+                        interrupted = e
+                    if hasher is not None and hasher.digest() != checksum[1]:  # type: ignore
+                        raise HTTPBadRequest(reason="Chunk checksum mismatch.")
+                    # Данные записываются на диск до изменения смещения в базе данных,
+                    # чтобы после сбоя смещение не указывало за пределы сохраненных данных.
+                    with phase("fsync"):
+                        await f.flush()
+                        await loop.run_in_executor(self.app["executor"], os.fsync, f.fileno())
+                except BaseException:
+                    await f.truncate(offset)
+                    raise
+            return received
+
+        advanced = await UploadSessionModel.advance_offset(self.database, upload.id, offset, self._expires_at(),
+                                                           locked=receive)
+        if interrupted is not None:
+            raise interrupted
+        if advanced is None:
+            raise HTTPConflict(reason="Upload offset was changed by another request.")
+        return advanced
+
+    async def finish(self, upload: UploadSessionModel) -> "ConversionJobModel":
+        """
+        Завершает загрузку и ставит задачу на конвертацию полученного файла. Сессия удаляется.
+
+        Raises:
+            HTTPConflict: Получен не весь файл.
+            HTTPNotFound: Сессия уже завершена другим запросом.
+            HTTPBadRequest: Файл не является WAV файлом. Файл удаляется.
+        """
+
+        if upload.offset != upload.size:
+            raise HTTPConflict(reason=f"Upload is incomplete: {upload.offset} of {upload.size} bytes received.")
+        if await UploadSessionModel.delete_session(self.database, upload.id) is None:
+            raise HTTPNotFound(reason="Upload not found.")
+        try:
+            return await WavFile(upload.filename, self.app, upload.user_id).accept_upload(upload.part_path)
+        except BaseException:
+            await discard(upload.part_path)
+            raise
+
+    async def expire(self) -> int:
+        """
+        Удаляет истекшие загрузки и их файлы.
+
+        Returns:
+            Количество удаленных загрузок.
+        """
+
+        part_paths = await UploadSessionModel.delete_expired(self.database)
+        for part_path in part_paths:
+            await discard(part_path)
+        return len(part_paths)
+
+    async def _expire_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                expired = await self.expire()
+            except Exception:
+                logger.exception("Failed to remove expired uploads")
+                continue
+            if expired:
+                logger.info("Removed %s expired uploads", expired)
+
+    def _expires_at(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.ttl)
+
+
+def parse_checksum(value: str) -> Tuple[str, bytes]:
+    """
+    Разбирает значение заголовка Upload-Checksum вида "<алгоритм> <значение в base64>".
+
+    Raises:
+        HTTPBadRequest: Неизвестный алгоритм или некорректное значение.
+    """
+
+    algorithm, _, encoded = value.strip().partition(" ")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise HTTPBadRequest(reason=f"Unsupported checksum algorithm. Use one of: {', '.join(CHECKSUM_ALGORITHMS)}.")
+    try:
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except binascii.Error:
+        raise HTTPBadRequest(reason="Invalid checksum value.")
+    if len(digest) != hashlib.new(algorithm).digest_size:
+        raise HTTPBadRequest(reason="Invalid checksum value.")
+    return algorithm, digest
+
+
+def setup_upload_manager(app: "Application"):
+    """
+    Устанавливает экземпляр класса UploadManager для текущего экземпляра приложения.
+    """
+    config: "Config" = app["config"]
+    app["upload_manager"] = UploadManager(app, max_size=config.uploads.max_size, ttl=config.uploads.ttl,
+                                          cleanup_interval=config.uploads.cleanup_interval)
+    app.on_startup.append(app["upload_manager"].start)
+    app.on_cleanup.append(app["upload_manager"].stop)
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from os import path
+from typing import AsyncIterator, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import aiofiles
+import aiofiles.os
+from aiohttp.web_exceptions import HTTPInternalServerError
+
+from app.store.storage import PARTIAL_SUFFIX, LocalStorage, discard, ensure_directory, partial_path, publish
+from app.wav_file.profiles import MASTER_PROFILE
+from app.web.stats import CacheStats, register_stats
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.storage import StorageBackend
+    from app.wav_file.engine import ConversionEngine
+    from app.wav_file.profiles import EncodingProfile
+    from app.web.config import Config
+
+
+# Суффикс локальной копии исходного файла из объектного хранилища на время кодирования.
+SOURCE_SUFFIX = ".src"
+# Размер блока, которым исходный файл читается из объектного хранилища.
+SOURCE_CHUNK_SIZE = 1024*1024
+
+
+class VariantCache:
+    """
+    Кэш вариантов mp3 файлов - файлов, перекодированных из сохраненного файла (мастер-копии) с параметрами
+    профиля кодирования. Вариант создается при первом запросе и хранится на локальном диске.
+    Суммарный размер вариантов ограничен max_bytes, при превышении удаляются давно не запрошенные варианты (LRU).
+    Варианты, которые в данный момент отправляются клиентам, не удаляются.
+    Одновременные запросы одного отсутствующего варианта ожидают один процесс ffmpeg.
+    Варианты отправляются клиентам из локального хранилища files.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        root: Директория, в которой хранятся варианты.
+        max_bytes: Максимальный суммарный размер вариантов в байтах.
+        profiles: Профили кодирования по названию.
+        stats: Счетчики попаданий и промахов.
+    """
+
+    def __init__(self, app: "Application", root: str, max_bytes: int, profiles: Dict[str, "EncodingProfile"],
+                 stats: CacheStats):
+        self.app = app
+        self.root = root
+        self.max_bytes = max_bytes
+        self.profiles = profiles
+        self.stats = stats
+        self.files = LocalStorage()
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self._pending: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+
+    @property
+    def storage(self) -> "StorageBackend":
+        return self.app["storage"]
+
+    @property
+    def engine(self) -> "ConversionEngine":
+        return self.app["conversion_engine"]
+
+    async def start(self, _: "Application") -> None:
+        """
+        Восстанавливает список вариантов, сохраненных до перезапуска приложения, в порядке времени их изменения.
+        Метод вызывается один раз при запуске приложения.
+        """
+
+        found = await asyncio.get_running_loop().run_in_executor(self.app["executor"], self._scan)
+        for _, file_path, size in sorted(found):
+            self._add(file_path, size)
+        await self._evict()
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """
+        Возвращает (mtime, путь, размер) вариантов в директории root. Незавершенные файлы удаляются.
+        """
+
+        found = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                file_path = path.join(directory, filename)
+                if filename.endswith((PARTIAL_SUFFIX, SOURCE_SUFFIX)):
+                    os.remove(file_path)
+                    continue
+                st = os.stat(file_path)
+                found.append((st.st_mtime, file_path, st.st_size))
+        return found
+
+    def variant_path(self, master: str, profile: "EncodingProfile") -> str:
+        """
+        Возвращает путь к варианту файла master (имя файла в файловом хранилище) для профиля profile.
+        """
+
+        digest = hashlib.sha1(master.encode()).hexdigest()
+        return path.join(self.root, profile.name, digest[:2], digest + ".mp3")
+
+    @asynccontextmanager
+    async def open(self, master: str, profile: "EncodingProfile",
+                   user_id: Optional[int] = None) -> AsyncIterator[Optional[str]]:
+        """
+        Асинхронный контекстный менеджер, возвращающий путь к варианту файла master.
+        Если варианта нет, он кодируется из мастер-копии. Пока контекст не закрыт, вариант не удаляется.
+        Кодирование ставится в очередь ConversionEngine от имени пользователя user_id.
+
+        Returns:
+            Путь к варианту или None, если мастер-копии нет в файловом хранилище.
+
+        Raises:
+            HTTPInternalServerError: ffmpeg не смог перекодировать файл.
+        """
+
+        variant = self.variant_path(master, profile)
+        self._pins[variant] = self._pins.get(variant, 0) + 1
+        try:
+            yield await self._get(master, profile, variant, user_id)
+        finally:
+            self._pins[variant] -= 1
+            if not self._pins[variant]:
+                del self._pins[variant]
+            await self._evict()
+
+    async def _get(self, master: str, profile: "EncodingProfile", variant: str,
+                   user_id: Optional[int]) -> Optional[str]:
+        if variant in self._entries:
+            # Вариант мог удалить другой процесс веб-сервиса (invalidate, вытеснение): их списки вариантов
+            # не синхронизируются, поэтому наличие файла проверяется перед каждой отправкой.
+            if await aiofiles.os.path.exists(variant):
+                self._entries.move_to_end(variant)
+                self.stats.hits += 1
+                return variant
+            self.total_bytes -= self._entries.pop(variant)
+        self.stats.misses += 1
+        task = self._pending.get(variant)
+        if task is None:
+            task = asyncio.ensure_future(self._encode(master, profile, variant, user_id))
+            self._pending[variant] = task
+            task.add_done_callback(lambda done: self._forget(variant, done))
+        # Кодирование выполняется отдельной задачей и не отменяется,
+        # если клиент, вызвавший промах, отключился раньше остальных.
+        return await asyncio.shield(task)
+
+    async def stop(self, _: "Application") -> None:
+        """
+        Отменяет кодирование вариантов, которые больше никто не ожидает. Незавершенные файлы удаляются.
+        Метод вызывается один раз при остановке приложения, после завершения HTTP запросов.
+        """
+
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _forget(self, variant: str, task: "asyncio.Future[Optional[str]]") -> None:
+        if self._pending.get(variant) is task:
+            del self._pending[variant]
+
+    async def _encode(self, master: str, profile: "EncodingProfile", variant: str,
+                      user_id: Optional[int]) -> Optional[str]:
+        """
+        Кодирует вариант из мастер-копии. Мастер-копия из объектного хранилища предварительно
+        сохраняется рядом с вариантом, так как ffmpeg читает mp3 файл с произвольным доступом.
+        """
+
+        try:
+            # Вариант мог быть создан другим процессом веб-сервиса.
+            st = await aiofiles.os.stat(variant)
+            self._add(variant, st.st_size)
+            return variant
+        except FileNotFoundError:
+            pass
+        await ensure_directory(path.dirname(variant))
+        source = self.storage.local_path(master)
+        downloaded = source is None
+        if source is None:
+            source = variant + SOURCE_SUFFIX
+            if not await self._download(master, source):
+                return None
+        elif not await aiofiles.os.path.exists(source):
+            return None
+        partial = partial_path(variant)
+        try:
+            # Длительность мастер-копии оценивается по ее размеру и битрейту.
+            cost = (await aiofiles.os.stat(source)).st_size * 8 / MASTER_PROFILE.bitrate
+            code, _, _ = await self.engine.execute(["ffmpeg", "-y", "-i", source, *profile.params(),
+                                                    "-f", "mp3", partial], user_id=user_id, cost=cost)
+            if code != 0:
+                raise HTTPInternalServerError(reason=f"Failed to encode the file with profile {profile.name}.")
+            await publish(partial, variant)
+        finally:
+            await discard(partial)
+            if downloaded:
+                await discard(source)
+        self._add(variant, (await aiofiles.os.stat(variant)).st_size)
+        return variant
+
+    async def _download(self, master: str, file_path: str) -> bool:
+        """
+        Сохраняет файл master из файлового хранилища в локальный файл file_path.
+
+        Returns:
+            False, если файла нет в хранилище.
+        """
+
+        stream = await self.storage.open(master)
+        if stream is None:
+            return False
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                while chunk := await stream.read(SOURCE_CHUNK_SIZE):
+                    await f.write(chunk)
+        except BaseException:
+            await discard(file_path)
+            raise
+        finally:
+            await stream.close()
+        return True
+
+    def _add(self, variant: str, size: int) -> None:
+        self.total_bytes += size - self._entries.get(variant, 0)
+        self._entries[variant] = size
+        self._entries.move_to_end(variant)
+
+    async def _evict(self) -> None:
+        """
+        Удаляет давно не запрошенные варианты, пока их суммарный размер превышает max_bytes.
+        """
+
+        victims = []
+        for variant, size in self._entries.items():
+            if self.total_bytes <= self.max_bytes:
+                break
+            if variant in self._pins:
+                continue
+            victims.append(variant)
+            self.total_bytes -= size
+        for variant in victims:
+            del self._entries[variant]
+        for variant in victims:
+            await discard(variant)
+
+    async def invalidate(self, master: str) -> None:
+        """
+        Удаляет все варианты файла master. Вызывается после удаления файла из файлового хранилища.
+        """
+
+        for profile in self.profiles.values():
+            variant = self.variant_path(master, profile)
+            self.total_bytes -= self._entries.pop(variant, 0)
+            self._pending.pop(variant, None)
+            await discard(variant)
+
+
+def setup_variant_cache(app: "Application"):
+    """
+    Устанавливает экземпляр класса VariantCache для текущего экземпляра приложения.
+    """
+    config: "Config" = app["config"]
+    stats = register_stats(app, "variants", CacheStats())
+    variant_cache = VariantCache(app, root=config.variants.root, max_bytes=config.variants.max_bytes,
+                                 profiles=config.variants.profiles, stats=stats)
+    app["variant_cache"] = variant_cache
+    app.on_startup.append(variant_cache.start)
+    app.on_cleanup.append(variant_cache.stop)
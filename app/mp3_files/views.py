@@ -1,21 +1,54 @@
+import asyncio
 import json
-from typing import List, TYPE_CHECKING
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
 
-from aiohttp_apispec import docs, response_schema, querystring_schema
-from aiohttp.web_exceptions import HTTPBadRequest
-from aiohttp.web import Response
+from aiohttp_apispec import docs, request_schema, response_schema, querystring_schema
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPException
+from aiohttp import hdrs
+from aiohttp.helpers import ETAG_ANY
+from aiohttp.web import FileResponse, Response, StreamResponse
 from marshmallow.exceptions import ValidationError
-from app.mp3_files.models import Mp3FileModel
+import aiofiles.os
+from app.mp3_files.cache import RecordMeta
+from app.mp3_files.export import write_zip
+from app.mp3_files.models import ConversionJobModel, Mp3FileModel, UploadSessionModel
 
-from app.users.models import UserModel
 from app.web.bases import View
-from app.mp3_files.schemas import Mp3FileShcemaResponse, Mp3FileShcemaRequest, RequestMp3DownloadFileSchema
-from app.web.utils import error_json_response, json_response
+from app.mp3_files.schemas import (
+    ConversionJobResponseSchema,
+    Mp3FileConvertQuerySchema,
+    Mp3FilesConvertResponseSchema,
+    Mp3FileShcemaResponse,
+    Mp3FileShcemaRequest,
+    RequestConversionJobStatusSchema,
+    RequestMp3DownloadFileSchema,
+    RequestMp3DownloadProfileSchema,
+    RequestMp3ExportSchema,
+    UploadCreateRequestSchema,
+    UploadQuerySchema,
+    UploadResponseSchema
+)
+from app.web.schemes import OkResponseSchema
+from app.mp3_files.uploads import parse_checksum
+from app.web.utils import error_json_response, json_response, job_status_url, record_url, upload_url
 from app.wav_file.wav import WavFile
-from app.web.utils import file_sender
 
 if TYPE_CHECKING:
+    from aiohttp import BodyPartReader, MultipartReader
+    from aiohttp.web import Application
+    from app.mp3_files.cache import RecordCache
+    from app.mp3_files.uploads import UploadManager
+    from app.mp3_files.variants import VariantCache
     from app.store.database.database import Database
+    from app.users.auth import UserAuthCache
+    from app.store.storage import StorageBackend
+    from app.wav_file.profiles import EncodingProfile
+
+# Размер блока, которым FileResponse читает файл, если sendfile недоступен.
+FILE_CHUNK_SIZE = 256*1024
+# Заголовки загрузки файла по частям (как в протоколе tus): смещение части и ее контрольная сумма.
+UPLOAD_OFFSET = "Upload-Offset"
+UPLOAD_CHECKSUM = "Upload-Checksum"
 
 
 class ConvertFileView(View):
@@ -26,13 +59,22 @@ class ConvertFileView(View):
         View (_type_): Базовый класс представление.
     """
 
-    @docs(tags=["files"], summary="Convert a WAV format file to a mp3 format file.")
+    @docs(tags=["files"], summary="Convert a WAV format file to a mp3 format file.",
+          description="Several files may be sent in one request. Then the response data is a list "
+                      "of {filename, url, job, error} items, one per file.")
+    @querystring_schema(Mp3FileConvertQuerySchema)
     @response_schema(Mp3FileShcemaResponse, 200)
+    @response_schema(ConversionJobResponseSchema, 202)
     async def post(self):
         """
         Вью-метод для POST-запроса.
-        Метод декорируется "@response_schema", "@docs" с целью добавления информации о запросе
+        Метод декорируется "@response_schema", "@docs", "@querystring_schema" с целью добавления информации о запросе
         в спецификацию Swagger и промежуточное программное обеспечение validation_middleware для валидации данных.
+        Если передан параметр mode=async, файл сохраняется на диск, а клиенту сразу возвращается ответ
+        с кодом 202 и идентификатором фоновой задачи на конвертацию.
+        Если передан параметр mode=stream, mp3 файл передается в ответе по мере конвертации (см. _convert_stream).
+        Запрос может содержать несколько файлов. Они конвертируются одновременно, а в ответе
+        для каждого файла возвращается url адрес (или фоновая задача) либо описание ошибки.
 
         Raises:
             HTTPBadRequest: Возбуждает исключение в случае невалидных данных в POST-запросе от клиента.
@@ -51,23 +93,150 @@ class ConvertFileView(View):
                                        status="bad request",
                                        data=e.messages_dict,
                                        message="Unprocessable Entity")
-        database: "Database" = self.request.app["database"]
-        user_id = await UserModel.get_user_id(database, int(user_id), user_uuid)  # type: ignore
+        auth_cache: "UserAuthCache" = self.request.app["user_auth_cache"]
+        user_id = await auth_cache.get_user_id(int(user_id), user_uuid)  # type: ignore
         if not user_id:
             return error_json_response(http_status=404,
                                        status="not found",
                                        message="User not found")
-        multipart_reader = await self.request.multipart()
-        body_part_reader = await multipart_reader.next()
-        if body_part_reader:
-            file = body_part_reader.filename  # type: ignore
-            if file:
+        if self.query.get("mode") == "stream":
+            return await self._convert_stream(await self.request.multipart(), user_id)
+        asynchronous = self.query.get("mode") == "async"
+        entries = await self._receive_files(await self.request.multipart(), user_id, asynchronous)
+        if not entries:
+            raise HTTPBadRequest(reason="File is required.")
+        http_status = 202 if asynchronous else 200
+        if len(entries) == 1:
+            result = entries[0][1].result()
+            if asynchronous:
+                return json_response(ConversionJobResponseSchema(), data={"data": result}, http_status=http_status)
+            return json_response(Mp3FileShcemaResponse(), data={"url": result})
+        items = []
+        for filename, future in entries:
+            item: Dict[str, Any] = {"filename": filename, "url": None, "job": None, "error": None}
+            error = future.exception()
+            if error is None:
+                item["job" if asynchronous else "url"] = future.result()
+            elif isinstance(error, HTTPException):
+                item["error"] = error.reason
+            else:
+                raise error
+            items.append(item)
+        return json_response(Mp3FilesConvertResponseSchema(), data={"data": items}, http_status=http_status)
+
+    async def _convert_stream(self, multipart_reader: "MultipartReader", user_id: int) -> StreamResponse:
+        """
+        Конвертирует первый файл запроса и передает mp3 файл клиенту по мере его записи ffmpeg
+        (chunked transfer encoding), не дожидаясь окончания конвертации. Ответ начинается с первым mp3 фреймом,
+        поэтому ошибки в заголовке файла возвращаются обычным ответом с кодом 400.
+        Заголовки X-Job-Id и X-Job-Status-Url указывают фоновую задачу, по которой после завершения
+        конвертации можно получить url адрес для скачивания записи. Если конвертация прервалась после начала
+        ответа, соединение закрывается, чтобы клиент не принял неполный файл за целый.
+
+        Returns:
+            Экземпляр класса aiohttp.web.StreamResponse.
+        """
+        while True:
+            body_part_reader = await multipart_reader.next()
+            if body_part_reader is None:
+                raise HTTPBadRequest(reason="File is required.")
+            if body_part_reader.filename:  # type: ignore
+                break
+        filename: str = body_part_reader.filename.rsplit(".", maxsplit=1)[0]  # type: ignore
+        app = self.request.app
+        wav_file = WavFile(filename, app, user_id, size_hint=self.request.content_length)
+        chunks = wav_file.progressive(body_part_reader)  # type: ignore
+        response: Optional[StreamResponse] = None
+        try:
+            async for chunk in chunks:
+                if response is None:
+                    job: ConversionJobModel = wav_file.job  # type: ignore
+                    response = StreamResponse(headers={
+                        hdrs.CONTENT_TYPE: "audio/mpeg",
+                        "Content-disposition": f"attachment; filename={filename}",
+                        "X-Job-Id": str(job.id),
+                        "X-Job-Status-Url": job_status_url(app, job.id, user_id),
+                    })
+                    response.enable_chunked_encoding()
+                    await response.prepare(self.request)
+                await response.write(chunk)
+        except ConnectionResetError:
+            # Клиент отключился. Конвертация прерывается, задача переводится в статус "failed".
+            if response is None:
+                raise
+            return response
+        except Exception:
+            if response is not None and self.request.transport is not None:
+                self.request.transport.close()
+            raise
+        finally:
+            await chunks.aclose()
+        if response is None:
+            # ffmpeg не записал ни одного фрейма (например, в файле нет PCM данных). Задача уже завершена,
+            # а wav_file.job хранит ее состояние на момент создания, поэтому она читается из базы данных заново.
+            job = await ConversionJobModel.get_job_by_user(app["database"], user_id,
+                                                           wav_file.job.id)  # type: ignore
+            return json_response(ConversionJobResponseSchema(), data={"data": job_data(app, job or wav_file.job)})
+        await response.write_eof()
+        return response
+
+    async def _receive_files(self, multipart_reader: "MultipartReader", user_id: int,
+                             asynchronous: bool) -> List[Tuple[str, "asyncio.Future[Any]"]]:
+        """
+        Читает файлы из частей multipart запроса по очереди. Конвертация каждого файла запускается
+        сразу после получения его части и выполняется одновременно с чтением следующих частей
+        в пределах общего ограничения ConversionEngine. Первый файл передается в ffmpeg потоком
+        (если это разрешено настройками), остальные сохраняются во временное хранилище,
+        чтобы не задерживать чтение следующих частей.
+
+        Returns:
+            List[Tuple[filename: str, future: asyncio.Future]]: Имя файла и результат для каждой части с файлом:
+            url адрес для скачивания, данные фоновой задачи или исключение HTTPException.
+        """
+        app = self.request.app
+        entries: List[Tuple[str, "asyncio.Future[Any]"]] = []
+        try:
+            while True:
+                body_part_reader = await multipart_reader.next()
+                if body_part_reader is None:
+                    break
+                file = body_part_reader.filename  # type: ignore
+                if not file:
+                    continue
                 res: List[str] = file.rsplit(".", maxsplit=1)
                 filename: str = res[0]
-                mp3_accessor = WavFile(filename, self.request.app, user_id)
-                url = await mp3_accessor.run(body_part_reader)
-                return json_response(Mp3FileShcemaResponse(), data={"url": url})
-        raise HTTPBadRequest(reason="File is required.")
+                mp3_accessor = WavFile(filename, app, user_id,
+                                       size_hint=self._part_size_hint(body_part_reader, first=not entries))
+                future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+                try:
+                    if asynchronous:
+                        job = await mp3_accessor.accept(body_part_reader)  # type: ignore
+                        future.set_result(job_data(app, job))
+                    else:
+                        await mp3_accessor.receive(body_part_reader,  # type: ignore
+                                                   streaming=None if not entries else False)
+                        future = asyncio.ensure_future(mp3_accessor.finish())
+                except HTTPException as e:
+                    future.set_exception(e)
+                entries.append((filename, future))
+            await asyncio.gather(*(future for _, future in entries), return_exceptions=True)
+        except BaseException:
+            for _, future in entries:
+                future.cancel()
+            await asyncio.gather(*(future for _, future in entries), return_exceptions=True)
+            raise
+        return entries
+
+    def _part_size_hint(self, body_part_reader: "BodyPartReader", first: bool) -> Optional[int]:
+        """
+        Возвращает размер файла части multipart запроса для оценки длительности записи: заголовок Content-Length
+        части, а если его нет - Content-Length запроса для первого файла. Для следующих файлов
+        размер запроса включает предыдущие файлы, поэтому оценка не возвращается.
+        """
+        length = body_part_reader.headers.get(hdrs.CONTENT_LENGTH)
+        if length is not None and length.isdigit():
+            return int(length)
+        return self.request.content_length if first else None
 
 
 class DownloadMp3FileView(View):
@@ -78,30 +247,418 @@ class DownloadMp3FileView(View):
     Args:
         View (_type_): Базовый класс представление.
     """
-    @docs(tags=["files"], summary="Download mp3 file.")
-    @querystring_schema(RequestMp3DownloadFileSchema)
+    @docs(tags=["files"], summary="Download mp3 file.",
+          description="The optional profile parameter selects an encoding profile (e.g. mobile, archival). "
+                      "The first request for a profile encodes the file from the stored one.")
+    @querystring_schema(RequestMp3DownloadProfileSchema)
     async def get(self):
         """
         Вью-метод для GET-запроса.
         Метод декорируется "@querystring_schema", "@docs" с целью добавления информации о запросе
         в спецификацию Swagger и промежуточное программное обеспечение validation_middleware для валидации данных.
+        Файл из локального хранилища отправляется через aiohttp.web.FileResponse (sendfile), файл из
+        объектного хранилища передается потоком (см. _stream_file). В обоих случаях поддерживается
+        заголовок Range (ответ 206) и Content-Length. Если ETag из заголовка If-None-Match совпадает с сохраненным
+        в базе данных, возвращается ответ 304 без обращения к файлу.
+        Данные о записи берутся из кэша RecordCache, поэтому повторные запросы не обращаются к базе данных.
+        Если передан параметр profile, отправляется вариант файла из кэша VariantCache.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        variant_cache: "VariantCache" = self.request.app["variant_cache"]
+        profile = None
+        if self.query["profile"] is not None:
+            profile = variant_cache.profiles.get(self.query["profile"])
+            if profile is None:
+                return error_json_response(http_status=400,
+                                           status="bad request",
+                                           message=f"Unknown profile. Available profiles: "
+                                                   f"{', '.join(sorted(variant_cache.profiles))}")
+        record_cache: "RecordCache" = self.request.app["record_cache"]
+        record = await record_cache.get(self.query["user_id"], self.query["record_id"])
+        if not record:
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User or required mp3 file not found")
+        if profile is not None:
+            return await self._send_variant(variant_cache, record, profile)
+        if record.etag and self._etag_matches(record.etag):
+            return Response(status=304, headers={hdrs.ETAG: f'"{record.etag}"'})
+        headers = {
+            "Content-disposition": f"attachment; filename={record.filename}"
+        }
+        storage: "StorageBackend" = self.request.app["storage"]
+        local_path = storage.local_path(record.file_path)
+        response = None
+        if local_path is not None:
+            if await aiofiles.os.path.exists(local_path):
+                response = FileResponse(local_path, chunk_size=FILE_CHUNK_SIZE, headers=headers)
+        else:
+            response = await self._stream_file(storage, record, headers)
+        if response is None:
+            record_cache.invalidate(self.query["user_id"], self.query["record_id"])
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="Required mp3 file not found in storage")
+        return response
+
+    async def _send_variant(self, variant_cache: "VariantCache", record: "RecordMeta",
+                            profile: "EncodingProfile") -> StreamResponse:
+        """
+        Отправляет вариант файла для профиля profile. Ответ передается внутри VariantCache.open,
+        чтобы вариант не был удален из кэша во время передачи.
+        """
+        async with variant_cache.open(record.file_path, profile, self.query["user_id"]) as variant:
+            stored = await variant_cache.files.stat(variant) if variant is not None else None
+            if stored is None:
+                self.request.app["record_cache"].invalidate(self.query["user_id"], self.query["record_id"])
+                return error_json_response(http_status=404,
+                                           status="not found",
+                                           message="Required mp3 file not found in storage")
+            if self._etag_matches(stored.etag):
+                return Response(status=304, headers={hdrs.ETAG: f'"{stored.etag}"'})
+            variant_record = RecordMeta(file_path=variant, filename=f"{record.filename}_{profile.name}",  # type: ignore
+                                        size=stored.size, etag=stored.etag)
+            response = await self._stream_file(variant_cache.files, variant_record, {
+                "Content-disposition": f"attachment; filename={variant_record.filename}"
+            })
+            if response is None:
+                return error_json_response(http_status=404,
+                                           status="not found",
+                                           message="Required mp3 file not found in storage")
+            return response
+
+    async def _stream_file(self, storage: "StorageBackend", record: "RecordMeta",
+                           headers: Dict[str, str]) -> Optional[StreamResponse]:
+        """
+        Передает клиенту файл из объектного хранилища блоками по FILE_CHUNK_SIZE байт.
+        Если передан заголовок Range, из хранилища запрашивается только нужная часть файла.
+
+        Returns:
+            Экземпляр класса aiohttp.web.StreamResponse или None, если файла нет в хранилище.
+        """
+        size = record.size
+        if size is None:
+            stored = await storage.stat(record.file_path)
+            if stored is None:
+                return None
+            size = stored.size
+        try:
+            start, stop, _ = self.request.http_range.indices(size)
+        except ValueError:
+            return Response(status=416, headers={hdrs.CONTENT_RANGE: f"bytes */{size}"})
+        status = 200
+        if hdrs.RANGE in self.request.headers:
+            if start >= stop:
+                return Response(status=416, headers={hdrs.CONTENT_RANGE: f"bytes */{size}"})
+            status = 206
+        stream = await storage.open(record.file_path, start, stop - start)
+        if stream is None:
+            return None
+        try:
+            response = StreamResponse(status=status, headers={**headers, hdrs.CONTENT_TYPE: "audio/mpeg",
+                                                              hdrs.ACCEPT_RANGES: "bytes"})
+            if record.etag:
+                response.headers[hdrs.ETAG] = f'"{record.etag}"'
+            if status == 206:
+                response.headers[hdrs.CONTENT_RANGE] = f"bytes {start}-{stop - 1}/{size}"
+            response.content_length = stop - start
+            await response.prepare(self.request)
+            while chunk := await stream.read(FILE_CHUNK_SIZE):
+                await response.write(chunk)
+            await response.write_eof()
+        finally:
+            await stream.close()
+        return response
+
+    def _etag_matches(self, etag: str) -> bool:
+        """
+        Проверяет, совпадает ли сохраненный в базе данных ETag с одним из значений заголовка If-None-Match.
+        """
+        if_none_match = self.request.if_none_match
+        if not if_none_match:
+            return False
+        return any(value.value in (etag, ETAG_ANY) for value in if_none_match)
+
+    @docs(tags=["files"], summary="Delete mp3 file.")
+    @querystring_schema(RequestMp3DownloadFileSchema)
+    @response_schema(OkResponseSchema, 200)
+    async def delete(self):
+        """
+        Вью-метод для DELETE-запроса.
+        Удаляет запись о mp3 файле. Сам файл удаляется из файлового хранилища,
+        только если на него не ссылаются другие записи. Пользователь подтверждает запрос
+        заголовком user_uuid, как в конечной точке /files.convert.
 
         Returns:
             _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
         """
-        data = self.query
+        user_uuid = self.request.headers.get("user_uuid")
+        data = {"user_id": self.query["user_id"], "user_uuid": user_uuid}
+        try:
+            Mp3FileShcemaRequest().loads(json.dumps(data))
+        except ValidationError as e:
+            return error_json_response(http_status=400,
+                                       status="bad request",
+                                       data=e.messages_dict,
+                                       message="Unprocessable Entity")
+        auth_cache: "UserAuthCache" = self.request.app["user_auth_cache"]
+        if not await auth_cache.get_user_id(self.query["user_id"], user_uuid):  # type: ignore
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User not found")
         database: "Database" = self.request.app["database"]
-        mp3_model = await Mp3FileModel.get_mp3_by_user(database, **data)
+        mp3_model, orphan_path = await Mp3FileModel.delete_file(database, **self.query)
+        self.request.app["record_cache"].invalidate(self.query["user_id"], self.query["record_id"])
         if not mp3_model:
             return error_json_response(http_status=404,
                                        status="not found",
                                        message="User or required mp3 file not found")
-        else:
-            headers = {
-                "Content-disposition": f"attachment; filename={mp3_model.filename}"
-            }
-            body = file_sender(file_name=mp3_model.file_path)
-            return Response(
-                body=body,
-                headers=headers
-            )
+        if orphan_path:
+            await self.request.app["storage"].delete(orphan_path)
+            await self.request.app["variant_cache"].invalidate(orphan_path)
+        return json_response(OkResponseSchema())
+
+
+class ExportMp3FilesView(View):
+    """
+    Класс представление для конечной точки
+    /files.export?user_id=id_пользователя&record_id=id_записи
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["files"], summary="Download user's mp3 files as a ZIP archive.")
+    @querystring_schema(RequestMp3ExportSchema)
+    async def get(self):
+        """
+        Вью-метод для GET-запроса.
+        Отправляет ZIP архив (без сжатия) с выбранными или всеми mp3 файлами пользователя.
+        Архив формируется по мере чтения файлов и передается клиенту потоком,
+        без сохранения на диск и без накопления в оперативной памяти.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web.StreamResponse.
+        """
+        user_id = self.query["user_id"]
+        database: "Database" = self.request.app["database"]
+        files = await Mp3FileModel.get_files_by_user(database, user_id, self.query["record_id"])
+        if not files:
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User or required mp3 files not found")
+        response = StreamResponse(headers={
+            hdrs.CONTENT_TYPE: "application/zip",
+            "Content-disposition": f"attachment; filename=mp3_files_{user_id}.zip"
+        })
+        await response.prepare(self.request)
+        await write_zip(response, self.request.app["storage"], files, FILE_CHUNK_SIZE)
+        await response.write_eof()
+        return response
+
+
+class ConversionJobStatusView(View):
+    """
+    Класс представление для конечной точки
+    /files.status?job_id=id_задачи&user_id=id_пользователя
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+    @docs(tags=["files"], summary="Get the status of a background conversion job.")
+    @querystring_schema(RequestConversionJobStatusSchema)
+    @response_schema(ConversionJobResponseSchema, 200)
+    async def get(self):
+        """
+        Вью-метод для GET-запроса.
+        Возвращает статус фоновой задачи (queued, running, done, failed) и url адрес
+        для скачивания mp3 файла, если задача выполнена.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        database: "Database" = self.request.app["database"]
+        job = await ConversionJobModel.get_job_by_user(database, **self.query)
+        if not job:
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User or required conversion job not found")
+        return json_response(ConversionJobResponseSchema(), data={"data": job_data(self.request.app, job)})
+
+
+def job_data(app: "Application", job: ConversionJobModel) -> Dict[str, Any]:
+    """
+    Возвращает данные фоновой задачи для ответа клиенту.
+    """
+    return {
+        "id": job.id,
+        "status": job.status,
+        "status_url": job_status_url(app, job.id, job.user_id),
+        "url": record_url(app, job.mp3_file_id, job.user_id) if job.mp3_file_id else None,
+        "error": job.error,
+    }
+
+
+class UploadCreateView(View):
+    """
+    Класс представление для конечной точки "/uploads.create".
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["uploads"], summary="Start a resumable upload of a WAV file.",
+          description="Chunks are sent with PATCH to upload_url, then the upload is finished with POST to finish_url.")
+    @request_schema(UploadCreateRequestSchema)
+    @response_schema(UploadResponseSchema, 201)
+    async def post(self):
+        """
+        Вью-метод для POST-запроса.
+        Создает сессию загрузки файла по частям. Пользователь передается в заголовках user_id и user_uuid,
+        как в конечной точке /files.convert.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        user_id = self.request.headers.get("user_id")
+        user_uuid = self.request.headers.get("user_uuid")
+        data = {"user_id": user_id, "user_uuid": user_uuid}
+        try:
+            Mp3FileShcemaRequest().loads(json.dumps(data))
+        except ValidationError as e:
+            return error_json_response(http_status=400,
+                                       status="bad request",
+                                       data=e.messages_dict,
+                                       message="Unprocessable Entity")
+        auth_cache: "UserAuthCache" = self.request.app["user_auth_cache"]
+        user_id = await auth_cache.get_user_id(int(user_id), user_uuid)  # type: ignore
+        if not user_id:
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User not found")
+        upload_manager: "UploadManager" = self.request.app["upload_manager"]
+        filename: str = self.data["filename"].rsplit(".", maxsplit=1)[0]
+        upload = await upload_manager.create(user_id, filename, self.data["size"])
+        return upload_response(self.request.app, upload, http_status=201)
+
+
+class UploadChunkView(View):
+    """
+    Класс представление для конечной точки
+    /uploads.chunk?upload_id=id_загрузки&user_id=id_пользователя
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["uploads"], summary="Get the offset of a resumable upload.")
+    @querystring_schema(UploadQuerySchema)
+    @response_schema(UploadResponseSchema, 200)
+    async def get(self):
+        """
+        Вью-метод для GET-запроса.
+        Возвращает количество полученных байт (также в заголовке Upload-Offset), с которого клиент
+        продолжает загрузку после разрыва соединения.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        upload = await self._get_upload()
+        if upload is None:
+            return upload_not_found()
+        return upload_response(self.request.app, upload)
+
+    @docs(tags=["uploads"], summary="Send a chunk of a resumable upload.",
+          description="The body is the raw chunk. Headers: Upload-Offset - offset of the chunk (must be equal "
+                      "to the current offset), Upload-Checksum - optional \"<md5|sha1|sha256> <base64 digest>\".")
+    @querystring_schema(UploadQuerySchema)
+    @response_schema(UploadResponseSchema, 200)
+    async def patch(self):
+        """
+        Вью-метод для PATCH-запроса.
+        Записывает тело запроса в файл загрузки со смещения из заголовка Upload-Offset.
+        Если передан заголовок Upload-Checksum, часть принимается только при совпадении контрольной суммы.
+
+        Raises:
+            HTTPBadRequest: Заголовок Upload-Offset не передан или некорректен.
+            HTTPConflict: Смещение не совпадает с количеством полученных байт.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        try:
+            offset = int(self.request.headers[UPLOAD_OFFSET])
+        except (KeyError, ValueError):
+            raise HTTPBadRequest(reason=f"{UPLOAD_OFFSET} header with a non-negative integer is required.")
+        if offset < 0:
+            raise HTTPBadRequest(reason=f"{UPLOAD_OFFSET} header with a non-negative integer is required.")
+        checksum = self.request.headers.get(UPLOAD_CHECKSUM)
+        upload = await self._get_upload()
+        if upload is None:
+            return upload_not_found()
+        upload_manager: "UploadManager" = self.request.app["upload_manager"]
+        upload = await upload_manager.write(upload, offset, self.request.content,
+                                            parse_checksum(checksum) if checksum else None)
+        return upload_response(self.request.app, upload)
+
+    async def _get_upload(self) -> Optional[UploadSessionModel]:
+        database: "Database" = self.request.app["database"]
+        return await UploadSessionModel.get_session(database, self.query["user_id"], self.query["upload_id"])
+
+
+class UploadFinishView(View):
+    """
+    Класс представление для конечной точки
+    /uploads.finish?upload_id=id_загрузки&user_id=id_пользователя
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["uploads"], summary="Finish a resumable upload and start the conversion.")
+    @querystring_schema(UploadQuerySchema)
+    @response_schema(ConversionJobResponseSchema, 202)
+    async def post(self):
+        """
+        Вью-метод для POST-запроса.
+        Завершает загрузку, в которую получен весь файл, и ставит его в очередь фоновых задач на конвертацию.
+        Ответ такой же, как у /files.convert?mode=async.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        database: "Database" = self.request.app["database"]
+        upload = await UploadSessionModel.get_session(database, self.query["user_id"], self.query["upload_id"])
+        if upload is None:
+            return upload_not_found()
+        upload_manager: "UploadManager" = self.request.app["upload_manager"]
+        job = await upload_manager.finish(upload)
+        return json_response(ConversionJobResponseSchema(), data={"data": job_data(self.request.app, job)},
+                             http_status=202)
+
+
+def upload_response(app: "Application", upload: UploadSessionModel, http_status: int = 200) -> Response:
+    """
+    Возвращает ответ с данными загрузки и заголовком Upload-Offset.
+    """
+    data = {
+        "id": upload.uuid,
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.offset,
+        "expires_at": upload.expires_at,
+        "upload_url": upload_url(app, upload.uuid, upload.user_id),
+        "finish_url": upload_url(app, upload.uuid, upload.user_id, endpoint="finish"),
+    }
+    response = json_response(UploadResponseSchema(), data={"data": data}, http_status=http_status)
+    response.headers[UPLOAD_OFFSET] = str(upload.offset)
+    response.headers[hdrs.CACHE_CONTROL] = "no-store"
+    return response
+
+
+def upload_not_found() -> Response:
+    return error_json_response(http_status=404,
+                               status="not found",
+                               message="User or required upload not found or expired")
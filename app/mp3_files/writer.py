@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+
+from app.mp3_files.models import Mp3FileModel
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.database.database import Database
+    from app.web.config import Config
+
+
+PendingInsert = Tuple[Dict[str, Any], "asyncio.Future[Mp3FileModel]"]
+
+
+class Mp3FileBatchWriter:
+    """
+    Класс, объединяющий добавление записей в таблицу "mp3_files" в пакеты.
+    Записи накапливаются в течение window секунд или пока их не станет max_batch,
+    после чего добавляются одним запросом INSERT ... RETURNING в одной транзакции.
+    Каждый вызывающий получает свою запись. Если пакет нарушает ограничение целостности
+    (например, пользователь был удален), записи добавляются по одной, и ошибку получает только
+    вызывающий, чья запись ее вызвала.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        enabled: Объединять записи в пакеты. Если False, каждая запись добавляется отдельной транзакцией.
+        window: Время накопления пакета в секундах.
+        max_batch: Максимальное количество записей в пакете.
+    """
+
+    def __init__(self, app: "Application", enabled: bool, window: float, max_batch: int):
+        self.app = app
+        self.enabled = enabled
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[PendingInsert] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def database(self) -> "Database":
+        return self.app["database"]
+
+    async def insert(self, user_id: int, file_path: str, filename: str, content_id: Optional[int] = None,
+                     size: Optional[int] = None, etag: Optional[str] = None,
+                     uuid: Optional[UUID] = None) -> Mp3FileModel:
+        """
+        Добавляет запись о файле в таблицу "mp3_files" и возвращает ее.
+        Аргументы совпадают с аргументами Mp3FileModel.inser_file.
+        """
+        values = dict(user_id=user_id, file_path=file_path, filename=filename, content_id=content_id,
+                      size=size, etag=etag, uuid=uuid)
+        if not self.enabled or self._closed:
+            return await Mp3FileModel.inser_file(self.database, **values)
+        future: "asyncio.Future[Mp3FileModel]" = asyncio.get_running_loop().create_future()
+        self._pending.append((values, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    async def close(self, _: "Application") -> None:
+        """
+        Записывает накопленные записи и дожидается завершения начатых запросов.
+        Метод вызывается один раз при остановке приложения, до отключения от базы данных.
+        """
+        self._closed = True
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[PendingInsert]) -> None:
+        try:
+            models = await Mp3FileModel.insert_files(self.database, [values for values, _ in batch])
+        except IntegrityError:
+            await self._write_one_by_one(batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), mp3_model in zip(batch, models):
+                if not future.done():
+                    future.set_result(mp3_model)
+
+    async def _write_one_by_one(self, batch: List[PendingInsert]) -> None:
+        for values, future in batch:
+            try:
+                mp3_model = await Mp3FileModel.inser_file(self.database, **values)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(mp3_model)
+
+
+def setup_mp3_file_writer(app: "Application"):
+    """
+    Устанавливает экземпляр класса Mp3FileBatchWriter для текущего экземпляра приложения.
+    """
+    config: "Config" = app["config"]
+    app["mp3_file_writer"] = Mp3FileBatchWriter(app,
+                                                enabled=config.converter.batch_insert,
+                                                window=config.converter.batch_insert_window,
+                                                max_batch=config.converter.batch_insert_size)
+    app.on_shutdown.append(app["mp3_file_writer"].close)
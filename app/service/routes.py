@@ -0,0 +1,16 @@
+from typing import TYPE_CHECKING
+
+from app.service.views import MetricsView, StatsView
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from aiohttp_cors import CorsConfig
+
+
+def setup_routes(app: "Application"):
+    """
+    Устанавливает служебные конечные точки веб-приложения.
+    """
+    cors: "CorsConfig" = app["cors"]
+    cors.add(app.router.add_view("/service.stats", StatsView))
+    cors.add(app.router.add_view("/metrics", MetricsView))
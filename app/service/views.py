@@ -0,0 +1,44 @@
+from aiohttp_apispec import docs
+from aiohttp.web import Response, json_response
+
+from app.web.bases import View
+from app.web.metrics import CONTENT_TYPE
+
+
+class StatsView(View):
+    """
+    Класс представление для конечной точки "/service.stats".
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["service"], summary="Cache hit/miss counters.")
+    async def get(self):
+        """
+        Вью-метод для GET-запроса. Возвращает счетчики, зарегистрированные через app.web.stats.register_stats.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        stats = self.request.app.get("stats", {})
+        return json_response({"status": "ok", "data": {name: value.as_dict() for name, value in stats.items()}})
+
+
+class MetricsView(View):
+    """
+    Класс представление для конечной точки "/metrics".
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["service"], summary="Service metrics in the Prometheus text format.")
+    async def get(self):
+        """
+        Вью-метод для GET-запроса. Возвращает метрики app.web.metrics.Metrics в текстовом формате Prometheus.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        return Response(text=self.request.app["metrics"].render(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+from app.web.stats import CacheStats
+
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Кэш в оперативной памяти с вытеснением давно не использованных записей (LRU)
+    и ограниченным временем жизни записей (TTL).
+    Значение None тоже кэшируется (negative caching) со своим временем жизни negative_ttl.
+    Если передан max_cost, суммарная стоимость записей (например, занимаемая память) не превышает его.
+
+    Args:
+        max_size: Максимальное количество записей.
+        ttl: Время жизни записи в секундах.
+        negative_ttl: Время жизни записи со значением None в секундах.
+        stats: Счетчики попаданий и промахов.
+        max_cost: Максимальная суммарная стоимость записей.
+        cost: Функция, возвращающая стоимость записи.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: Optional[float] = None,
+                 stats: Optional[CacheStats] = None, max_cost: Optional[int] = None,
+                 cost: Optional[Callable[[Optional[V]], int]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.stats = stats or CacheStats()
+        self.max_cost = max_cost
+        self.total_cost = 0
+        self._cost = cost or (lambda _: 0)
+        self._data: "OrderedDict[Hashable, Tuple[float, Optional[V], int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[V]]:
+        """
+        Возвращает значение из кэша.
+
+        Returns:
+            Tuple[found: bool, value: Optional[V]]: found равен False, если записи нет или ее время жизни истекло.
+        """
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                self.invalidate(key)
+            self.stats.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return True, item[1]
+
+    def set(self, key: Hashable, value: Optional[V]) -> None:
+        """
+        Добавляет значение в кэш. Если кэш заполнен, вытесняется давно не использованная запись.
+        """
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self.invalidate(key)
+        cost = self._cost(value)
+        self._data[key] = (time.monotonic() + ttl, value, cost)
+        self.total_cost += cost
+        while len(self._data) > self.max_size or (self.max_cost is not None and self.total_cost > self.max_cost):
+            _, (_, _, evicted_cost) = self._data.popitem(last=False)
+            self.total_cost -= evicted_cost
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Удаляет запись из кэша.
+        """
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.total_cost -= item[2]
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        """
+        Удаляет из кэша все записи, для ключа и значения которых predicate возвращает True.
+        """
+        for key in [key for key, (_, value, _) in self._data.items() if predicate(key, value)]:
+            self.invalidate(key)
@@ -4,18 +4,35 @@ from aiohttp.web import Application
 import yaml
 
 from app.store.database.database import Database
+from app.web.stats import PoolStats, register_stats
 
 
 @dataclass
 class DatabaseConfig:
     """
     Класс, содержащий конфигурационные настройки базы данных.
+    Args:
+        pool_size: Количество соединений, которые пул держит открытыми.
+        max_overflow: Количество дополнительных соединений сверх pool_size при пиковой нагрузке.
+        pool_timeout: Время ожидания свободного соединения в секундах.
+        pool_recycle: Время в секундах, после которого соединение переоткрывается. -1 - не переоткрывать.
+        pool_pre_ping: Проверять соединение перед выдачей из пула.
+        pool_min_size: Количество соединений, открываемых при запуске приложения (не больше pool_size).
+        statement_cache_size: Размер кэша подготовленных выражений asyncpg на одно соединение.
+        0 - кэш отключен (необходимо при работе через pgbouncer в режиме transaction).
     """
     host: str
     port: int
     user: str
     password: str
     database: str
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = False
+    pool_min_size: int = 10
+    statement_cache_size: int = 100
 
 
 def setup_config(config_path: str) -> DatabaseConfig:
@@ -35,11 +52,14 @@ def setup_database(app: "Application"):
     """
     Устанавливает экземпляр класса Database для текущего экземпляра приложения Application.
     Также, добавляет методы Database.connect и Database.disconnect в сигналы.
+    Счетчики пула соединений отдаются конечной точкой /service.stats под именем "database".
 
     Args:
         app (Application): _description_
     """
     config: DatabaseConfig = app["config"].database
-    app["database"] = Database(config)
+    metrics = app.get("metrics")
+    app["database"] = Database(config, stats=register_stats(app, "database", PoolStats()),
+                               query_time=metrics.db_query_seconds if metrics else None)
     app.on_startup.append(app["database"].connect)
     app.on_cleanup.append(app["database"].disconnect)
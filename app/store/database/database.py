@@ -1,29 +1,78 @@
-from typing import Any, Optional, TYPE_CHECKING
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar, TYPE_CHECKING
 
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.engine.url import URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
 
 from app.store.database.sqlalchemy_base import db
+from app.web.stats import PoolStats
+from app.web.timing import record_phase
 
 if TYPE_CHECKING:
     from aiohttp.web import Application
     from app.store.database.config import DatabaseConfig
+    from app.web.metrics import Histogram
+
+
+T = TypeVar("T")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает время ожидания соединения и количество используемых соединений.
+    Время ожидания включает установку нового соединения, если свободных соединений в пуле нет.
+    """
+
+    stats: PoolStats
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.monotonic()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        wait = time.monotonic() - start
+        self.stats.checkouts += 1
+        self.stats.wait_time += wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        self.stats.checked_out = self.checkedout()
+        self.stats.peak_checked_out = max(self.stats.peak_checked_out, self.stats.checked_out)
+        return connection
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self.stats.checked_out = self.checkedout()
+
+    def recreate(self) -> "InstrumentedPool":
+        pool = super().recreate()
+        pool.stats = self.stats  # type: ignore
+        return pool  # type: ignore
 
 
 class Database:
     """
     Класс для соединения с базой данных.
     """
-    def __init__(self, config: "DatabaseConfig"):
+    def __init__(self, config: "DatabaseConfig", stats: Optional[PoolStats] = None,
+                 query_time: Optional["Histogram"] = None):
         self.config = config
+        self.stats = stats or PoolStats()
+        self.query_time = query_time
         self._engine: Optional[AsyncEngine]
         self._db: Any
         self.session: async_sessionmaker[AsyncSession]
 
     async def connect(self, _: "Application") -> None:
         """
-        Создает объект класса AsyncSession. Метод вызывается один раз при запуске приложения.
+        Создает объект класса AsyncSession и открывает pool_min_size соединений,
+        чтобы первые запросы после запуска не тратили время на установку соединения.
+        Метод вызывается один раз при запуске приложения.
         """
         self._db = db
         self._engine = create_async_engine(
@@ -34,11 +83,36 @@ class Database:
                 username=self.config.user,
                 password=self.config.password,
                 port=self.config.port,
+                query={"prepared_statement_cache_size": str(self.config.statement_cache_size)},
                 ),
             echo=False,
-            future=True
+            future=True,
+            poolclass=InstrumentedPool,
+            pool_size=self.config.pool_size,
+            max_overflow=self.config.max_overflow,
+            pool_timeout=self.config.pool_timeout,
+            pool_recycle=self.config.pool_recycle,
+            pool_pre_ping=self.config.pool_pre_ping,
+            connect_args={"statement_cache_size": self.config.statement_cache_size},
         )
+        self._engine.sync_engine.pool.stats = self.stats  # type: ignore
+        self.stats.capacity = self.config.pool_size + self.config.max_overflow
         self.session = async_sessionmaker(bind=self._engine, expire_on_commit=False, class_=AsyncSession)
+        await self._warm_up(min(self.config.pool_min_size, self.config.pool_size))
+
+    async def _warm_up(self, size: int) -> None:
+        """
+        Одновременно открывает size соединений и возвращает их в пул.
+        """
+        if not self._engine or size <= 0:
+            return
+        connections = [self._engine.connect() for _ in range(size)]
+        results = await asyncio.gather(*(connection.start() for connection in connections), return_exceptions=True)
+        for connection in connections:
+            await connection.close()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
     async def disconnect(self, _: "Application") -> None:
         """
@@ -48,3 +122,25 @@ class Database:
 
         if self._engine:
             await self._engine.dispose()
+
+
+def timed(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """
+    Декоратор статических методов моделей, первым аргументом которых является экземпляр Database.
+    Время выполнения метода записывается в гистограмму Database.query_time с меткой "Модель.метод"
+    и в этап "db.Модель.метод" текущего запроса (app.web.timing).
+    """
+    name = func.__qualname__
+    phase_name = f"db.{name}"
+
+    @functools.wraps(func)
+    async def wrapper(database: Database, *args: Any, **kwargs: Any) -> T:
+        start = time.perf_counter()
+        try:
+            return await func(database, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if database.query_time is not None:
+                database.query_time.observe(elapsed, name)
+            record_phase(phase_name, elapsed)
+    return wrapper
@@ -0,0 +1,182 @@
+"""
+Переносит конвертированные файлы из директорий вида ./media/%Y/%b/%d/%H/%M/%S
+в хранилище с разбиением по UUID записи (app.store.storage) и обновляет пути в базе данных.
+
+Запуск (из корня проекта, при остановленном приложении, так как во время переноса приложение
+может добавить запись, ссылающуюся на уже перенесенный файл по старому пути):
+    python -m app.store.migrate_storage [--config app/config.yml] [--batch-size 1000] [--dry-run]
+
+Каждый файл сначала становится доступен по новому пути (жесткая ссылка или копия с переименованием),
+затем в одной транзакции обновляются записи "mp3_files" и "mp3_contents", и только после этого
+удаляется старый путь. Поэтому миграцию можно прервать и запустить повторно в любой момент.
+Миграция работает только с локальным хранилищем (storage.backend: local): старые файлы всегда
+хранились в локальной файловой системе.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+from os import path
+from typing import Optional, Set
+from uuid import UUID, uuid4
+
+import aiofiles.os
+from sqlalchemy import select, update
+
+from app.mp3_files.models import Mp3ContentModel, Mp3FileModel
+from app.store.database.config import setup_config
+from app.store.database.database import Database
+from app.store.storage.layout import MEDIA_ROOT, ensure_directory, file_path_for, is_sharded, partial_path
+
+
+logger = logging.getLogger(__name__)
+
+
+class StorageMigration:
+    """
+    Класс, переносящий файлы в хранилище с разбиением по UUID.
+
+    Args:
+        database: Экземпляр класса Database.
+        batch_size: Количество записей, читаемых из базы данных за один запрос.
+        dry_run: Только вывести, какие файлы будут перенесены.
+    """
+
+    def __init__(self, database: Database, batch_size: int, dry_run: bool):
+        self.database = database
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.moved = 0
+        self.missing = 0
+
+    async def run(self) -> None:
+        await self._migrate_files()
+        await self._migrate_contents()
+        if not self.dry_run:
+            await asyncio.to_thread(remove_legacy_directories, MEDIA_ROOT)
+        logger.info("Moved %s files, %s files not found in storage", self.moved, self.missing)
+
+    async def _migrate_files(self) -> None:
+        """
+        Переносит файлы записей "mp3_files". Новый путь определяется UUID первой записи, ссылающейся на файл.
+        """
+        last_id = 0
+        while True:
+            query = (select(Mp3FileModel.id, Mp3FileModel.uuid, Mp3FileModel.file_path)
+                     .where(Mp3FileModel.id > last_id)
+                     .order_by(Mp3FileModel.id)
+                     .limit(self.batch_size))
+            async with self.database.session() as session:
+                rows = (await session.execute(query)).all()
+            if not rows:
+                return
+            moved: Set[str] = set()
+            for record_id, key, file_path in rows:
+                last_id = record_id
+                if is_sharded(file_path) or file_path in moved:
+                    continue
+                if await self._move(file_path, key):
+                    moved.add(file_path)
+
+    async def _migrate_contents(self) -> None:
+        """
+        Переносит файлы "mp3_contents", на которые не ссылается ни одна запись "mp3_files".
+        """
+        last_id = 0
+        while True:
+            query = (select(Mp3ContentModel.id, Mp3ContentModel.file_path)
+                     .where(Mp3ContentModel.id > last_id)
+                     .order_by(Mp3ContentModel.id)
+                     .limit(self.batch_size))
+            async with self.database.session() as session:
+                rows = (await session.execute(query)).all()
+            if not rows:
+                return
+            for content_id, file_path in rows:
+                last_id = content_id
+                if not is_sharded(file_path):
+                    await self._move(file_path, uuid4())
+
+    async def _move(self, file_path: str, key: UUID) -> Optional[str]:
+        """
+        Переносит один файл и обновляет все записи, ссылающиеся на него.
+
+        Returns:
+            Новый путь к файлу или None, если файл не найден в хранилище.
+        """
+        new_path = file_path_for(key)
+        exists = await aiofiles.os.path.exists(file_path)
+        if not exists and not await aiofiles.os.path.exists(new_path):
+            logger.warning("File %s not found in storage", file_path)
+            self.missing += 1
+            return None
+        if self.dry_run:
+            logger.info("%s -> %s", file_path, new_path)
+            self.moved += 1
+            return new_path
+        if exists:
+            await ensure_directory(path.dirname(new_path))
+            await asyncio.to_thread(link_or_copy, file_path, new_path)
+        async with self.database.session() as session:
+            await session.execute(update(Mp3FileModel)
+                                  .where(Mp3FileModel.file_path == file_path)
+                                  .values(file_path=new_path))
+            await session.execute(update(Mp3ContentModel)
+                                  .where(Mp3ContentModel.file_path == file_path)
+                                  .values(file_path=new_path))
+            await session.commit()
+        if exists:
+            await aiofiles.os.remove(file_path)
+        self.moved += 1
+        return new_path
+
+
+def link_or_copy(source: str, target: str) -> None:
+    """
+    Делает файл source доступным по пути target. Если оба пути на одной файловой системе,
+    создается жесткая ссылка, иначе файл копируется во временный файл и атомарно переименовывается.
+    """
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        if not path.samefile(source, target):
+            raise
+    except OSError:
+        partial = partial_path(target)
+        shutil.copy2(source, partial)
+        os.replace(partial, target)
+
+
+def remove_legacy_directories(root: str) -> None:
+    """
+    Удаляет пустые директории старой структуры хранилища (root/%Y/%b/%d/%H/%M/%S).
+    """
+    for name in os.listdir(root):
+        if not (len(name) == 4 and name.isdigit()):
+            continue
+        for directory, _, _ in os.walk(path.join(root, name), topdown=False):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Move mp3 files to the UUID-sharded storage layout.")
+    parser.add_argument("--config", default=path.join(path.dirname(path.dirname(path.realpath(__file__))),
+                                                      "config.yml"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    database = Database(setup_config(args.config))
+    await database.connect(None)  # type: ignore
+    try:
+        await StorageMigration(database, args.batch_size, args.dry_run).run()
+    finally:
+        await database.disconnect(None)  # type: ignore
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
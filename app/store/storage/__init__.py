@@ -0,0 +1,38 @@
+from app.store.storage.base import ObjectStream, StorageBackend, StorageError, StoredObject
+from app.store.storage.layout import (
+    FANOUT_LEVELS,
+    FANOUT_WIDTH,
+    FILES_ROOT,
+    MEDIA_ROOT,
+    PARTIAL_SUFFIX,
+    UPLOADS_ROOT,
+    discard,
+    ensure_directory,
+    file_path_for,
+    is_sharded,
+    partial_path,
+    publish,
+)
+from app.store.storage.local import LocalStorage
+from app.store.storage.s3 import S3Storage
+
+__all__ = [
+    "FANOUT_LEVELS",
+    "FANOUT_WIDTH",
+    "FILES_ROOT",
+    "MEDIA_ROOT",
+    "PARTIAL_SUFFIX",
+    "UPLOADS_ROOT",
+    "LocalStorage",
+    "ObjectStream",
+    "S3Storage",
+    "StorageBackend",
+    "StorageError",
+    "StoredObject",
+    "discard",
+    "ensure_directory",
+    "file_path_for",
+    "is_sharded",
+    "partial_path",
+    "publish",
+]
@@ -0,0 +1,104 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+
+
+class StorageError(Exception):
+    """
+    Исключение, возбуждаемое, если файловое хранилище вернуло ошибку.
+    """
+
+
+@dataclass
+class StoredObject:
+    """
+    Класс, содержащий данные файла в файловом хранилище.
+    Args:
+        size: размер файла в байтах.
+        etag: значение заголовка ETag для файла (без кавычек).
+    """
+    size: int
+    etag: str
+
+
+class ObjectStream(ABC):
+    """
+    Поток для чтения файла (или его части) из файлового хранилища.
+    Args:
+        size: полный размер файла в байтах.
+    """
+
+    size: int
+
+    @abstractmethod
+    async def read(self, chunk_size: int) -> bytes:
+        """
+        Читает не больше chunk_size байт. Пустая строка означает конец потока.
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        Закрывает поток.
+        """
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс файлового хранилища конвертированных файлов.
+    Файл определяется именем, которое хранится в колонке file_path таблиц "mp3_files" и "mp3_contents".
+    ffmpeg всегда пишет результат в локальный файл (output_path), который затем передается
+    в хранилище методом commit.
+    """
+
+    async def start(self, _: "Application") -> None:
+        """
+        Метод вызывается один раз при запуске приложения.
+        """
+
+    async def stop(self, _: "Application") -> None:
+        """
+        Метод вызывается один раз при остановке приложения.
+        """
+
+    @abstractmethod
+    async def output_path(self, name: str) -> str:
+        """
+        Возвращает путь к локальному файлу, в который записывается результат конвертации файла name.
+        """
+
+    @abstractmethod
+    async def commit(self, partial: str, name: str) -> None:
+        """
+        Публикует полностью записанный локальный файл partial под именем name.
+        После вызова файла partial больше не существует.
+        """
+
+    @abstractmethod
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        """
+        Возвращает размер и ETag файла или None, если файла нет.
+        """
+
+    @abstractmethod
+    async def open(self, name: str, offset: int = 0, length: Optional[int] = None) -> Optional[ObjectStream]:
+        """
+        Открывает файл для чтения length байт, начиная с offset (до конца файла, если length не передан).
+        Возвращает None, если файла нет.
+        """
+
+    @abstractmethod
+    async def delete(self, name: str) -> None:
+        """
+        Удаляет файл. Отсутствие файла не является ошибкой.
+        """
+
+    def local_path(self, name: str) -> Optional[str]:
+        """
+        Возвращает путь к файлу в локальной файловой системе, если хранилище локальное.
+        Тогда файл можно отправить клиенту через sendfile.
+        """
+        return None
@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from os import path
+from typing import Any
+
+from aiohttp.web import Application
+import yaml
+
+from app.store.storage.base import StorageBackend
+from app.store.storage.layout import MEDIA_ROOT
+from app.store.storage.local import LocalStorage
+from app.store.storage.s3 import S3Storage
+
+
+@dataclass
+class StorageConfig:
+    """
+    Класс, содержащий настройки файлового хранилища конвертированных файлов.
+    Args:
+        backend: Тип хранилища: local - локальная файловая система, s3 - S3-совместимое объектное хранилище.
+        endpoint_url: Url адрес S3 (например, http://localhost:9000 для эмулятора app.store.storage.emulator).
+        bucket: Имя бакета.
+        region: Регион, используемый в подписи запросов.
+        access_key: Идентификатор ключа доступа.
+        secret_key: Секретный ключ доступа.
+        part_size: Размер части при загрузке по частям в байтах. Файлы не больше part_size загружаются
+        одним запросом. S3 требует не меньше 5 Мб для всех частей, кроме последней.
+        upload_concurrency: Количество частей одного файла, загружаемых одновременно.
+        connect_timeout: Время ожидания соединения с S3 в секундах.
+        spool_dir: Директория, в которую ffmpeg записывает файл до загрузки в S3.
+    """
+    backend: str = "local"
+    endpoint_url: str = "http://localhost:9000"
+    bucket: str = "mp3-converter"
+    region: str = "us-east-1"
+    access_key: str = ""
+    secret_key: str = ""
+    part_size: int = 8*1024*1024
+    upload_concurrency: int = 4
+    connect_timeout: float = 10
+    spool_dir: str = path.join(MEDIA_ROOT, "spool")
+
+
+def setup_config(config_path: str) -> StorageConfig:
+    """
+    Устанавливает настройки файлового хранилища.
+    Args:
+        config_path (str): Путь к конфигурационному файлу.
+    Returns: Возвращает экземпляр класса StorageConfig.
+    """
+    with open(config_path, "r") as f:
+        raw_config: dict[Any, Any] = yaml.safe_load(f)
+    storage_config = StorageConfig(**(raw_config.get("storage") or {}))
+    if storage_config.backend not in ("local", "s3"):
+        raise ValueError(f"Unknown storage backend: {storage_config.backend}")
+    return storage_config
+
+
+def setup_storage(app: "Application"):
+    """
+    Устанавливает файловое хранилище (app["storage"]) для текущего экземпляра приложения Application.
+    Также, добавляет методы StorageBackend.start и StorageBackend.stop в сигналы.
+
+    Args:
+        app (Application): Экземпляр класса Application.
+    """
+    config: StorageConfig = app["config"].storage
+    storage: StorageBackend = S3Storage(config) if config.backend == "s3" else LocalStorage()
+    app["storage"] = storage
+    app.on_startup.append(storage.start)
+    app.on_cleanup.append(storage.stop)
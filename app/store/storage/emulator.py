@@ -0,0 +1,148 @@
+"""
+Минимальный эмулятор S3 для разработки и нагрузочного тестирования без облачного хранилища.
+Объекты хранятся в файлах директории root/<bucket>/<key>. Поддерживаются запросы, которые использует
+S3Storage: PUT, загрузка по частям, GET и HEAD (с заголовком Range), DELETE.
+Подпись запросов не проверяется.
+
+Запуск:
+    python -m app.store.storage.emulator [--host 127.0.0.1] [--port 9000] [--root ./s3data]
+"""
+import argparse
+import hashlib
+import os
+import shutil
+from os import path
+from uuid import uuid4
+from xml.etree import ElementTree
+
+import aiofiles
+import aiofiles.os
+from aiohttp import web
+
+
+_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+_UPLOADS = ".uploads"
+
+
+def _xml(tag: str, **fields: str) -> bytes:
+    body = "".join(f"<{name}>{value}</{name}>" for name, value in fields.items())
+    return f'<?xml version="1.0" encoding="UTF-8"?><{tag} xmlns="{_NAMESPACE}">{body}</{tag}>'.encode()
+
+
+def _error(status: int, code: str, request: web.Request) -> web.Response:
+    body = b"" if request.method == "HEAD" else _xml("Error", Code=code, Resource=request.path)
+    return web.Response(status=status, body=body, content_type="application/xml")
+
+
+class S3Emulator:
+    """
+    Обработчик запросов эмулятора S3.
+
+    Args:
+        root: Директория, в которой хранятся объекты.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _object_path(self, request: web.Request) -> str:
+        bucket = request.match_info["bucket"]
+        key = request.match_info["key"]
+        if bucket == _UPLOADS or ".." in key.split("/"):
+            raise web.HTTPForbidden()
+        return path.join(self.root, bucket, key)
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise web.HTTPForbidden()
+        return path.join(self.root, _UPLOADS, upload_id)
+
+    async def put(self, request: web.Request) -> web.Response:
+        if "uploadId" in request.query:
+            target = path.join(self._upload_dir(request.query["uploadId"]), f"{int(request.query['partNumber']):05d}")
+            if not await aiofiles.os.path.isdir(path.dirname(target)):
+                return _error(404, "NoSuchUpload", request)
+        else:
+            target = self._object_path(request)
+            await aiofiles.os.makedirs(path.dirname(target), exist_ok=True)
+        digest = hashlib.md5()
+        partial = f"{target}.{uuid4().hex}.tmp"
+        async with aiofiles.open(partial, mode="wb") as f:
+            async for chunk in request.content.iter_chunked(256*1024):
+                digest.update(chunk)
+                await f.write(chunk)
+        await aiofiles.os.replace(partial, target)
+        return web.Response(headers={"ETag": f'"{digest.hexdigest()}"'})
+
+    async def post(self, request: web.Request) -> web.Response:
+        target = self._object_path(request)
+        if "uploads" in request.query:
+            upload_id = uuid4().hex
+            await aiofiles.os.makedirs(self._upload_dir(upload_id))
+            return web.Response(body=_xml("InitiateMultipartUploadResult", Bucket=request.match_info["bucket"],
+                                          Key=request.match_info["key"], UploadId=upload_id),
+                                content_type="application/xml")
+        if "uploadId" not in request.query:
+            return _error(400, "InvalidRequest", request)
+        upload_dir = self._upload_dir(request.query["uploadId"])
+        if not await aiofiles.os.path.isdir(upload_dir):
+            return _error(404, "NoSuchUpload", request)
+        numbers = [int(element.text or 0) for element in ElementTree.fromstring(await request.read()).iter()
+                   if element.tag.endswith("PartNumber")]
+        await aiofiles.os.makedirs(path.dirname(target), exist_ok=True)
+        partial = f"{target}.{uuid4().hex}.tmp"
+        async with aiofiles.open(partial, mode="wb") as out:
+            for number in numbers:
+                async with aiofiles.open(path.join(upload_dir, f"{number:05d}"), mode="rb") as part:
+                    while chunk := await part.read(1024*1024):
+                        await out.write(chunk)
+        await aiofiles.os.replace(partial, target)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return web.Response(body=_xml("CompleteMultipartUploadResult", Bucket=request.match_info["bucket"],
+                                      Key=request.match_info["key"], ETag=f'"{uuid4().hex}-{len(numbers)}"'),
+                            content_type="application/xml")
+
+    async def get(self, request: web.Request) -> web.StreamResponse:
+        target = self._object_path(request)
+        if not await aiofiles.os.path.isfile(target):
+            return _error(404, "NoSuchKey", request)
+        return web.FileResponse(target)
+
+    async def delete(self, request: web.Request) -> web.Response:
+        if "uploadId" in request.query:
+            shutil.rmtree(self._upload_dir(request.query["uploadId"]), ignore_errors=True)
+            return web.Response(status=204)
+        target = self._object_path(request)
+        try:
+            await aiofiles.os.remove(target)
+        except FileNotFoundError:
+            pass
+        return web.Response(status=204)
+
+
+def create_app(root: str) -> web.Application:
+    """
+    Создает приложение эмулятора. Ключи адресуются в стиле path-style: /<bucket>/<key>.
+    """
+    os.makedirs(root, exist_ok=True)
+    emulator = S3Emulator(root)
+    app = web.Application(client_max_size=1024**3)
+    route = "/{bucket}/{key:.+}"
+    app.router.add_put(route, emulator.put)
+    app.router.add_post(route, emulator.post)
+    app.router.add_get(route, emulator.get)
+    app.router.add_delete(route, emulator.delete)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Minimal S3-compatible object store for local development.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--root", default="./s3data")
+    args = parser.parse_args()
+    web.run_app(create_app(args.root), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
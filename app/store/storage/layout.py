@@ -0,0 +1,71 @@
+from os import path
+from typing import Set
+from uuid import UUID
+
+import aiofiles.os
+
+from app.web.timing import phase
+
+
+MEDIA_ROOT = "./media"
+# Конвертированные файлы хранятся в FILES_ROOT/ab/cd/abcd....mp3, где abcd... - UUID записи.
+# Два уровня по 256 директорий дают 65536 директорий фиксированного размера: при сотнях миллионов
+# файлов в каждой директории остаются тысячи файлов, а новые директории почти не создаются.
+FILES_ROOT = path.join(MEDIA_ROOT, "files")
+UPLOADS_ROOT = path.join(MEDIA_ROOT, "uploads")
+FANOUT_LEVELS = 2
+FANOUT_WIDTH = 2
+PARTIAL_SUFFIX = ".part"
+
+# Директории, которые уже были созданы этим процессом.
+_created_directories: Set[str] = set()
+
+
+def file_path_for(key: UUID, extension: str = ".mp3") -> str:
+    """
+    Возвращает путь к файлу в файловом хранилище по его ключу.
+    """
+    name = key.hex
+    shards = [name[i * FANOUT_WIDTH:(i + 1) * FANOUT_WIDTH] for i in range(FANOUT_LEVELS)]
+    return path.join(FILES_ROOT, *shards, name + extension)
+
+
+def is_sharded(file_path: str) -> bool:
+    """
+    Проверяет, что файл находится в хранилище с разбиением по ключу.
+    """
+    return path.normpath(file_path).startswith(path.normpath(FILES_ROOT) + path.sep)
+
+
+def partial_path(file_path: str) -> str:
+    """
+    Возвращает путь, по которому файл записывается до публикации (см. publish).
+    """
+    return file_path + PARTIAL_SUFFIX
+
+
+async def ensure_directory(directory: str) -> None:
+    """
+    Создает директорию, если она еще не была создана этим процессом.
+    """
+    if directory in _created_directories:
+        return
+    with phase("makedirs"):
+        await aiofiles.os.makedirs(directory, exist_ok=True)
+    _created_directories.add(directory)
+
+
+async def publish(partial: str, file_path: str) -> None:
+    """
+    Атомарно переименовывает полностью записанный файл partial в file_path.
+    Читатели видят либо отсутствие файла, либо файл целиком, но не частично записанный файл.
+    """
+    await aiofiles.os.replace(partial, file_path)
+
+
+async def discard(file_path: str) -> None:
+    """
+    Удаляет файл, если он существует.
+    """
+    if await aiofiles.os.path.exists(file_path):
+        await aiofiles.os.remove(file_path)
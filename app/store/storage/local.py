@@ -0,0 +1,66 @@
+from os import path
+from typing import Optional
+
+import aiofiles
+import aiofiles.os
+
+from app.store.storage.base import ObjectStream, StorageBackend, StoredObject
+from app.store.storage.layout import discard, ensure_directory, partial_path, publish
+
+
+class LocalObjectStream(ObjectStream):
+    """
+    Поток для чтения части файла из локальной файловой системы.
+    """
+
+    def __init__(self, f, size: int, length: int):
+        self.size = size
+        self._f = f
+        self._left = length
+
+    async def read(self, chunk_size: int) -> bytes:
+        if self._left <= 0:
+            return b""
+        chunk = await self._f.read(min(chunk_size, self._left))
+        self._left -= len(chunk)
+        return chunk
+
+    async def close(self) -> None:
+        await self._f.close()
+
+
+class LocalStorage(StorageBackend):
+    """
+    Файловое хранилище в локальной файловой системе. Имя файла является путем к нему.
+    Результат конвертации записывается рядом с итоговым файлом и атомарно переименовывается.
+    """
+
+    async def output_path(self, name: str) -> str:
+        await ensure_directory(path.dirname(name))
+        return partial_path(name)
+
+    async def commit(self, partial: str, name: str) -> None:
+        await publish(partial, name)
+
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        try:
+            st = await aiofiles.os.stat(name)
+        except FileNotFoundError:
+            return None
+        # Тот же формат, что у aiohttp.web.FileResponse.
+        return StoredObject(size=st.st_size, etag=f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+    async def open(self, name: str, offset: int = 0, length: Optional[int] = None) -> Optional[ObjectStream]:
+        try:
+            f = await aiofiles.open(name, mode="rb")
+        except FileNotFoundError:
+            return None
+        size = (await aiofiles.os.stat(name)).st_size
+        await f.seek(offset)
+        return LocalObjectStream(f, size, size - offset if length is None else length)
+
+    async def delete(self, name: str) -> None:
+        await discard(name)
+
+    def local_path(self, name: str) -> Optional[str]:
+        return name
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timezone
+from os import path
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import quote
+from xml.etree import ElementTree
+
+import aiofiles
+import aiofiles.os
+from aiohttp import ClientResponse, ClientSession, ClientTimeout, hdrs
+from yarl import URL
+
+from app.store.storage.base import ObjectStream, StorageBackend, StorageError, StoredObject
+from app.store.storage.layout import PARTIAL_SUFFIX, discard, ensure_directory
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.storage.config import StorageConfig
+
+
+logger = logging.getLogger(__name__)
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+EMPTY_PAYLOAD_HASH = hashlib.sha256(b"").hexdigest()
+_S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def sign_request(method: str, url: URL, headers: Dict[str, str], payload_hash: str, region: str,
+                 access_key: str, secret_key: str, now: datetime) -> str:
+    """
+    Возвращает значение заголовка Authorization (AWS Signature Version 4) для запроса к S3.
+    Подписываются все переданные заголовки. Заголовки x-amz-date и x-amz-content-sha256
+    должны быть уже добавлены в headers.
+
+    Args:
+        url: Url адрес запроса с уже закодированными путем и параметрами.
+        payload_hash: SHA-256 тела запроса или UNSIGNED-PAYLOAD.
+        now: Время запроса (UTC), совпадающее с заголовком x-amz-date.
+    """
+    date = now.strftime("%Y%m%d")
+    scope = f"{date}/{region}/s3/aws4_request"
+    signed = sorted((name.lower(), " ".join(value.split())) for name, value in headers.items())
+    canonical_headers = "".join(f"{name}:{value}\n" for name, value in signed)
+    signed_headers = ";".join(name for name, _ in signed)
+    query = sorted((quote(key, safe="-_.~"), quote(value, safe="-_.~")) for key, value in url.query.items())
+    canonical_request = "\n".join([
+        method,
+        url.raw_path,
+        "&".join(f"{key}={value}" for key, value in query),
+        canonical_headers,
+        signed_headers,
+        payload_hash,
+    ])
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        now.strftime("%Y%m%dT%H%M%SZ"),
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    key = f"AWS4{secret_key}".encode()
+    for part in (date, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}")
+
+
+class S3ObjectStream(ObjectStream):
+    """
+    Поток для чтения тела ответа на GET запрос к S3.
+    """
+
+    def __init__(self, response: ClientResponse, size: int):
+        self.size = size
+        self._response = response
+
+    async def read(self, chunk_size: int) -> bytes:
+        return await self._response.content.read(chunk_size)
+
+    async def close(self) -> None:
+        self._response.release()
+
+
+class S3Storage(StorageBackend):
+    """
+    Файловое хранилище в S3-совместимом объектном хранилище (AWS S3, MinIO, эмулятор app.store.storage.emulator).
+    Ключ объекта - имя файла без начального "./", поэтому записи в базе данных не зависят от типа хранилища.
+    ffmpeg пишет результат во временный файл в директории spool_dir. Файлы меньше part_size загружаются
+    одним PUT запросом, большие - по частям (multipart upload), не больше upload_concurrency частей одновременно.
+
+    Args:
+        config: Экземпляр класса StorageConfig.
+    """
+
+    def __init__(self, config: "StorageConfig"):
+        self.config = config
+        self._base_url = f"{config.endpoint_url.rstrip('/')}/{quote(config.bucket, safe='')}"
+        self._session: Optional[ClientSession] = None
+
+    async def start(self, _: "Application") -> None:
+        await ensure_directory(self.config.spool_dir)
+        self._session = ClientSession(timeout=ClientTimeout(total=None, sock_connect=self.config.connect_timeout))
+
+    async def stop(self, _: "Application") -> None:
+        if self._session:
+            await self._session.close()
+
+    async def output_path(self, name: str) -> str:
+        return path.join(self.config.spool_dir, path.basename(name) + PARTIAL_SUFFIX)
+
+    async def commit(self, partial: str, name: str) -> None:
+        try:
+            size = await aiofiles.os.path.getsize(partial)
+            if size <= self.config.part_size:
+                async with aiofiles.open(partial, mode="rb") as f:
+                    data = await f.read()
+                async with self._request(hdrs.METH_PUT, name, data=data) as response:
+                    await self._check(response, name)
+            else:
+                await self._upload_multipart(partial, name, size)
+        finally:
+            await discard(partial)
+
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        async with self._request(hdrs.METH_HEAD, name) as response:
+            if response.status == 404:
+                return None
+            await self._check(response, name)
+            return StoredObject(size=int(response.headers[hdrs.CONTENT_LENGTH]),
+                                etag=response.headers.get(hdrs.ETAG, "").strip('"'))
+
+    async def open(self, name: str, offset: int = 0, length: Optional[int] = None) -> Optional[ObjectStream]:
+        if length == 0:
+            # 0 байт нельзя выразить заголовком Range, а запрос первого байта пустого файла завершается ошибкой 416.
+            # Пустая часть запрашивается только для пустого файла, наличие которого уже проверено вызывающим кодом.
+            return _EmptyStream(offset)
+        headers = {}
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            headers[hdrs.RANGE] = f"bytes={offset}-{end}"
+        response = await self._request(hdrs.METH_GET, name, headers=headers)
+        if response.status == 404:
+            response.release()
+            return None
+        try:
+            await self._check(response, name)
+        except StorageError:
+            response.release()
+            raise
+        content_range = response.headers.get(hdrs.CONTENT_RANGE)
+        if content_range:
+            size = int(content_range.rsplit("/", 1)[1])
+        else:
+            size = int(response.headers[hdrs.CONTENT_LENGTH])
+        return S3ObjectStream(response, size)
+
+    async def delete(self, name: str) -> None:
+        async with self._request(hdrs.METH_DELETE, name) as response:
+            if response.status != 404:
+                await self._check(response, name)
+
+    async def _upload_multipart(self, partial: str, name: str, size: int) -> None:
+        """
+        Загружает файл по частям размером part_size. Если загрузка не удалась, она отменяется,
+        чтобы хранилище не держало загруженные части.
+        """
+        async with self._request(hdrs.METH_POST, name, params={"uploads": ""}) as response:
+            await self._check(response, name)
+            upload_id = _find_text(ElementTree.fromstring(await response.read()), "UploadId")
+        semaphore = asyncio.Semaphore(self.config.upload_concurrency)
+
+        async def upload_part(number: int, offset: int) -> Tuple[int, str]:
+            async with semaphore:
+                async with aiofiles.open(partial, mode="rb") as f:
+                    await f.seek(offset)
+                    data = await f.read(self.config.part_size)
+                params = {"partNumber": str(number), "uploadId": upload_id}
+                async with self._request(hdrs.METH_PUT, name, params=params, data=data) as part_response:
+                    await self._check(part_response, name)
+                    return number, part_response.headers[hdrs.ETAG]
+
+        try:
+            parts: List[Tuple[int, str]] = await asyncio.gather(*(
+                upload_part(number, offset)
+                for number, offset in enumerate(range(0, size, self.config.part_size), start=1)
+            ))
+            body = "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                           for number, etag in parts)
+            data = f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode()
+            async with self._request(hdrs.METH_POST, name, params={"uploadId": upload_id}, data=data) as response:
+                await self._check(response, name)
+                # S3 может вернуть ошибку с кодом 200 после начала ответа.
+                result = ElementTree.fromstring(await response.read())
+                if result.tag.endswith("Error"):
+                    raise StorageError(f"S3 failed to complete upload of {name}: {_find_text(result, 'Code')}")
+        except BaseException:
+            try:
+                async with self._request(hdrs.METH_DELETE, name, params={"uploadId": upload_id}):
+                    pass
+            except Exception:
+                logger.exception("Failed to abort multipart upload %s of %s", upload_id, name)
+            raise
+
+    def _request(self, method: str, name: str, params: Optional[Dict[str, str]] = None,
+                 headers: Optional[Dict[str, str]] = None, data: Optional[bytes] = None):
+        """
+        Отправляет подписанный запрос к объекту name. Возвращает результат ClientSession.request,
+        который можно использовать как асинхронный контекстный менеджер.
+        """
+        if self._session is None:
+            raise StorageError("S3 storage is not started")
+        query = "&".join(f"{quote(key, safe='')}={quote(value, safe='')}" for key, value in (params or {}).items())
+        key = quote(name[2:] if name.startswith("./") else name.lstrip("/"), safe="/-_.~")
+        url = URL(f"{self._base_url}/{key}" + (f"?{query}" if query else ""), encoded=True)
+        now = datetime.now(timezone.utc)
+        host = url.raw_host if url.is_default_port() else f"{url.raw_host}:{url.port}"
+        signed_headers = {
+            hdrs.HOST: host,
+            "x-amz-date": now.strftime("%Y%m%dT%H%M%SZ"),
+            "x-amz-content-sha256": UNSIGNED_PAYLOAD,
+        }
+        signed_headers[hdrs.AUTHORIZATION] = sign_request(method, url, signed_headers, UNSIGNED_PAYLOAD,
+                                                          self.config.region, self.config.access_key,
+                                                          self.config.secret_key, now)
+        return self._session.request(method, url, headers={**(headers or {}), **signed_headers}, data=data)
+
+    @staticmethod
+    async def _check(response: ClientResponse, name: str) -> None:
+        """
+        Возбуждает StorageError, если S3 вернул ошибку.
+        """
+        if response.status < 300:
+            return
+        code = response.reason
+        if response.method != hdrs.METH_HEAD:
+            try:
+                code = _find_text(ElementTree.fromstring(await response.read()), "Code")
+            except (ElementTree.ParseError, StorageError):
+                pass
+        raise StorageError(f"S3 returned {response.status} ({code}) for {response.method} {name}")
+
+
+class _EmptyStream(ObjectStream):
+    """
+    Пустой поток для запроса 0 байт, который нельзя выразить заголовком Range.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    async def read(self, chunk_size: int) -> bytes:
+        return b""
+
+    async def close(self) -> None:
+        pass
+
+
+def _find_text(element: ElementTree.Element, tag: str) -> str:
+    """
+    Возвращает текст дочернего элемента XML ответа S3 с пространством имен или без него.
+    """
+    found = element.find(f"{{{_S3_NAMESPACE}}}{tag}")
+    if found is None:
+        found = element.find(tag)
+    if found is None or found.text is None:
+        raise StorageError(f"S3 response has no {tag} element")
+    return found.text
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+from app.store.cache import TTLCache
+from app.users.models import UserModel
+from app.web.stats import CacheStats, register_stats
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.store.database.database import Database
+    from app.web.config import Config
+
+
+class UserAuthCache:
+    """
+    Класс, проверяющий пару (идентификатор пользователя, UUID-токен) с кэшированием результата.
+    Найденные пары хранятся ttl секунд, ненайденные - negative_ttl секунд, поэтому повторные
+    запросы как с правильным, так и с неправильным токеном не обращаются к базе данных.
+    Одновременные промахи по одному ключу выполняют один запрос к базе данных.
+    При удалении пользователя его записи удаляются из кэша.
+
+    Args:
+        app: Экземпляр класса aiohttp.web.Application.
+        cache: Кэш, ключом которого является пара (user_id, user_uuid).
+    """
+
+    def __init__(self, app: "Application", cache: TTLCache[int]):
+        self.app = app
+        self.cache = cache
+        self._pending: Dict[Tuple[int, str], "asyncio.Future[Optional[int]]"] = {}
+
+    @property
+    def database(self) -> "Database":
+        return self.app["database"]
+
+    async def get_user_id(self, user_id: int, user_uuid: str) -> Optional[int]:
+        """
+        Возвращает идентификатор пользователя, если пара (user_id, user_uuid) существует.
+        """
+        key = (user_id, user_uuid.lower())
+        found, value = self.cache.get(key)
+        if found:
+            return value
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, user_uuid))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Запрос к базе данных выполняется отдельной задачей и не отменяется,
+        # если клиент, вызвавший промах, отключился раньше остальных.
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Tuple[int, str], user_uuid: str) -> Optional[int]:
+        value = await UserModel.get_user_id(self.database, key[0], user_uuid)
+        # Если пользователь был удален, пока выполнялся запрос, результат не кэшируется.
+        if self._pending.get(key) is asyncio.current_task():
+            self.cache.set(key, value)
+        return value
+
+    def _forget(self, key: Tuple[int, str], task: "asyncio.Future[Optional[int]]") -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Удаляет из кэша все записи пользователя.
+        """
+        self.cache.invalidate_where(lambda key, _: key[0] == user_id)
+        for key in [key for key in self._pending if key[0] == user_id]:
+            del self._pending[key]
+
+
+def setup_auth_cache(app: "Application"):
+    """
+    Устанавливает экземпляр класса UserAuthCache для текущего экземпляра приложения.
+    """
+    config: "Config" = app["config"]
+    stats = register_stats(app, "auth", CacheStats())
+    cache: TTLCache[int] = TTLCache(max_size=config.cache.auth_max_size,
+                                    ttl=config.cache.auth_ttl,
+                                    negative_ttl=config.cache.auth_negative_ttl,
+                                    stats=stats)
+    app["user_auth_cache"] = UserAuthCache(app, cache)
@@ -0,0 +1,148 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Optional
+
+from aiohttp import StreamReader
+
+
+# Размер блока, которым тело запроса читается из сокета.
+READ_CHUNK_SIZE = 64*1024
+# Максимальный размер одного элемента JSON массива или строки NDJSON в байтах.
+MAX_ITEM_SIZE = 64*1024
+
+# Элемент, который не удалось разобрать как JSON.
+INVALID_JSON = object()
+# Элемент, размер которого превышает MAX_ITEM_SIZE.
+TOO_LONG = object()
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+async def read_lines(content: StreamReader, max_size: int = MAX_ITEM_SIZE) -> AsyncIterator[Optional[bytes]]:
+    """
+    Читает тело запроса построчно, не накапливая его в оперативной памяти.
+    Вместо строки длиннее max_size возвращается None, а ее остаток пропускается,
+    поэтому одна длинная строка не прерывает чтение следующих.
+    """
+
+    buffer = b""
+    skipping = False
+    async for chunk in content.iter_chunked(READ_CHUNK_SIZE):
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False
+                continue
+            yield line if len(line) <= max_size else None
+        if len(buffer) > max_size:
+            if not skipping:
+                yield None
+            skipping = True
+            buffer = b""
+    if buffer and not skipping:
+        yield buffer
+
+
+class JsonArrayReader:
+    """
+    Класс, разбирающий JSON массив из тела запроса по мере его получения. В памяти хранится
+    только текущий элемент, поэтому размер массива не ограничен client_max_size.
+
+    Args:
+        content: Тело запроса.
+        max_item_size: Максимальный размер одного элемента массива.
+    """
+
+    def __init__(self, content: StreamReader, max_item_size: int = MAX_ITEM_SIZE):
+        self._chunks = content.iter_chunked(READ_CHUNK_SIZE)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self.max_item_size = max_item_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    async def start(self) -> bool:
+        """
+        Читает начало массива. Вызывается до отправки ответа, чтобы тело, не являющееся JSON массивом,
+        было отклонено с кодом 400.
+
+        Returns:
+            False, если тело запроса не начинается с "[".
+        """
+
+        try:
+            if await self._peek() != "[":
+                return False
+        except UnicodeDecodeError:
+            return False
+        self._pos += 1
+        return True
+
+    async def items(self) -> AsyncIterator[Any]:
+        """
+        Возвращает элементы массива. Если массив поврежден или элемент слишком велик, возвращает
+        INVALID_JSON или TOO_LONG и завершает чтение: продолжить разбор после ошибки невозможно.
+        """
+
+        try:
+            if await self._peek() == "]":
+                return
+            while True:
+                item = await self._decode()
+                yield item
+                if item is INVALID_JSON or item is TOO_LONG:
+                    return
+                separator = await self._peek()
+                if separator == "]":
+                    return
+                if separator != ",":
+                    yield INVALID_JSON
+                    return
+                self._pos += 1
+        except UnicodeDecodeError:
+            yield INVALID_JSON
+
+    async def _decode(self) -> Any:
+        await self._peek()
+        while True:
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                end = None
+            # Значение в конце буфера может быть неполным (например, число), поэтому оно принимается,
+            # только если за ним уже получены данные или тело запроса закончилось.
+            if end is not None and (end < len(self._buffer) or self._eof):
+                self._pos = end
+                return item
+            if self._eof:
+                return INVALID_JSON
+            if len(self._buffer) - self._pos > self.max_item_size:
+                return TOO_LONG
+            await self._fill()
+
+    async def _peek(self) -> str:
+        """
+        Пропускает пробельные символы и возвращает следующий символ или "" в конце тела запроса.
+        """
+
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()  # type: ignore
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                return ""
+
+    async def _fill(self) -> bool:
+        if self._eof:
+            return False
+        try:
+            text = self._text.decode(await self._chunks.__anext__())
+        except StopAsyncIteration:
+            text = self._text.decode(b"", final=True)
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
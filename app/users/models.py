@@ -1,17 +1,22 @@
 from uuid import uuid4
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
 
 from sqlalchemy import (
     Column,
     Integer,
     String,
     Uuid,
+    delete,
     insert,
     select
 )
 from sqlalchemy.orm import relationship
 
+from app.store.database.database import timed
 from app.store.database.sqlalchemy_base import db
+# Импорт модуля, а не классов: app.mp3_files.models может быть еще не загружен до конца,
+# если импорт начался с него (app.store.database импортирует обе модели).
+from app.mp3_files import models as mp3_models
 
 if TYPE_CHECKING:
     from app.store.database.database import Database
@@ -35,6 +40,7 @@ class UserModel(db):
     mp3_files = relationship("Mp3FileModel", back_populates="user", cascade="all, delete")
 
     @staticmethod
+    @timed
     async def add_user(database: "Database", data: dict[Any, Any]) -> "UserModel":
         """
         Добавляет нового пользователя в таблицу "users" базы данных.
@@ -50,6 +56,25 @@ class UserModel(db):
             return user_model
 
     @staticmethod
+    @timed
+    async def add_users(database: "Database", usernames: List[str]) -> List["UserModel"]:
+        """
+        Добавляет несколько пользователей в таблицу "users" базы данных одним запросом INSERT ... RETURNING.
+        Returns:
+            Возвращает экземпляры класса UserModel в том же порядке, что и usernames.
+        """
+
+        # Порядок строк в RETURNING не гарантируется, поэтому записи сопоставляются по uuid.
+        rows = [{"username": username, "uuid": uuid4()} for username in usernames]
+        query = insert(UserModel).values(rows).returning(UserModel)
+        async with database.session() as session:
+            result = await session.execute(query)
+            await session.commit()
+            users = {user_model.uuid: user_model for user_model in result.scalars()}
+            return [users[row["uuid"]] for row in rows]
+
+    @staticmethod
+    @timed
     async def get_user_id(database: "Database", user_id: int, user_uuid: str) -> Optional[int]:
         """
         Возвращает идентификатор пользователя из таблице "users"
@@ -69,3 +94,38 @@ class UserModel(db):
             if row:
                 named_tuple = row.tuple()
                 return named_tuple.id
+
+    @staticmethod
+    @timed
+    async def delete_user(database: "Database", user_id: int, user_uuid: str) -> Tuple[bool, List[str]]:
+        """
+        Удаляет пользователя и его mp3 файлы из базы данных.
+        Ссылки на конвертированные файлы освобождаются в той же транзакции.
+        Args:
+            user_id (int): Идентификатор записи в таблице "users".
+            user_uuid (str): UUID пользователя в таблицу "users".
+
+        Returns:
+            Tuple[bool, List[str]]: Был ли пользователь удален и пути к файлам,
+            на которые не осталось ссылок и которые нужно удалить из файлового хранилища.
+        """
+        async with database.session() as session:
+            result = await session.execute(select(UserModel.id)
+                                           .where(UserModel.id == user_id, UserModel.uuid == user_uuid))
+            if not result.first():
+                return False, []
+            result = await session.execute(delete(mp3_models.Mp3FileModel)
+                                           .where(mp3_models.Mp3FileModel.user_id == user_id)
+                                           .returning(mp3_models.Mp3FileModel.content_id,
+                                                      mp3_models.Mp3FileModel.file_path))
+            orphan_paths = []
+            for content_id, file_path in result.all():
+                if content_id:
+                    orphan_path = await mp3_models.Mp3ContentModel.release(session, content_id)
+                    if orphan_path:
+                        orphan_paths.append(orphan_path)
+                else:
+                    orphan_paths.append(file_path)
+            await session.execute(delete(UserModel).where(UserModel.id == user_id))
+            await session.commit()
+            return True, orphan_paths
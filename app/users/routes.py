@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from app.users.views import UserCreteView
+from app.users.views import UserCreateBatchView, UserCreteView, UserDeleteView
 
 if TYPE_CHECKING:
     from aiohttp.web import Application
@@ -12,4 +12,6 @@ def setup_routes(app: "Application"):
     Устанавливает конечные точки для манипуляции данными в таблице "users" базы данных.
     """
     cors: "CorsConfig" = app["cors"]
-    cors.add(app.router.add_view("/users.create", UserCreteView))
\ No newline at end of file
+    cors.add(app.router.add_view("/users.create", UserCreteView))
+    cors.add(app.router.add_view("/users.create_batch", UserCreateBatchView))
+    cors.add(app.router.add_view("/users.delete", UserDeleteView))
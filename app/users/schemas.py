@@ -15,10 +15,24 @@ class UserSchema(Schema):
 
 class UserRequestSchema(Schema):
     """
-    Класс Schema представляет тело POST-запроса для конечной точки /users.create.
+    Класс Schema представляет тело POST-запроса для конечной точки /users.create
+    и элемент тела запроса для конечной точки /users.create_batch.
     """
     username = fields.Str(required=True, allow_none=False,
-                          validate=[validate.Length(min=1, error="Field cannot be blank")])
+                          validate=[validate.Length(min=1, error="Field cannot be blank"),
+                                    validate.Length(max=64),
+                                    # Postgres не принимает символ NUL в строках.
+                                    validate.Regexp(r"[^\x00-\x1f\x7f-\x9f]*\Z",
+                                                    error="Field cannot contain control characters")])
+
+
+class UserDeleteRequestSchema(Schema):
+    """
+    Класс Schema представляет тело DELETE-запроса для конечной точки /users.delete.
+    """
+    id = fields.Int(required=True, allow_none=False)
+    uuid = fields.Str(required=True, allow_none=False,
+                      validate=[validate.Length(min=1, error="Field cannot be blank")])
 
 
 class UserResponseSchema(OkResponseSchema):
@@ -1,14 +1,37 @@
-from typing import TYPE_CHECKING
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, TYPE_CHECKING
 
+from aiohttp import hdrs
+from aiohttp.web import StreamResponse
+from aiohttp.web_exceptions import HTTPBadRequest
 from aiohttp_apispec import docs, request_schema, response_schema
+from marshmallow.exceptions import ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
+from app.users.bulk import INVALID_JSON, TOO_LONG, JsonArrayReader, read_lines
 from app.users.models import UserModel
 
-from app.users.schemas import UserRequestSchema, UserResponseSchema
+from app.users.schemas import UserDeleteRequestSchema, UserRequestSchema, UserResponseSchema, UserSchema
 from app.web.bases import View
-from app.web.utils import json_response
+from app.web.schemes import OkResponseSchema
+from app.web.utils import error_json_response, json_response
 
 if TYPE_CHECKING:
+    from app.mp3_files.cache import RecordCache
+    from app.mp3_files.variants import VariantCache
     from app.store.database.database import Database
+    from app.store.storage import StorageBackend
+    from app.users.auth import UserAuthCache
+
+
+logger = logging.getLogger(__name__)
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# Количество пользователей, добавляемых одним запросом INSERT.
+USERS_BATCH_SIZE = 1000
+
+# (индекс элемента, имя пользователя или None, ошибки валидации или None)
+BatchEntry = Tuple[int, Optional[str], Optional[Dict[str, Any]]]
 
 
 class UserCreteView(View):
@@ -36,3 +59,170 @@ class UserCreteView(View):
         database: "Database" = self.request.app["database"]
         user = await UserModel.add_user(database, data={"username": username})
         return json_response(UserResponseSchema(), data={"data": user})
+
+
+class UserCreateBatchView(View):
+    """
+    Класс представление для конечной точки "/users.create_batch".
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["users"], summary="Create users in bulk.",
+          description="Body is a JSON array or NDJSON (Content-Type: application/x-ndjson) of usernames "
+                      "or {\"username\": ...} objects. Response is NDJSON with one line per item.")
+    async def post(self):
+        """
+        Вью-метод для POST-запроса.
+        Тело запроса - JSON массив или NDJSON (по одному элементу в строке), элемент - имя пользователя
+        или объект {"username": ...}. Пользователи добавляются пакетами по USERS_BATCH_SIZE
+        одним запросом INSERT, тело запроса разбирается по мере поступления и не ограничено client_max_size.
+        В ответ потоком передается NDJSON: по одной строке на каждый элемент в порядке запроса
+        с данными пользователя или ошибками валидации. Ошибки отдельных элементов не прерывают обработку.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web.StreamResponse.
+        """
+        if self.request.content_type == NDJSON_CONTENT_TYPE:
+            items = self._read_ndjson()
+        else:
+            reader = JsonArrayReader(self.request.content)
+            if not await reader.start():
+                raise HTTPBadRequest(reason="Request body must be a JSON array.")
+            items = reader.items()
+        response = StreamResponse(headers={hdrs.CONTENT_TYPE: NDJSON_CONTENT_TYPE})
+        await response.prepare(self.request)
+        entries: List[BatchEntry] = []
+        valid = 0
+        index = 0
+        async for item in items:
+            username, errors = self._validate(item)
+            entries.append((index, username, errors))
+            index += 1
+            if username is not None:
+                valid += 1
+            if valid >= USERS_BATCH_SIZE:
+                await self._write_batch(response, entries)
+                entries, valid = [], 0
+        await self._write_batch(response, entries)
+        await response.write_eof()
+        return response
+
+    async def _read_ndjson(self) -> AsyncIterator[Any]:
+        async for line in read_lines(self.request.content):
+            if line is None:
+                yield TOO_LONG
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield INVALID_JSON
+
+    @staticmethod
+    def _validate(item: Any) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Проверяет элемент запроса. Возвращает имя пользователя или ошибки валидации.
+        """
+        if item is INVALID_JSON:
+            return None, {"_schema": ["Invalid JSON."]}
+        if item is TOO_LONG:
+            return None, {"_schema": ["Item is too long."]}
+        if isinstance(item, str):
+            item = {"username": item}
+        if not isinstance(item, dict):
+            return None, {"_schema": ["Item must be a username or an object."]}
+        try:
+            data = UserRequestSchema().load(item)
+        except ValidationError as e:
+            return None, e.normalized_messages()  # type: ignore
+        return data["username"], None
+
+    async def _write_batch(self, response: StreamResponse, entries: List[BatchEntry]) -> None:
+        """
+        Добавляет пользователей пакета в базу данных и записывает в ответ строки для всех элементов пакета.
+        Если база данных отклонила пакет из-за данных одного из элементов, пользователи добавляются по одному,
+        и ошибку получают только отклоненные элементы. Если запрос к базе данных не удался по другой причине,
+        элементы пакета отмечаются как ошибочные.
+        """
+        if not entries:
+            return
+        usernames = [username for _, username, _ in entries if username is not None]
+        database: "Database" = self.request.app["database"]
+        users: List[Optional[UserModel]] = []
+        if usernames:
+            try:
+                users = list(await UserModel.add_users(database, usernames))
+            except (DataError, IntegrityError):
+                users = await self._add_one_by_one(database, usernames)
+            except Exception:
+                logger.exception("Failed to create a batch of %s users", len(usernames))
+                users = [None] * len(usernames)
+        schema = UserSchema()
+        created = iter(users)
+        lines = []
+        for index, username, errors in entries:
+            user = next(created) if username is not None else None
+            if username is not None and user is None:
+                errors = {"_schema": ["Failed to create user."]}
+            if errors is None:
+                lines.append({"index": index, "status": "ok", "data": schema.dump(user)})
+            else:
+                lines.append({"index": index, "status": "error", "errors": errors})
+        await response.write("".join(json.dumps(line) + "\n" for line in lines).encode())
+
+    @staticmethod
+    async def _add_one_by_one(database: "Database", usernames: List[str]) -> List[Optional[UserModel]]:
+        """
+        Добавляет пользователей по одному. Для пользователей, которых не удалось добавить, возвращает None.
+        """
+        users: List[Optional[UserModel]] = []
+        for username in usernames:
+            try:
+                users.append(await UserModel.add_user(database, data={"username": username}))
+            except Exception:
+                logger.exception("Failed to create user %r", username)
+                users.append(None)
+        return users
+
+
+class UserDeleteView(View):
+    """
+    Класс представление для конечной точки "/users.delete".
+
+    Args:
+        View (_type_): Базовый класс представление.
+    """
+
+    @docs(tags=["users"], summary="Delete user and his mp3 files.")
+    @request_schema(UserDeleteRequestSchema)
+    @response_schema(OkResponseSchema, 200)
+    async def delete(self):
+        """
+        Вью-метод для DELETE-запроса.
+        Удаляет пользователя, его записи в кэше аутентификации и mp3 файлы,
+        на которые не ссылаются записи других пользователей.
+
+        Returns:
+            _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
+        """
+        data = self.data
+        database: "Database" = self.request.app["database"]
+        deleted, orphan_paths = await UserModel.delete_user(database, data["id"], data["uuid"])
+        if not deleted:
+            return error_json_response(http_status=404,
+                                       status="not found",
+                                       message="User not found")
+        auth_cache: "UserAuthCache" = self.request.app["user_auth_cache"]
+        auth_cache.invalidate_user(data["id"])
+        record_cache: "RecordCache" = self.request.app["record_cache"]
+        record_cache.invalidate_user(data["id"])
+        storage: "StorageBackend" = self.request.app["storage"]
+        variant_cache: "VariantCache" = self.request.app["variant_cache"]
+        for orphan_path in orphan_paths:
+            await storage.delete(orphan_path)
+            await variant_cache.invalidate(orphan_path)
+        return json_response(OkResponseSchema())
@@ -0,0 +1,209 @@
+import asyncio
+import time
+from asyncio.subprocess import PIPE, DEVNULL
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from aiohttp.web_exceptions import HTTPServiceUnavailable
+
+from app.web.stats import DedupStats, register_stats
+from app.web.timing import record_phase
+
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+    from app.web.config import Config
+    from app.web.metrics import Metrics
+
+
+@dataclass
+class Waiter:
+    """
+    Конвертация, ожидающая свободного слота ConversionEngine.
+    Args:
+        user_id: Идентификатор пользователя, запустившего конвертацию.
+        cost: Оценка стоимости конвертации - длительность записи в секундах.
+        enqueued: Время постановки в очередь (time.monotonic).
+        future: Future, которому передается слот.
+    """
+    user_id: Optional[int]
+    cost: float
+    enqueued: float
+    future: "asyncio.Future[None]" = field(repr=False)
+
+
+class ConversionEngine:
+    """
+    Класс, запускающий процессы ffmpeg через asyncio.create_subprocess_exec.
+    Количество одновременно работающих процессов ограничено max_concurrency,
+    остальные конвертации ожидают своей очереди. Если в очереди уже max_queue конвертаций,
+    новые запросы сразу отклоняются с кодом 503 и заголовком Retry-After.
+
+    Освободившийся слот получает не первая конвертация в очереди, а конвертация с наименьшим приоритетом:
+        приоритет = S(user_id) + cost / weight(user_id) - aging * время ожидания,
+    где S - виртуальное время начала следующей конвертации пользователя (взвешенная справедливая очередь,
+    WFQ): пользователь, которому уже отдано много слотов, пропускает вперед остальных пользователей,
+    а среди конвертаций одного пользователя первыми выполняются короткие (shortest job first).
+    Слагаемое aging не дает длинным конвертациям ждать бесконечно.
+
+    Args:
+        max_concurrency: Максимальное количество одновременно работающих процессов ffmpeg.
+        max_queue: Максимальное количество конвертаций, ожидающих свободного слота.
+        retry_after: Значение заголовка Retry-After в секундах.
+        metrics: Метрики, в которые записываются время работы и коды завершения процессов.
+        weights: Веса пользователей по идентификатору. Вес остальных пользователей равен 1.
+        aging: На сколько секунд записи уменьшается стоимость конвертации за каждую секунду ожидания.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, retry_after: int,
+                 metrics: Optional["Metrics"] = None, weights: Optional[Dict[int, float]] = None,
+                 aging: float = 0.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.metrics = metrics
+        self.weights = weights or {}
+        self.aging = aging
+        self.running = 0
+        self._waiters: List[Waiter] = []
+        # Виртуальное время окончания последней конвертации пользователя, которой был отдан слот.
+        self._finish: Dict[Optional[int], float] = {}
+        self._virtual_time = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def ensure_capacity(self) -> None:
+        """
+        Проверяет, что конвертация может быть поставлена в очередь.
+
+        Raises:
+            HTTPServiceUnavailable: Все слоты заняты и очередь заполнена.
+        """
+
+        if self.running >= self.max_concurrency and self.waiting >= self.max_queue:
+            raise HTTPServiceUnavailable(reason="Too many conversions in progress. Try again later.",
+                                         headers={"Retry-After": str(self.retry_after)})
+
+    @asynccontextmanager
+    async def slot(self, bounded: bool = True, user_id: Optional[int] = None,
+                   cost: float = 0.0) -> AsyncIterator[None]:
+        """
+        Асинхронный контекстный менеджер, занимающий слот для одного процесса ffmpeg.
+        Если свободных слотов нет, ожидает в очереди.
+
+        Args:
+            bounded: Проверять ли размер очереди. Фоновые задачи, которые уже приняты в работу,
+            передают False и ожидают слот без ограничения очереди.
+            user_id: Идентификатор пользователя, запустившего конвертацию.
+            cost: Оценка стоимости конвертации - длительность записи в секундах.
+        """
+
+        if bounded:
+            self.ensure_capacity()
+        waiter = Waiter(user_id, cost, time.monotonic(), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот уже был отдан, но конвертация отменена раньше, чем его заняла.
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        waited = time.monotonic() - waiter.enqueued
+        record_phase("ffmpeg_queue", waited)
+        if self.metrics is not None:
+            self.metrics.ffmpeg_wait_seconds.observe(waited)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """
+        Отдает свободные слоты ожидающим конвертациям в порядке приоритета.
+        """
+
+        now = time.monotonic()
+        while self._waiters and self.running < self.max_concurrency:
+            waiter = min(self._waiters, key=lambda item: self._priority(item, now))
+            self._waiters.remove(waiter)
+            start = self._start_tag(waiter.user_id)
+            self._finish[waiter.user_id] = start + waiter.cost / self._weight(waiter.user_id)
+            self._virtual_time = start
+            # Пользователи, которые не опережают виртуальное время, начнут с него, их записи не нужны.
+            self._finish = {user_id: finish for user_id, finish in self._finish.items()
+                            if finish > self._virtual_time}
+            self.running += 1
+            waiter.future.set_result(None)
+
+    def _priority(self, waiter: Waiter, now: float) -> float:
+        return (self._start_tag(waiter.user_id) + waiter.cost / self._weight(waiter.user_id)
+                - self.aging * (now - waiter.enqueued))
+
+    def _start_tag(self, user_id: Optional[int]) -> float:
+        return max(self._virtual_time, self._finish.get(user_id, 0.0))
+
+    def _weight(self, user_id: Optional[int]) -> float:
+        return self.weights.get(user_id, 1.0)  # type: ignore
+
+    async def execute(self, command: List[str], bounded: bool = True, user_id: Optional[int] = None,
+                      cost: float = 0.0) -> Tuple[int, bytes, bytes]:
+        """
+        Запускает процесс в свободном слоте и ожидает его завершения.
+        Аргументы user_id и cost передаются в ConversionEngine.slot.
+
+        Returns:
+            Tuple[code: int, stdout: bytes, stderr: bytes]: Код завершения, стандартный поток вывода
+            и стандартный вывод ошибок.
+        """
+
+        async with self.slot(bounded, user_id, cost):
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(*command, stdin=DEVNULL, stdout=PIPE, stderr=PIPE)
+            try:
+                stdout, stderr = await process.communicate()
+            except BaseException:
+                process.kill()
+                await process.wait()
+                self.observe(started, process.returncode)
+                raise
+            self.observe(started, process.returncode)
+            return process.returncode, stdout, stderr  # type: ignore
+
+    def observe(self, started: float, code: Optional[int]) -> None:
+        """
+        Записывает в метрики и в этап "ffmpeg" текущего запроса время работы процесса,
+        запущенного в момент started (time.perf_counter), и его код завершения.
+        """
+
+        elapsed = time.perf_counter() - started
+        record_phase("ffmpeg", elapsed)
+        if self.metrics is None:
+            return
+        self.metrics.ffmpeg_seconds.observe(elapsed)
+        self.metrics.ffmpeg_exits.inc(str(code))
+
+
+def setup_conversion_engine(app: "Application"):
+    """
+    Устанавливает экземпляр класса ConversionEngine для текущего экземпляра приложения
+    и счетчики кэша конвертированных файлов.
+    """
+    config: "Config" = app["config"]
+    app["conversion_engine"] = ConversionEngine(max_concurrency=config.converter.max_concurrency,
+                                                max_queue=config.converter.max_queue,
+                                                retry_after=config.converter.retry_after,
+                                                metrics=app.get("metrics"),
+                                                weights=config.converter.user_weights,
+                                                aging=config.converter.aging)
+    app["dedup_stats"] = register_stats(app, "dedup", DedupStats())
@@ -0,0 +1,151 @@
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+SUPPORTED_BITS = {
+    WAVE_FORMAT_PCM: (8, 16, 24, 32),
+    WAVE_FORMAT_IEEE_FLOAT: (32, 64),
+}
+MAX_CHANNELS = 8
+MIN_SAMPLE_RATE = 1000
+MAX_SAMPLE_RATE = 384000
+# Размер data чанка, который записывают программы, не знающие длину файла заранее.
+UNKNOWN_DATA_SIZES = (0, 0xFFFFFFFF)
+
+
+class WavHeaderError(ValueError):
+    """
+    Исключение, возбуждаемое, если данные не являются WAV файлом или его формат не поддерживается.
+    """
+
+
+class IncompleteWavHeaderError(WavHeaderError):
+    """
+    Исключение, возбуждаемое, если для разбора заголовка прочитано недостаточно данных.
+    """
+
+
+@dataclass
+class WavHeader:
+    """
+    Класс, представляющий заголовок файла формата WAV.
+    Args:
+        audio_format: Формат данных (1 - PCM, 3 - IEEE float).
+        channels: Количество каналов.
+        sample_rate: Частота дискретизации.
+        bits_per_sample: Разрядность.
+        block_align: Размер одного фрейма (сэмпла по всем каналам) в байтах.
+        data_offset: Смещение начала PCM данных от начала файла.
+        data_size: Размер PCM данных в байтах. None, если размер не указан в заголовке.
+    """
+    audio_format: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    block_align: int
+    data_offset: int
+    data_size: Optional[int]
+
+    @property
+    def frames(self) -> Optional[int]:
+        """
+        Количество фреймов в файле.
+        """
+        if self.data_size is None:
+            return None
+        return self.data_size // self.block_align
+
+    @property
+    def duration(self) -> Optional[float]:
+        """
+        Длительность записи в секундах.
+        """
+        if self.frames is None:
+            return None
+        return self.frames / self.sample_rate
+
+
+def parse_wav_header(data: bytes) -> WavHeader:
+    """
+    Разбирает заголовок RIFF/WAVE из первых байт файла.
+    Чанки перед data (fmt, LIST, fact и.т.д) пропускаются, разбор останавливается на начале data чанка,
+    поэтому сами PCM данные не нужны.
+
+    Args:
+        data (bytes): Первые байты файла.
+
+    Raises:
+        IncompleteWavHeaderError: Данных недостаточно, чтобы дойти до data чанка.
+        WavHeaderError: Данные не являются WAV файлом или формат не поддерживается.
+
+    Returns:
+        WavHeader: Заголовок файла.
+    """
+    if len(data) < 12:
+        if b"RIFF".startswith(data[:4]):
+            raise IncompleteWavHeaderError("unexpected end of data")
+        raise WavHeaderError("not a RIFF file")
+    if data[:4] != b"RIFF":
+        raise WavHeaderError("not a RIFF file")
+    if data[8:12] != b"WAVE":
+        raise WavHeaderError("not a WAVE file")
+
+    fmt: Optional[tuple] = None
+    offset = 12
+    while True:
+        if len(data) < offset + 8:
+            raise IncompleteWavHeaderError("unexpected end of data")
+        chunk_id = data[offset:offset + 4]
+        chunk_size, = struct.unpack_from("<I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                raise WavHeaderError("fmt chunk is too short")
+            if len(data) < body + chunk_size:
+                raise IncompleteWavHeaderError("unexpected end of data")
+            fmt = _parse_fmt(data[body:body + chunk_size])
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise WavHeaderError("data chunk before fmt chunk")
+            audio_format, channels, sample_rate, block_align, bits_per_sample = fmt
+            data_size = None if chunk_size in UNKNOWN_DATA_SIZES else chunk_size
+            return WavHeader(audio_format=audio_format,
+                             channels=channels,
+                             sample_rate=sample_rate,
+                             bits_per_sample=bits_per_sample,
+                             block_align=block_align,
+                             data_offset=body,
+                             data_size=data_size)
+        # Чанки выравниваются по границе 2 байт.
+        offset = body + chunk_size + (chunk_size & 1)
+
+
+def _parse_fmt(fmt: bytes) -> tuple:
+    """
+    Разбирает и проверяет fmt чанк.
+
+    Returns:
+        tuple: (audio_format, channels, sample_rate, block_align, bits_per_sample)
+    """
+    audio_format, channels, sample_rate, _, block_align, bits_per_sample = struct.unpack_from("<HHIIHH", fmt)
+    if audio_format == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 40:
+            raise WavHeaderError("extensible fmt chunk is too short")
+        # Первые 2 байта GUID подформата совпадают с кодом формата.
+        audio_format, = struct.unpack_from("<H", fmt, 24)
+    if audio_format not in SUPPORTED_BITS:
+        raise WavHeaderError(f"unsupported audio format {audio_format:#06x}")
+    if bits_per_sample not in SUPPORTED_BITS[audio_format]:
+        raise WavHeaderError(f"unsupported bit depth {bits_per_sample}")
+    if not 1 <= channels <= MAX_CHANNELS:
+        raise WavHeaderError(f"unsupported number of channels {channels}")
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise WavHeaderError(f"unsupported sample rate {sample_rate}")
+    if block_align != channels * bits_per_sample // 8:
+        raise WavHeaderError("invalid block align")
+    return audio_format, channels, sample_rate, block_align, bits_per_sample
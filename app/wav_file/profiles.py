@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    Класс, содержащий параметры кодирования mp3 файла.
+    Args:
+        name: Название профиля. Передается в параметре profile конечной точки /files.record.
+        sample_rate: Частота дискретизации в Гц.
+        channels: Количество каналов.
+        bitrate: Битрейт в бит/с.
+    """
+    name: str
+    sample_rate: int = 44100
+    channels: int = 2
+    bitrate: int = 192000
+
+    def params(self) -> List[str]:
+        """
+        Возвращает параметры кодирования ffmpeg.
+        """
+
+        return ["-vn", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-b:a", f"{self.bitrate // 1000}k"]
+
+
+# Профиль, с которым конвертируются и хранятся загруженные файлы. Остальные профили кодируются из него.
+MASTER_PROFILE = EncodingProfile(name="master")
@@ -0,0 +1,154 @@
+import math
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Optional, Sequence
+
+from app.wav_file.header import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, WavHeader
+
+
+# Количество фреймов mp3, которые кодируются до и после границы сегмента, чтобы кодер
+# на границе получил тот же контекст, что и при кодировании файла целиком.
+OVERLAP_FRAMES = 8
+
+RAW_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): "u8",
+    (WAVE_FORMAT_PCM, 16): "s16le",
+    (WAVE_FORMAT_PCM, 24): "s24le",
+    (WAVE_FORMAT_PCM, 32): "s32le",
+    (WAVE_FORMAT_IEEE_FLOAT, 32): "f32le",
+    (WAVE_FORMAT_IEEE_FLOAT, 64): "f64le",
+}
+
+# Битрейты (кбит/с) MPEG-1 Layer III и MPEG-2/2.5 Layer III по индексу из заголовка фрейма.
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+@dataclass
+class Segment:
+    """
+    Класс, представляющий часть WAV файла, которая кодируется отдельным процессом ffmpeg.
+    Args:
+        offset: Смещение первого сэмпла сегмента (с учетом перекрытия) от начала файла в байтах.
+        samples: Количество сэмплов (на канал), передаваемых в ffmpeg.
+        skip_frames: Количество mp3 фреймов в начале результата, которые относятся к перекрытию
+        с предыдущим сегментом и отбрасываются.
+        keep_frames: Количество mp3 фреймов, которые попадают в итоговый файл. None - все оставшиеся.
+    """
+    offset: int
+    samples: int
+    skip_frames: int
+    keep_frames: Optional[int]
+
+
+def samples_per_frame(sample_rate: int) -> int:
+    """
+    Количество сэмплов в одном mp3 фрейме для заданной частоты дискретизации.
+    """
+    return 1152 if sample_rate >= 32000 else 576
+
+
+def plan_segments(header: WavHeader, out_sample_rate: int, bitrate: int, count: int) -> List[Segment]:
+    """
+    Делит PCM данные WAV файла на сегменты.
+    Границы сегментов выбираются так, чтобы они совпадали и с границей сэмпла исходного файла,
+    и с границей mp3 фрейма результата. Тогда mp3 фреймы каждого сегмента покрывают те же сэмплы,
+    что и при кодировании файла целиком, и сегменты склеиваются без пауз на стыках.
+    Кроме того, граница совпадает с началом цикла байтов заполнения (padding) CBR фреймов,
+    поэтому размеры фреймов сегмента такие же, как при кодировании файла целиком.
+
+    Args:
+        header (WavHeader): Заголовок WAV файла.
+        out_sample_rate (int): Частота дискретизации mp3 файла.
+        bitrate (int): Битрейт mp3 файла в бит/с.
+        count (int): Желаемое количество сегментов.
+
+    Returns:
+        List[Segment]: Сегменты. Если файл слишком короткий, возвращается один сегмент.
+    """
+    in_rate = header.sample_rate
+    frame = samples_per_frame(out_sample_rate)
+    # Шаг (в mp3 фреймах), при котором граница фрейма приходится на целый сэмпл исходного файла.
+    step = out_sample_rate // math.gcd(frame * in_rate, out_sample_rate)
+    # Период (в mp3 фреймах), с которым повторяется последовательность фреймов с байтом заполнения.
+    padding_period = out_sample_rate // math.gcd(frame // 8 * bitrate, out_sample_rate)
+    step = step * padding_period // math.gcd(step, padding_period)
+    overlap = step * math.ceil(OVERLAP_FRAMES / step)
+    in_frames: int = header.frames  # type: ignore
+    total_frames = in_frames * out_sample_rate // (in_rate * frame)
+
+    boundaries = [0]
+    for i in range(1, count):
+        boundary = (total_frames * i // count) // step * step
+        if boundary - boundaries[-1] > overlap:
+            boundaries.append(boundary)
+    if len(boundaries) == 1:
+        return [Segment(offset=header.data_offset, samples=in_frames, skip_frames=0, keep_frames=None)]
+
+    def to_samples(frames: int) -> int:
+        return min(in_frames, frames * frame * in_rate // out_sample_rate)
+
+    segments = []
+    for i, boundary in enumerate(boundaries):
+        start = max(0, boundary - overlap)
+        last = i == len(boundaries) - 1
+        end = in_frames if last else to_samples(boundaries[i + 1] + overlap)
+        segments.append(Segment(offset=header.data_offset + to_samples(start) * header.block_align,
+                                samples=end - to_samples(start),
+                                skip_frames=boundary - start,
+                                keep_frames=None if last else boundaries[i + 1] - boundary))
+    return segments
+
+
+def raw_format(header: WavHeader) -> str:
+    """
+    Возвращает имя формата ffmpeg для PCM данных WAV файла.
+    """
+    return RAW_FORMATS[(header.audio_format, header.bits_per_sample)]
+
+
+def iter_mp3_frames(f: BinaryIO) -> Iterator[bytes]:
+    """
+    Читает mp3 фреймы из файла, в котором нет тегов ID3 и заголовка Xing.
+
+    Raises:
+        ValueError: Файл содержит данные, не являющиеся mp3 фреймом.
+    """
+    while True:
+        header = f.read(4)
+        if not header:
+            return
+        length = _frame_length(header)
+        yield header + f.read(length - 4)
+
+
+def _frame_length(header: bytes) -> int:
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        raise ValueError("mp3 frame sync not found")
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    padding = (header[2] >> 1) & 0x01
+    if layer != 1 or version == 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        raise ValueError("unsupported mp3 frame")
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        return 144 * _BITRATES_V1[bitrate_index] * 1000 // sample_rate + padding
+    return 72 * _BITRATES_V2[bitrate_index] * 1000 // sample_rate + padding
+
+
+def join_segments(segment_paths: Sequence[str], segments: Sequence[Segment], out_path: str) -> None:
+    """
+    Склеивает закодированные сегменты в один mp3 файл, отбрасывая фреймы перекрытий.
+    Метод блокирующий, поэтому выполняется в пуле потоков.
+    """
+    with open(out_path, "wb") as out:
+        for path, segment in zip(segment_paths, segments):
+            with open(path, "rb") as f:
+                for index, frame in enumerate(iter_mp3_frames(f)):
+                    if index < segment.skip_frames:
+                        continue
+                    if segment.keep_frames is not None and index >= segment.skip_frames + segment.keep_frames:
+                        break
+                    out.write(frame)
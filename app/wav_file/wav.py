@@ -1,25 +1,48 @@
 import asyncio
-from os import devnull, path
-from datetime import datetime
-from subprocess import Popen, PIPE
-from typing import Optional, Tuple, Union, AsyncGenerator, TYPE_CHECKING
+import hashlib
+import time
+from os import path
+from asyncio.subprocess import PIPE, DEVNULL
+from typing import List, Optional, Tuple, Union, AsyncGenerator, AsyncIterator, TYPE_CHECKING
 from tempfile import NamedTemporaryFile
+from uuid import uuid4
+import aiofiles
 import aiofiles.os
 
 from aiohttp.web_exceptions import HTTPBadRequest
 from app.store.database.database import Database
 
-from app.mp3_files.models import Mp3FileModel
+from app.mp3_files.models import JOB_RUNNING, ConversionJobModel, Mp3ContentModel, Mp3FileModel
+from app.store.storage import UPLOADS_ROOT, discard, ensure_directory, file_path_for
+from app.web.timing import phase, record_phase
+from app.web.utils import record_url
+from app.wav_file.header import IncompleteWavHeaderError, WavHeader, WavHeaderError, parse_wav_header
+from app.wav_file.profiles import MASTER_PROFILE
+from app.wav_file.segments import Segment, join_segments, plan_segments, raw_format
 
 
 if TYPE_CHECKING:
-    from aiohttp import BodyPartReader, MultipartReader
     from tempfile import _TemporaryFileWrapper
+    from aiohttp import BodyPartReader, MultipartReader
     from app.web.config import Config
-    from concurrent.futures import ThreadPoolExecutor
+    from app.wav_file.engine import ConversionEngine
+    from app.mp3_files.writer import Mp3FileBatchWriter
+    from app.web.stats import DedupStats
+    from app.store.storage import StorageBackend
+    from app.web.metrics import Metrics
     from aiohttp.web import Application
 
 
+# Максимальный размер начала файла, в котором ищется data чанк.
+MAX_HEADER_SIZE = 1024*1024
+# Размер блока, которым читается вывод ffmpeg при потоковой отдаче mp3 файла.
+OUT_CHUNK_SIZE = 64*1024
+# Оценка длительности записи в секундах, если размер файла неизвестен: такие конвертации не считаются короткими.
+UNKNOWN_COST = 3600.0
+# Количество байт в секунде записи, если заголовок файла не разобран: 44.1 кГц, 16 бит, стерео.
+DEFAULT_BYTE_RATE = 44100 * 2 * 2
+
+
 class WavFile:
     """
     Класс WavFile, представляющий файл формата WAV.
@@ -28,60 +51,591 @@ class WavFile:
         filename: Имя файла, полученного от пользователя.
         app: Экземпляр класса aiohttp.web.Application
         user_id: Идентификатор пользователя в базе данных.
+        size_hint: Размер тела запроса (Content-Length). Используется для оценки длительности записи,
+        если размер данных не указан в заголовке WAV файла.
     """
 
-    def __init__(self, filename: str, app: "Application", user_id: int, *args, **kwargs):
+    def __init__(self, filename: str, app: "Application", user_id: int, *args,
+                 size_hint: Optional[int] = None, **kwargs):
         self.filename = filename
         self.user_id = user_id
+        self.size_hint = size_hint
         self.app = app
         self.database: Database = self.app["database"]
-        self._loop = asyncio.get_event_loop()
+        self._storage: "StorageBackend" = self.app["storage"]
+        self._engine: "ConversionEngine" = self.app["conversion_engine"]
+        self._dedup: bool = self.app["config"].converter.dedup
+        self._hasher = hashlib.sha256()
+        self._content_hash: Optional[str] = None
+        self._received = 0
+        self._content: Optional[Mp3ContentModel] = None
+        # Искался ли конвертированный файл с тем же содержимым (WavFile._reuse_content).
+        self._looked_up = False
+        self.header: Optional[WavHeader] = None
+        self.key = uuid4()
+        self._out_file: Optional[str] = None
+        self._in_temp_file: Optional["_TemporaryFileWrapper"] = None
+        self._code: Optional[int] = None
+        self.job: Optional[ConversionJobModel] = None
 
     async def run(self, reader: Optional[Union["MultipartReader", "BodyPartReader"]]) -> str:
         """
         Запускает конвертацию файлов из формата WAV в формат mp3 на исполнение.
+        Перед конвертацией проверяется заголовок файла. Если включен потоковый режим, байты из сокета передаются
+        в ffmpeg по мере получения. В противном случае файл сначала сохраняется во временное хранилище.
 
         Returns:
             Возвращает url адрес для скачивания mp3 файла.
         """
 
-        in_temp_file = NamedTemporaryFile(mode="ab")
-        async for chunk in self._read_by_chunck(reader):
-            in_temp_file.write(chunk)
+        await self.receive(reader)
+        return await self.finish()
 
-        out_path_file = await self._create_out_filepath()
-        thread_pool_executor: "ThreadPoolExecutor" = self.app['executor']
-        code, _, _ = await self._loop.run_in_executor(thread_pool_executor,
-                                                      self._convert_to_mp3, in_temp_file, out_path_file)
-        if code != 0:
-            in_temp_file.close()
+    async def receive(self, reader: Optional[Union["MultipartReader", "BodyPartReader"]],
+                      streaming: Optional[bool] = None) -> None:
+        """
+        Читает файл из сокета. В потоковом режиме файл конвертируется по мере получения,
+        иначе сохраняется во временное хранилище и конвертируется в WavFile.finish.
+        После завершения метода из reader можно читать следующую часть запроса.
+
+        Args:
+            streaming: Использовать ли потоковый режим. По умолчанию берется из настроек конвертации.
+        """
+
+        self._engine.ensure_capacity()
+        chunks = self._read_by_chunck(reader)
+        first_chunk = await self._read_header(chunks)
+        self._out_file = await self._create_out_filepath()
+        if streaming is None:
+            config: "Config" = self.app["config"]
+            streaming = config.converter.streaming
+        if streaming and self._can_stream():
+            self._code = await self._convert_stream(first_chunk, chunks, self._out_file)
+        else:
+            self._in_temp_file = await self._write_temp_file(first_chunk, chunks)
+
+    async def finish(self) -> str:
+        """
+        Завершает конвертацию файла, полученного WavFile.receive, и сохраняет запись о нем в базе данных.
+
+        Returns:
+            Возвращает url адрес для скачивания mp3 файла.
+        """
+
+        out_path_file: str = self._out_file  # type: ignore
+        if self._in_temp_file is not None:
+            try:
+                self._code = await self._convert_temp_file(self._in_temp_file.name, out_path_file)
+            finally:
+                self._in_temp_file.close()
+                self._in_temp_file = None
+        if self._code != 0:
             raise HTTPBadRequest(reason="Invalid file. Failed to convert file to mp3 format.")
-        mp3_file_model = await Mp3FileModel.inser_file(self.database, self.user_id, out_path_file, self.filename)
+        mp3_file_model = await self._save(out_path_file)
         url = self._generate_response(mp3_file_model.id)
-        in_temp_file.close()
         return url
 
+    async def accept(self, reader: Optional[Union["MultipartReader", "BodyPartReader"]]) -> "ConversionJobModel":
+        """
+        Сохраняет файл, полученный от клиента, на диск и ставит задачу на его конвертацию
+        в очередь фоновых обработчиков ConversionJobRunner.
+
+        Returns:
+            Возвращает экземпляр класса ConversionJobModel.
+        """
+
+        chunks = self._read_by_chunck(reader)
+        first_chunk = await self._read_header(chunks)
+        source_path = await self._create_upload_filepath()
+        try:
+            async with aiofiles.open(source_path, mode="wb") as f:
+                await f.write(first_chunk)
+                async for chunk in chunks:
+                    await f.write(chunk)
+        except BaseException:
+            await aiofiles.os.remove(source_path)
+            raise
+        content_hash = self._digest() if self._dedup else None
+        job = await ConversionJobModel.insert_job(self.database, self.user_id, source_path, self.filename,
+                                                  content_hash)
+        self.app["job_runner"].enqueue(job.id)
+        return job
+
+    async def accept_upload(self, file_path: str) -> "ConversionJobModel":
+        """
+        Ставит задачу на конвертацию файла, полученного по частям (/uploads.finish).
+        Заголовок файла проверяется так же, как при загрузке одним запросом, после чего файл переносится
+        в директорию файлов фоновых задач. Хэш содержимого вычисляет фоновый обработчик.
+
+        Raises:
+            HTTPBadRequest: Файл не является WAV файлом или его формат не поддерживается.
+
+        Returns:
+            Возвращает экземпляр класса ConversionJobModel.
+        """
+
+        async with aiofiles.open(file_path, mode="rb") as f:
+            data = await f.read(MAX_HEADER_SIZE)
+        try:
+            self.header = parse_wav_header(data)
+        except WavHeaderError as e:
+            raise HTTPBadRequest(reason=f"Invalid WAV file: {e}.")
+        source_path = await self._create_upload_filepath()
+        await aiofiles.os.rename(file_path, source_path)
+        job = await ConversionJobModel.insert_job(self.database, self.user_id, source_path, self.filename)
+        self.app["job_runner"].enqueue(job.id)
+        return job
+
+    async def convert_job(self, job: "ConversionJobModel") -> Optional["Mp3FileModel"]:
+        """
+        Конвертирует сохраненный на диск файл фоновой задачи в формат mp3.
+        Вызывается из ConversionJobRunner.
+
+        Returns:
+            Экземпляр класса Mp3FileModel или None, если файл не удалось конвертировать.
+        """
+
+        out_path_file = await self._create_out_filepath()
+        if self._dedup:
+            self._content_hash = job.content_hash
+            if not self._content_hash:
+                await self._hash_file(job.source_path)
+            self._content = await self._reuse_content()
+            if self._content:
+                self.app["dedup_stats"].saved_bytes += await aiofiles.os.path.getsize(job.source_path)
+        if not self._content:
+            await self._read_file_header(job.source_path)
+            self.size_hint = await aiofiles.os.path.getsize(job.source_path)
+            code = await self._convert_file(job.source_path, out_path_file, bounded=False)
+            if code != 0:
+                return None
+        return await self._save(out_path_file)
+
+    async def _save(self, out_file: str) -> "Mp3FileModel":
+        """
+        Добавляет запись о конвертированном файле в таблицу "mp3_files" базы данных.
+        Если включена дедупликация, запись ссылается на файл в таблице "mp3_contents".
+        Если такой же файл был конвертирован параллельно с текущим запросом (add_reference вернул
+        существующую запись), только что созданный файл удаляется, и запись ссылается на существующий.
+        """
+
+        content_id = None
+        if self._dedup:
+            content = self._content
+            if content is None:
+                if not self._looked_up:
+                    # Файл конвертирован потоком, до того как стал известен хэш содержимого.
+                    self.app["dedup_stats"].misses += 1
+                content = await Mp3ContentModel.add_reference(self.database, self._digest(),
+                                                              self._encoding_key(), out_file)
+            if content.file_path != out_file:
+                await self._storage.delete(out_file)
+                out_file = content.file_path
+            content_id = content.id
+        with phase("stat"):
+            stored = await self._storage.stat(out_file)
+        writer: "Mp3FileBatchWriter" = self.app["mp3_file_writer"]
+        with phase("db_insert"):
+            return await writer.insert(self.user_id, out_file, self.filename, content_id,
+                                       size=stored.size if stored else None,
+                                       etag=stored.etag if stored else None, uuid=self.key)
+
+    async def _reuse_content(self) -> Optional[Mp3ContentModel]:
+        """
+        Ищет уже конвертированный файл с тем же хэшем содержимого и параметрами кодирования
+        и обновляет счетчики попаданий и промахов. Вызывается не больше одного раза за конвертацию,
+        результат передается в WavFile._save через self._content.
+        """
+
+        self._looked_up = True
+        stats: "DedupStats" = self.app["dedup_stats"]
+        content = await Mp3ContentModel.reuse(self.database, self._digest(), self._encoding_key())
+        if content:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+        return content
+
+    async def _hash_file(self, file_path: str) -> None:
+        """
+        Вычисляет хэш содержимого файла, сохраненного на диск.
+        """
+
+        async with aiofiles.open(file_path, mode="rb") as f:
+            while chunk := await f.read(5*1024*1024):
+                await self._update_hash(chunk)
+
+    async def _write_temp_file(self, first_chunk: bytes, chunks: AsyncIterator[bytes]) -> "_TemporaryFileWrapper":
+        """
+        Сохраняет файл во временное хранилище. Файл удаляется при закрытии.
+        """
+
+        in_temp_file = NamedTemporaryFile(mode="ab")
+        try:
+            with phase("temp_write"):
+                in_temp_file.write(first_chunk)
+            async for chunk in chunks:
+                with phase("temp_write"):
+                    in_temp_file.write(chunk)
+            with phase("temp_write"):
+                in_temp_file.flush()
+        except BaseException:
+            in_temp_file.close()
+            raise
+        return in_temp_file
+
+    async def _convert_temp_file(self, in_file: str, out_file: str) -> int:
+        """
+        Конвертирует файл из временного хранилища в формат mp3.
+        Используется для данных, которые нельзя передать в ffmpeg потоком.
+
+        Returns:
+            Код завершения программы ffmpeg.
+        """
+
+        if self._dedup:
+            self._content = await self._reuse_content()
+            if self._content:
+                self.app["dedup_stats"].saved_bytes += self._received
+                return 0
+        return await self._convert_file(in_file, out_file)
+
+    async def _convert_stream(self, first_chunk: bytes, chunks: AsyncIterator[bytes], out_file: str) -> int:
+        """
+        Передает байты, прочитанные из сокета, в stdin программы ffmpeg по мере их получения.
+        Чтение из сокета и кодирование выполняются одновременно. Следующая часть файла
+        читается из сокета только после того, как ffmpeg забрал предыдущую (stdin.drain),
+        поэтому в оперативной памяти не накапливаются данные, которые ffmpeg не успевает обработать.
+
+        Процесс ffmpeg занимает слот ConversionEngine на все время загрузки файла.
+
+        Returns:
+            Код завершения программы ffmpeg.
+        """
+
+        partial = await self._storage.output_path(out_file)
+        async with self._engine.slot(user_id=self.user_id, cost=self._cost()):
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(*self._ffmpeg_command("pipe:0", partial),
+                                                           stdin=PIPE, stdout=DEVNULL, stderr=DEVNULL)
+            try:
+                await self._write_stdin(process.stdin, first_chunk, chunks)  # type: ignore
+                code = await process.wait()
+            except BaseException:
+                process.kill()
+                await process.wait()
+                self._engine.observe(started, process.returncode)
+                await discard(partial)
+                raise
+            self._engine.observe(started, code)
+        return await self._publish(code, partial, out_file)
+
+    async def _write_stdin(self, stdin: asyncio.StreamWriter, first_chunk: bytes, chunks: AsyncIterator[bytes]) -> None:
+        """
+        Передает в stdin программы ffmpeg первую часть файла и остальные части по мере их чтения из сокета.
+        Если ffmpeg завершился раньше, чем были переданы все данные, ошибка записи не возбуждается:
+        код завершения вернет process.wait(). Ошибки чтения из сокета (например, клиент отключился)
+        возбуждаются, чтобы файл, полученный не полностью, не был сохранен.
+        """
+
+        try:
+            if not await self._write_chunk(stdin, first_chunk):
+                return
+            async for chunk in chunks:
+                if not await self._write_chunk(stdin, chunk):
+                    return
+        finally:
+            stdin.close()
+
+    @staticmethod
+    async def _write_chunk(stdin: asyncio.StreamWriter, chunk: bytes) -> bool:
+        """
+        Записывает часть файла в stdin программы ffmpeg.
+
+        Returns:
+            False, если ffmpeg уже завершился и закрыл stdin.
+        """
+
+        try:
+            stdin.write(chunk)
+            await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            return False
+        return True
+
+    async def progressive(self, reader: Optional[Union["MultipartReader", "BodyPartReader"]]) -> AsyncGenerator:
+        """
+        Асинхронный генератор, конвертирующий файл по мере получения из сокета и возвращающий блоки mp3 файла
+        по мере их записи программой ffmpeg. Те же блоки одновременно записываются в файловое хранилище.
+        До первого блока проверяется заголовок файла и создается фоновая задача (self.job) со статусом "running",
+        по которой клиент узнает url адрес для скачивания записи. После последнего блока запись сохраняется
+        в базе данных, и задача переводится в статус "done". Если конвертация прервана или завершилась ошибкой,
+        задача переводится в статус "failed". У задачи нет исходного файла (source_path пустой), поэтому
+        после аварийной остановки процесса она не выполняется повторно, а завершается ошибкой.
+
+        Raises:
+            HTTPBadRequest: Файл не является WAV файлом, в заголовке не указан размер данных
+            или ffmpeg не смог конвертировать файл.
+        """
+
+        self._engine.ensure_capacity()
+        chunks = self._read_by_chunck(reader)
+        first_chunk = await self._read_header(chunks)
+        if self.header.data_size is None:  # type: ignore
+            raise HTTPBadRequest(reason="Stream mode requires a WAV file with the data size in its header.")
+        out_file = await self._create_out_filepath()
+        self.job = await ConversionJobModel.insert_job(self.database, self.user_id, "", self.filename,
+                                                       status=JOB_RUNNING)
+        try:
+            partial = await self._storage.output_path(out_file)
+            async with self._engine.slot(user_id=self.user_id, cost=self._cost()):
+                started = time.perf_counter()
+                # Без заголовка Xing: ffmpeg не может дописать его в начало файла, который передается через pipe.
+                process = await asyncio.create_subprocess_exec(
+                    "ffmpeg", "-y", "-i", "pipe:0", *self._encoding_params(), "-write_xing", "0",
+                    "-f", "mp3", "pipe:1", stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+                feeder = asyncio.ensure_future(self._write_stdin(process.stdin, first_chunk, chunks))  # type: ignore
+                stdout: asyncio.StreamReader = process.stdout  # type: ignore
+                try:
+                    async with aiofiles.open(partial, mode="wb") as f:
+                        while data := await stdout.read(OUT_CHUNK_SIZE):
+                            await f.write(data)
+                            yield data
+                    await feeder
+                    code = await process.wait()
+                except BaseException:
+                    feeder.cancel()
+                    process.kill()
+                    await process.wait()
+                    await asyncio.gather(feeder, return_exceptions=True)
+                    self._engine.observe(started, process.returncode)
+                    await discard(partial)
+                    raise
+                self._engine.observe(started, code)
+            if await self._publish(code, partial, out_file) != 0:
+                raise HTTPBadRequest(reason="Invalid file. Failed to convert file to mp3 format.")
+            mp3_file_model = await self._save(out_file)
+        except BaseException as e:
+            await ConversionJobModel.finish_job(self.database, self.job.id,
+                                                error=getattr(e, "reason", None) or "Conversion was interrupted.")
+            raise
+        await ConversionJobModel.finish_job(self.database, self.job.id, mp3_file_id=mp3_file_model.id)
+
+    async def _read_header(self, chunks: AsyncIterator[bytes]) -> bytes:
+        """
+        Читает из сокета первые байты файла и разбирает заголовок WAV файла.
+        Обычно заголовок целиком помещается в первую прочитанную часть файла.
+        Файл отклоняется до записи на диск и запуска ffmpeg, если он не является WAV файлом
+        или его формат не поддерживается.
+
+        Raises:
+            HTTPBadRequest: Файл не является WAV файлом или его формат не поддерживается.
+
+        Returns:
+            Прочитанные байты, которые нужно передать на конвертацию перед остальными частями файла.
+        """
+
+        data = b""
+        async for chunk in chunks:
+            data += chunk
+            try:
+                self.header = parse_wav_header(data)
+                return data
+            except IncompleteWavHeaderError:
+                if len(data) >= MAX_HEADER_SIZE:
+                    break
+            except WavHeaderError as e:
+                raise HTTPBadRequest(reason=f"Invalid WAV file: {e}.")
+        raise HTTPBadRequest(reason="Invalid WAV file: header not found.")
+
+    def _can_stream(self) -> bool:
+        """
+        Проверяет, что файл можно передать в ffmpeg потоком. Файлы, в заголовке которых
+        не указан размер данных, сохраняются во временное хранилище.
+        """
+
+        return self.header is not None and self.header.data_size is not None and self._segment_count() == 1
+
+    async def _read_file_header(self, file_path: str) -> None:
+        """
+        Разбирает заголовок WAV файла, сохраненного на диск.
+        """
+
+        async with aiofiles.open(file_path, mode="rb") as f:
+            data = await f.read(MAX_HEADER_SIZE)
+        try:
+            self.header = parse_wav_header(data)
+        except WavHeaderError:
+            self.header = None
+
+    def _segment_count(self) -> int:
+        """
+        Возвращает количество сегментов, на которые делится файл для параллельного кодирования.
+        Файлы меньше converter.segment_threshold кодируются одним процессом ffmpeg.
+        """
+
+        config: "Config" = self.app["config"]
+        if self.header is None or self.header.data_size is None:
+            return 1
+        if self.header.data_size < config.converter.segment_threshold:
+            return 1
+        return config.converter.max_concurrency
+
+    async def _convert_file(self, in_file: str, out_file: str, bounded: bool = True) -> int:
+        """
+        Конвертирует файл, сохраненный на диск, в формат mp3. Большие файлы кодируются по частям параллельно.
+
+        Returns:
+            Код завершения программы ffmpeg.
+        """
+
+        partial = await self._storage.output_path(out_file)
+        try:
+            if self._segment_count() > 1:
+                code = await self._convert_segmented(in_file, partial)
+            else:
+                code, _, _ = await self._convert_to_mp3(in_file, partial, bounded)
+        except BaseException:
+            await discard(partial)
+            raise
+        return await self._publish(code, partial, out_file)
+
+    async def _publish(self, code: int, partial: str, out_file: str) -> int:
+        """
+        Публикует записанный ffmpeg файл в файловом хранилище под именем out_file, если конвертация
+        завершилась успешно, иначе удаляет его. Поэтому по имени out_file никогда не бывает частично записанного файла.
+
+        Returns:
+            Код завершения программы ffmpeg.
+        """
+
+        if code == 0:
+            with phase("publish"):
+                await self._storage.commit(partial, out_file)
+        else:
+            await discard(partial)
+        return code
+
+    async def _convert_segmented(self, in_file: str, out_file: str) -> int:
+        """
+        Делит PCM данные файла на сегменты по границам фреймов и кодирует их параллельно
+        отдельными процессами ffmpeg, каждый из которых занимает свой слот ConversionEngine.
+        Сегменты кодируются без резервуара битов (-reservoir 0), поэтому каждый mp3 фрейм
+        не зависит от предыдущих, и после отбрасывания перекрытий сегменты склеиваются без пауз.
+
+        Returns:
+            Код завершения программы ffmpeg. Если хотя бы один сегмент не удалось конвертировать,
+            возвращается его код.
+        """
+
+        header: WavHeader = self.header  # type: ignore
+        segments = plan_segments(header, MASTER_PROFILE.sample_rate, MASTER_PROFILE.bitrate, self._segment_count())
+        segment_paths = [f"{out_file}.part{index}" for index in range(len(segments))]
+        try:
+            results = await asyncio.gather(*(
+                self._engine.execute(self._segment_command(in_file, segment, segment_path), bounded=False,
+                                     user_id=self.user_id, cost=segment.samples / header.sample_rate)
+                for segment, segment_path in zip(segments, segment_paths)
+            ))
+            for code, _, _ in results:
+                if code != 0:
+                    return code
+            await asyncio.get_running_loop().run_in_executor(self.app["executor"], join_segments,
+                                                             segment_paths, segments, out_file)
+            return 0
+        finally:
+            for segment_path in segment_paths:
+                if await aiofiles.os.path.exists(segment_path):
+                    await aiofiles.os.remove(segment_path)
+
+    def _segment_command(self, in_file: str, segment: Segment, out_file: str) -> List[str]:
+        """
+        Возвращает аргументы командной строки ffmpeg для кодирования одного сегмента.
+        PCM данные читаются из файла напрямую, начиная со смещения segment.offset.
+        """
+
+        header: WavHeader = self.header  # type: ignore
+        return ["ffmpeg", "-y",
+                "-f", raw_format(header), "-ar", str(header.sample_rate), "-ac", str(header.channels),
+                "-skip_initial_bytes", str(segment.offset), "-i", in_file,
+                "-af", f"atrim=end_sample={segment.samples}",
+                *self._encoding_params(),
+                "-reservoir", "0", "-write_xing", "0", "-id3v2_version", "0", "-write_id3v1", "0",
+                "-f", "mp3", out_file]
+
+    def _ffmpeg_command(self, in_file: str, out_file: str) -> List[str]:
+        """
+        Возвращает аргументы командной строки ffmpeg для конвертации файла в формат mp3.
+        """
+
+        return ["ffmpeg", "-y", "-i", in_file, *self._encoding_params(), "-f", "mp3", out_file]
+
+    def _encoding_params(self) -> List[str]:
+        """
+        Возвращает параметры кодирования ffmpeg.
+        """
+
+        return MASTER_PROFILE.params()
+
+    def _encoding_key(self) -> str:
+        """
+        Возвращает параметры кодирования в виде строки для поиска в таблице "mp3_contents".
+        """
+
+        return " ".join(self._encoding_params())
+
     async def _read_by_chunck(self, reader: Optional[Union["MultipartReader", "BodyPartReader"]]) -> AsyncGenerator:
         """
         Читает файл частями по 5 Мб из сокета, чтобы не хранить большие
         файлы в оперативной памяти. Файлы в формате WAV могут достигать до 4 Гб.
         chunck - прочитанные байты из сокета.
+        После чтения всего файла его размер и время чтения записываются в метрики.
         """
 
+        metrics: Optional["Metrics"] = self.app.get("metrics")
+        started = time.perf_counter()
+        size = 0
         while True:
+            read_started = time.perf_counter()
             chunk = await reader.read_chunk(5*1024*1024)  # type: ignore
+            record_phase("read", time.perf_counter() - read_started)
             if not chunk:
                 break
+            size += len(chunk)
+            if self._dedup:
+                await self._update_hash(chunk)
             yield chunk
+        if metrics is not None:
+            metrics.upload_bytes.observe(size)
+            metrics.upload_seconds.observe(time.perf_counter() - started)
 
-    def _convert_to_mp3(self, temp: "_TemporaryFileWrapper", out_file) -> Tuple[int, bytes, bytes]:
+    def _digest(self) -> str:
+        """
+        Возвращает хэш содержимого файла. Для фоновых задач хэш вычисляется при получении файла.
+        """
+
+        return self._content_hash or self._hasher.hexdigest()
+
+    async def _update_hash(self, chunk: bytes) -> None:
+        """
+        Обновляет хэш содержимого файла. hashlib освобождает GIL при обработке больших блоков данных,
+        поэтому вычисление выполняется в пуле потоков и не блокирует событийный цикл.
+        """
+
+        self._received += len(chunk)
+        with phase("hash"):
+            await asyncio.get_running_loop().run_in_executor(self.app["executor"], self._hasher.update, chunk)
+
+    async def _convert_to_mp3(self, in_file: str, out_file: str, bounded: bool = True) -> Tuple[int, bytes, bytes]:
         """ Конвертирует файл из формата WAV в формат mp3.
-        Метод блокирующий, поэтому будем передавать его в пул потоков, чтобы не блокировать событийный цикл.
+        Процесс ffmpeg запускается через ConversionEngine, который ограничивает количество
+        одновременно работающих конвертаций.
 
         Args:
-            temp (_TemporaryFileWrapper):  Файлоподобный объект, используемый в качестве временного хранилища.
-            Содержит данные, прочитанные из сокета. Имя файла temp.name перадется в программу ffmpeg https://ffmpeg.org/
-            для конвертации в формат mp3.
+            in_file (str): Путь к файлу, содержащему данные, прочитанные из сокета. Путь перадется
+            в программу ffmpeg https://ffmpeg.org/ для конвертации в формат mp3.
+            out_file (str): Путь к конвертированному файлу.
+            bounded (bool): Проверять ли размер очереди ConversionEngine.
 
         Returns:
             Tuple[code: int, stdout: bytes, stderr: bytes]:
@@ -92,40 +646,43 @@ class WavFile:
                 stderr - Стандартный вывод ошибок.
         """
 
-        ffmpeg = ["ffmpeg", "-y", "-i", temp.name, "-vn", "-ar", "44100", "-ac", "2", "-b:a", "192k", out_file]
-        with open(devnull, 'rb') as dev_null:
-            p = Popen(ffmpeg, stdin=dev_null, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = p.communicate()
-        code = p.returncode
-        temp.close()
-        return code, stdout, stderr
+        return await self._engine.execute(self._ffmpeg_command(in_file, out_file), bounded, self.user_id,
+                                          self._cost())
 
-    async def _create_directory(self) -> str:
+    def _cost(self) -> float:
         """
-        Создает директорию в которую будет сохранен конвертированный файл.
+        Оценивает стоимость конвертации для очереди ConversionEngine - длительность записи в секундах.
+        Если размер данных не указан в заголовке, длительность вычисляется по размеру тела запроса.
+        Если заголовок не разобран, длительность оценивается по размеру для записи CD качества.
         """
 
-        current_date = datetime.now()
-        current_date_string = current_date.strftime("%Y/%b/%d/%H/%M/%S")
-        directory = path.join("./media", current_date_string)
-        await aiofiles.os.makedirs(directory, exist_ok=True)
-        return directory
+        header = self.header
+        if header is None:
+            return self.size_hint / DEFAULT_BYTE_RATE if self.size_hint else UNKNOWN_COST
+        if header.duration is not None:
+            return header.duration
+        if self.size_hint:
+            return max(self.size_hint - header.data_offset, 0) / (header.sample_rate * header.block_align)
+        return UNKNOWN_COST
 
-    async def _create_out_filepath(self):
+    async def _create_out_filepath(self) -> str:
         """
-        Создает путь для конвертированного файла.
+        Создает имя конвертированного файла в файловом хранилище. Имя определяется UUID будущей записи
+        в таблице "mp3_files", поэтому файлы с одинаковыми именами не перезаписывают друг друга.
         """
 
-        directoty = await self._create_directory()
-        out_file = path.join(directoty, self.filename + ".mp3")
-        return out_file
+        return file_path_for(self.key)
+
+    async def _create_upload_filepath(self) -> str:
+        """
+        Создает путь, по которому будет сохранен файл фоновой задачи до его конвертации.
+        """
+
+        await ensure_directory(UPLOADS_ROOT)
+        return path.join(UPLOADS_ROOT, f"{uuid4()}.wav")
 
     def _generate_response(self, file_id) -> str:
         """
         Создает url адрес для скачивания файла.
         """
-        config: "Config" = self.app["config"]
-        port = config.app_config.port
-        base_url = config.app_config.base_url
-        url = f"{base_url}:{port}/files.record?record_id={file_id}&user_id={self.user_id}"
-        return url
+        return record_url(self.app, file_id, self.user_id)
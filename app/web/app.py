@@ -1,13 +1,25 @@
+from typing import Optional
+
 from aiohttp.web import Application
 from aiohttp_apispec import setup_aiohttp_apispec
 import aiohttp_cors
 
 from app.store.database.config import setup_database
+from app.store.storage.config import setup_storage
 from app.web.config import setup_config
 from app.web.logger import setup_logging
+from app.web.metrics import setup_metrics
+from app.web.timing import setup_timing
 from app.web.middlewares import setup_middlewares
 from app.web.routes import setup_routes
 from app.web.pool_executors import setup_process_pool_executors
+from app.wav_file.engine import setup_conversion_engine
+from app.mp3_files.jobs import setup_job_runner
+from app.mp3_files.writer import setup_mp3_file_writer
+from app.users.auth import setup_auth_cache
+from app.mp3_files.cache import setup_record_cache
+from app.mp3_files.variants import setup_variant_cache
+from app.mp3_files.uploads import setup_upload_manager
 
 
 def setup_cors(app: Application):
@@ -26,18 +38,21 @@ def setup_cors(app: Application):
     })
 
 
-def setup_app(config_path: str) -> Application:
+def setup_app(config_path: str, workers: Optional[int] = None) -> Application:
     """
     Создает экземпляр приложения и устанавливает ключевые
     элементы приложения (loger, database, routes, middleware, cors, config).
     Метод вызывается один раз в момент старта приложения.
+    workers - количество процессов веб-сервиса, если оно задано аргументом командной строки.
 
     Returns: Возвращает экземпляр приложения.
     """
 
     app = Application()
     setup_logging(app)
-    setup_config(app, config_path)
+    setup_config(app, config_path, workers)
+    setup_metrics(app)
+    setup_timing(app)
     setup_cors(app)
     setup_aiohttp_apispec(app, static_path='/swagger_static',
                           title='mp3-converter', url='/docs/json',
@@ -45,5 +60,13 @@ def setup_app(config_path: str) -> Application:
     setup_routes(app)
     setup_middlewares(app)
     setup_database(app)
+    setup_storage(app)
     setup_process_pool_executors(app)
+    setup_conversion_engine(app)
+    setup_job_runner(app)
+    setup_mp3_file_writer(app)
+    setup_auth_cache(app)
+    setup_record_cache(app)
+    setup_variant_cache(app)
+    setup_upload_manager(app)
     return app
@@ -1,14 +1,17 @@
-from typing import Any, TYPE_CHECKING
-from dataclasses import dataclass
+from typing import Any, Dict, Optional, TYPE_CHECKING
+from dataclasses import dataclass, field
 import multiprocessing
 
 import yaml
 
 from app.store.database.config import setup_config as setup_db_config
+from app.store.storage.config import setup_config as setup_storage_config
+from app.wav_file.profiles import EncodingProfile
 
 if TYPE_CHECKING:
     from app.web.app import Application
     from app.store.database.config import DatabaseConfig
+    from app.store.storage.config import StorageConfig
 
 
 @dataclass
@@ -20,11 +23,19 @@ class AppConfig:
         port: Порт.
         base_url: Базовый url адрес веб-приложения.
         max_workers: Количество CPUs.
+        server_timing: Добавлять к ответам заголовок Server-Timing с длительностью этапов обработки запроса.
+        timing_log: Писать в лог одну JSON строку с длительностью этапов на каждый запрос.
+        workers: Количество процессов веб-сервиса, принимающих соединения на одном порту (SO_REUSEPORT).
+        shutdown_timeout: Время ожидания завершения текущих запросов при остановке процесса в секундах.
     """
     host: str
     port: int
     base_url: str
     max_workers: int
+    server_timing: bool = True
+    timing_log: bool = True
+    workers: int = 1
+    shutdown_timeout: float = 60
 
 
 def setup_app_config(config_path: str) -> AppConfig:
@@ -35,6 +46,127 @@ def setup_app_config(config_path: str) -> AppConfig:
     return AppConfig(**raw_config["application"])
 
 
+@dataclass
+class ConverterConfig:
+    """
+    Класс, содержащий настройки конвертации файлов из формата WAV в формат mp3.
+    Args:
+        streaming: Передавать данные из сокета напрямую в stdin программы ffmpeg,
+        не сохраняя файл во временное хранилище.
+        max_concurrency: Максимальное количество одновременно работающих процессов ffmpeg в одном процессе
+        веб-сервиса. По умолчанию CPUs делятся поровну между процессами веб-сервиса (application.workers).
+        max_queue: Максимальное количество конвертаций, ожидающих свободного слота.
+        retry_after: Через сколько секунд клиенту следует повторить запрос, если очередь заполнена.
+        job_workers: Количество фоновых обработчиков задач на конвертацию.
+        dedup: Не конвертировать повторно файлы, которые уже были конвертированы с теми же параметрами.
+        segment_threshold: Размер PCM данных в байтах, начиная с которого файл кодируется
+        по частям параллельно в max_concurrency процессах ffmpeg.
+        batch_insert: Добавлять записи о конвертированных файлах в базу данных пакетами.
+        batch_insert_window: Время накопления пакета записей в секундах.
+        batch_insert_size: Максимальное количество записей в пакете.
+        user_weights: Веса пользователей в очереди конвертаций по идентификатору (по умолчанию 1).
+        Пользователь с весом 2 получает вдвое больше слотов ffmpeg, чем пользователь с весом 1.
+        Вес должен быть больше нуля.
+        aging: На сколько секунд записи уменьшается стоимость ожидающей конвертации за каждую секунду
+        ожидания. Не дает длинным файлам бесконечно пропускать вперед короткие.
+    """
+    streaming: bool = True
+    max_concurrency: int = 0
+    max_queue: int = 32
+    retry_after: int = 10
+    job_workers: int = 2
+    dedup: bool = True
+    segment_threshold: int = 256*1024*1024
+    batch_insert: bool = False
+    batch_insert_window: float = 0.005
+    batch_insert_size: int = 64
+    user_weights: Dict[int, float] = field(default_factory=dict)
+    aging: float = 60.0
+
+
+def setup_converter_config(config_path: str, workers: int = 1) -> ConverterConfig:
+    with open(config_path, "r") as f:
+        raw_config: dict[Any, Any] = yaml.safe_load(f)
+    converter_config = ConverterConfig(**(raw_config.get("converter") or {}))
+    if not converter_config.max_concurrency:
+        converter_config.max_concurrency = max(1, multiprocessing.cpu_count() // max(1, workers))
+    for user_id, weight in converter_config.user_weights.items():
+        # Стоимость конвертации делится на вес: нулевой вес ломает очередь, отрицательный ставит пользователя первым.
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+            raise ValueError(f"Weight of user {user_id} in converter.user_weights must be a positive number, "
+                             f"got {weight!r}")
+    return converter_config
+
+
+@dataclass
+class CacheConfig:
+    """
+    Класс, содержащий настройки кэшей в оперативной памяти.
+    Args:
+        auth_max_size: Максимальное количество пар (user_id, user_uuid) в кэше аутентификации.
+        auth_ttl: Время жизни найденной пары в секундах.
+        auth_negative_ttl: Время жизни ненайденной пары в секундах.
+        record_max_size: Максимальное количество записей в кэше данных mp3 файлов.
+        record_max_bytes: Максимальный объем памяти, занимаемый кэшем данных mp3 файлов, в байтах.
+        record_ttl: Время жизни записи в кэше данных mp3 файлов в секундах.
+    """
+    auth_max_size: int = 100000
+    auth_ttl: float = 300
+    auth_negative_ttl: float = 30
+    record_max_size: int = 100000
+    record_max_bytes: int = 64*1024*1024
+    record_ttl: float = 3600
+
+
+def setup_cache_config(config_path: str) -> CacheConfig:
+    with open(config_path, "r") as f:
+        raw_config: dict[Any, Any] = yaml.safe_load(f)
+    return CacheConfig(**(raw_config.get("cache") or {}))
+
+
+@dataclass
+class VariantsConfig:
+    """
+    Класс, содержащий настройки кэша mp3 файлов, перекодированных с другими параметрами (вариантов).
+    Args:
+        root: Директория, в которой хранятся варианты.
+        max_bytes: Максимальный суммарный размер вариантов на диске в байтах.
+        profiles: Профили кодирования по названию.
+    """
+    root: str = "./media/variants"
+    max_bytes: int = 1024*1024*1024
+    profiles: Dict[str, EncodingProfile] = field(default_factory=dict)
+
+
+def setup_variants_config(config_path: str) -> VariantsConfig:
+    with open(config_path, "r") as f:
+        raw_config: dict[Any, Any] = yaml.safe_load(f)
+    raw_variants = dict(raw_config.get("variants") or {})
+    profiles = {name: EncodingProfile(name=name, **params)
+                for name, params in (raw_variants.pop("profiles", None) or {}).items()}
+    return VariantsConfig(**raw_variants, profiles=profiles)
+
+
+@dataclass
+class UploadsConfig:
+    """
+    Класс, содержащий настройки загрузки файлов по частям (/uploads.create, /uploads.chunk, /uploads.finish).
+    Args:
+        max_size: Максимальный размер загружаемого файла в байтах.
+        ttl: Через сколько секунд после получения последней части удаляется незавершенная загрузка.
+        cleanup_interval: Интервал удаления истекших загрузок в секундах.
+    """
+    max_size: int = 4*1024*1024*1024
+    ttl: float = 86400
+    cleanup_interval: float = 600
+
+
+def setup_uploads_config(config_path: str) -> UploadsConfig:
+    with open(config_path, "r") as f:
+        raw_config: dict[Any, Any] = yaml.safe_load(f)
+    return UploadsConfig(**(raw_config.get("uploads") or {}))
+
+
 @dataclass
 class Config:
     """
@@ -42,16 +174,31 @@ class Config:
     """
     database: "DatabaseConfig"
     app_config: "AppConfig"
+    converter: "ConverterConfig"
+    cache: "CacheConfig"
+    storage: "StorageConfig"
+    variants: "VariantsConfig"
+    uploads: "UploadsConfig"
 
 
-def setup_config(app: "Application", config_path: str):
+def setup_config(app: "Application", config_path: str, workers: Optional[int] = None):
     """
     Конфигурирует приложения.
 
     Args:
         app (Application): Экземпляр класса Application
         config_path (str): Путь к конфигурационному файлу.
+        workers: Количество процессов веб-сервиса, если оно задано аргументом командной строки.
     """
     database_config = setup_db_config(config_path)
     app_config = setup_app_config(config_path)
-    app["config"] = Config(database=database_config, app_config=app_config)
+    if workers is not None:
+        app_config.workers = workers
+    converter_config = setup_converter_config(config_path, app_config.workers)
+    cache_config = setup_cache_config(config_path)
+    storage_config = setup_storage_config(config_path)
+    variants_config = setup_variants_config(config_path)
+    uploads_config = setup_uploads_config(config_path)
+    app["config"] = Config(database=database_config, app_config=app_config, converter=converter_config,
+                           cache=cache_config, storage=storage_config, variants=variants_config,
+                           uploads=uploads_config)
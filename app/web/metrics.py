@@ -0,0 +1,265 @@
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from aiohttp.web_middlewares import middleware
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application, Request
+
+
+# Границы корзин гистограмм по умолчанию (в секундах).
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Границы корзин для длительности загрузки и работы ffmpeg: файлы до 4 Гб передаются и кодируются минутами.
+LONG_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+# Границы корзин для размера загружаемых файлов (в байтах): от 64 Кб до 4 Гб.
+SIZE_BUCKETS = tuple(float(64 * 1024 * 4 ** i) for i in range(9))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _merge_labels(labels: str, const_labels: str) -> str:
+    if not const_labels:
+        return labels
+    if not labels:
+        return "{" + const_labels + "}"
+    return labels[:-1] + "," + const_labels + "}"
+
+
+class Metric:
+    """
+    Базовый класс метрики в формате Prometheus.
+
+    Args:
+        name: Имя метрики.
+        documentation: Описание метрики (строка HELP).
+        labelnames: Имена меток.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """
+        Возвращает значения метрики: (суффикс имени, метки, значение).
+        """
+        raise NotImplementedError
+
+    def render(self, const_labels: str = "") -> str:
+        """
+        Возвращает метрику в текстовом формате Prometheus. const_labels - метки, добавляемые ко всем значениям,
+        в формате 'name="value",...'.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{suffix}{_merge_labels(labels, const_labels)} {_format_value(value)}"
+                  for suffix, labels, value in self.samples()]
+        return "\n".join(lines)
+
+    def _key(self, values: Sequence[str]) -> Labels:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        return tuple(str(value) for value in values)
+
+
+class Counter(Metric):
+    """
+    Счетчик, значение которого только увеличивается.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        for key, value in self._values.items():
+            yield "_total", _format_labels(self.labelnames, key), value
+
+
+class Gauge(Metric):
+    """
+    Метрика, значение которой вычисляется функцией callback в момент запроса /metrics.
+    callback возвращает число для метрики без меток или словарь {метки: значение}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], object],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        value = self._callback()
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield "", _format_labels(self.labelnames, self._key(key)), item
+        else:
+            yield "", "", value  # type: ignore
+
+
+class Histogram(Metric):
+    """
+    Гистограмма. Хранит количество наблюдений в каждой корзине, их количество и сумму.
+
+    Args:
+        buckets: Верхние границы корзин в порядке возрастания.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: количество наблюдений по корзинам (последняя - +Inf) и их сумма.
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        names = self.labelnames + ("le",)
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", _format_labels(names, key + (_format_value(bound),)), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield "_count", labels, cumulative
+            yield "_sum", labels, self._sums[key]
+
+
+class Metrics:
+    """
+    Метрики сервиса, которые отдает конечная точка /metrics.
+    Гистограммы заполняются компонентами приложения, значения gauge-метрик вычисляются в момент запроса.
+    Метки const_labels добавляются ко всем метрикам: при нескольких процессах веб-сервиса метрики каждого
+    процесса отдаются с меткой worker, чтобы значения разных процессов не смешивались в одном ряду.
+    """
+
+    def __init__(self):
+        self.const_labels: Dict[str, str] = {}
+        self.request_seconds = Histogram("mp3_converter_http_request_duration_seconds",
+                                         "HTTP request latency by route.", ("method", "route", "status"))
+        self.upload_bytes = Histogram("mp3_converter_upload_size_bytes",
+                                      "Size of uploaded WAV files.", buckets=SIZE_BUCKETS)
+        self.upload_seconds = Histogram("mp3_converter_upload_duration_seconds",
+                                        "Time spent reading a WAV file from the socket.", buckets=LONG_BUCKETS)
+        self.ffmpeg_seconds = Histogram("mp3_converter_ffmpeg_duration_seconds",
+                                        "Wall time of ffmpeg processes.", buckets=LONG_BUCKETS)
+        self.ffmpeg_wait_seconds = Histogram("mp3_converter_ffmpeg_queue_duration_seconds",
+                                             "Time conversions waited for a free ffmpeg slot.",
+                                             buckets=LONG_BUCKETS)
+        self.ffmpeg_exits = Counter("mp3_converter_ffmpeg_exits", "Finished ffmpeg processes by exit code.",
+                                    ("code",))
+        self.db_query_seconds = Histogram("mp3_converter_db_query_duration_seconds",
+                                          "Duration of database model methods.", ("method",))
+        self._metrics: List[Metric] = [self.request_seconds, self.upload_bytes, self.upload_seconds,
+                                       self.ffmpeg_seconds, self.ffmpeg_wait_seconds, self.ffmpeg_exits,
+                                       self.db_query_seconds]
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], object],
+              labelnames: Sequence[str] = ()) -> Gauge:
+        """
+        Регистрирует gauge-метрику.
+        """
+        gauge = Gauge(name, documentation, callback, labelnames)
+        self._metrics.append(gauge)
+        return gauge
+
+    def render(self) -> str:
+        """
+        Возвращает метрики в текстовом формате Prometheus (version 0.0.4).
+        """
+        const_labels = _format_labels(tuple(self.const_labels), tuple(self.const_labels.values()))[1:-1]
+        return "\n".join(metric.render(const_labels) for metric in self._metrics) + "\n"
+
+
+def route_name(request: "Request") -> str:
+    """
+    Возвращает шаблон маршрута запроса. Для запросов, не найденных в маршрутах, возвращается "unmatched",
+    чтобы количество значений метки не зависело от присланных клиентами url адресов.
+    """
+    route = request.match_info.route
+    if route.resource is None:
+        return "unmatched"
+    return route.resource.canonical
+
+
+@middleware
+async def metrics_middleware(request: "Request", handler):
+    """
+    Промежуточное ПО, измеряющее время обработки запроса. Должно быть первым в списке,
+    чтобы учитывать ответы, сформированные error_handling_middleware.
+    """
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    finally:
+        metrics: Optional[Metrics] = request.app.get("metrics")
+        if metrics is not None:
+            metrics.request_seconds.observe(time.perf_counter() - start, request.method, route_name(request),
+                                            str(status))
+
+
+def setup_metrics(app: "Application"):
+    """
+    Устанавливает метрики (app["metrics"]) и gauge-метрики состояния пула потоков, ConversionEngine,
+    очереди фоновых задач и пула соединений с базой данных. Компоненты берутся из app в момент запроса
+    /metrics, поэтому функцию можно вызывать до их установки.
+    """
+    metrics = Metrics()
+    app["metrics"] = metrics
+    metrics.gauge("mp3_converter_executor_busy_threads", "Threads of the executor running a task.",
+                  lambda: app["executor"].busy)
+    metrics.gauge("mp3_converter_conversions_in_flight", "Running ffmpeg processes.",
+                  lambda: app["conversion_engine"].running)
+    metrics.gauge("mp3_converter_queue_depth", "Conversions waiting for a free slot or a job worker.",
+                  lambda: {("engine",): app["conversion_engine"].waiting,
+                           ("jobs",): app["job_runner"].pending},
+                  ("queue",))
+    metrics.gauge("mp3_converter_variant_cache_bytes", "Disk space used by encoded profile variants.",
+                  lambda: app["variant_cache"].total_bytes)
+    metrics.gauge("mp3_converter_db_pool_connections", "Database pool connections.",
+                  lambda: {("checked_out",): app["database"].stats.checked_out,
+                           ("capacity",): app["database"].stats.capacity},
+                  ("state",))
@@ -1,10 +1,17 @@
+import asyncio
 import json
+import select
 from typing import TYPE_CHECKING, Dict, Any, Optional
 
+from aiohttp import hdrs
+from aiohttp.web import Response
 from aiohttp.web_exceptions import HTTPUnprocessableEntity, HTTPException
 from aiohttp.web_middlewares import middleware
 from aiohttp_apispec import validation_middleware
+from sqlalchemy import exc
 
+from app.web.metrics import metrics_middleware
+from app.web.timing import timing_middleware
 from app.web.utils import error_json_response
 
 if TYPE_CHECKING:
@@ -17,9 +24,19 @@ HTTP_ERROR_CODES = {
     404: "not_found",
     405: "not_implemented",
     409: "conflict",
+    413: "request_entity_too_large",
+    429: "too_many_requests",
     500: "internal_server_error",
+    503: "service_unavailable",
 }
 
+# Код ответа для запроса, клиент которого отключился до его завершения (как в nginx).
+CLIENT_CLOSED_REQUEST = 499
+# Интервал проверки соединения с клиентом в секундах.
+DISCONNECT_CHECK_INTERVAL = 0.5
+# События poll, которыми ядро сообщает о закрытии соединения клиентом (POLLRDHUP есть только в Linux).
+PEER_CLOSED_EVENTS = getattr(select, "POLLRDHUP", 0)
+
 
 @middleware
 async def error_handling_middleware(request: "Request", handler):
@@ -41,16 +58,71 @@ async def error_handling_middleware(request: "Request", handler):
             data=data,
         )
     except HTTPException as e:
+        headers = {}
+        if hdrs.RETRY_AFTER in e.headers:
+            headers[hdrs.RETRY_AFTER] = e.headers[hdrs.RETRY_AFTER]
         return error_json_response(
             http_status=e.status,
-            status=HTTP_ERROR_CODES[e.status],
-            message=e.reason)
+            status=HTTP_ERROR_CODES.get(e.status, "error"),
+            message=e.reason,
+            headers=headers)
+    except exc.TimeoutError as e:
+        # Все соединения пула заняты дольше pool_timeout: клиенту следует повторить запрос позже.
+        request.app.logger.warning("Database pool exhausted: %s", e)
+        return error_json_response(
+            http_status=503,
+            status=HTTP_ERROR_CODES[503],
+            message="Database is overloaded",
+            headers={hdrs.RETRY_AFTER: "1"})
     except Exception as e:
         request.app.logger.error("Exception", exc_info=e)
         return error_json_response(
             http_status=500, status="internal server error", message="internal server error")
 
 
+@middleware
+async def disconnect_middleware(request: "Request", handler):
+    """
+    Промежуточное ПО, отменяющее обработку запроса, если клиент отключился.
+    aiohttp 3.8 не отменяет обработчик при разрыве соединения, поэтому без него конвертация файла,
+    результат которой уже некому получить, продолжалась бы до конца. При отмене процессы ffmpeg завершаются,
+    а временные и незавершенные файлы удаляются (см. ConversionEngine.execute и WavFile).
+    Возвращенный ответ с кодом 499 не отправляется клиенту и учитывается только в метриках и логе.
+    """
+    task = asyncio.ensure_future(handler(request))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_CHECK_INTERVAL)
+            if done:
+                if isinstance(task.exception(), ConnectionResetError) and _client_disconnected(request):
+                    # Соединение разорвано во время чтения тела запроса.
+                    return Response(status=CLIENT_CLOSED_REQUEST)
+                return task.result()
+            if _client_disconnected(request):
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return Response(status=CLIENT_CLOSED_REQUEST)
+    except asyncio.CancelledError:
+        # Обработчик отменен при остановке приложения по истечении shutdown_timeout.
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+def _client_disconnected(request: "Request") -> bool:
+    transport = request.transport
+    if transport is None or transport.is_closing():
+        return True
+    # Пока чтение из сокета приостановлено (ffmpeg не успевает забирать данные), цикл событий
+    # не узнает о закрытии соединения, поэтому состояние сокета проверяется напрямую.
+    sock = transport.get_extra_info("socket")
+    if sock is None or not PEER_CLOSED_EVENTS:
+        return False
+    poller = select.poll()
+    poller.register(sock.fileno(), PEER_CLOSED_EVENTS)
+    return bool(poller.poll(0))
+
+
 def setup_middlewares(app: "Application"):
     """
     Устанавливает промежуточное программное обеспечение.
@@ -58,5 +130,8 @@ def setup_middlewares(app: "Application"):
     Args:
         app (Application): Экземпляр класса Application.
     """
+    app.middlewares.append(metrics_middleware)
+    app.middlewares.append(timing_middleware)
     app.middlewares.append(error_handling_middleware)
+    app.middlewares.append(disconnect_middleware)
     app.middlewares.append(validation_middleware)
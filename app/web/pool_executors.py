@@ -1,5 +1,6 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import TYPE_CHECKING
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, TYPE_CHECKING
 
 
 if TYPE_CHECKING:
@@ -7,10 +8,33 @@ if TYPE_CHECKING:
     from aiohttp.web import Application
 
 
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Пул потоков, который считает количество потоков, выполняющих задачу в данный момент.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.busy = 0
+        self._busy_lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return super().submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._busy_lock:
+            self.busy += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._busy_lock:
+                self.busy -= 1
+
+
 def setup_process_pool_executors(app: "Application"):
     """
     Устанавливает пул потоков для текущего экземпляра приложения.
     """
     config: "Config" = app["config"]
-    executor = ThreadPoolExecutor(max_workers=config.app_config.max_workers)
+    executor = InstrumentedThreadPoolExecutor(max_workers=config.app_config.max_workers)
     app["executor"] = executor
@@ -2,6 +2,7 @@ from typing import TYPE_CHECKING
 
 from app.users.routes import setup_routes as user_setup_routes
 from app.mp3_files.routes import setup_routes as file_setup_routes
+from app.service.routes import setup_routes as service_setup_routes
 
 
 if TYPE_CHECKING:
@@ -17,3 +18,4 @@ def setup_routes(app: "Application"):
     """
     user_setup_routes(app)
     file_setup_routes(app)
+    service_setup_routes(app)
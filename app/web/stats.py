@@ -0,0 +1,87 @@
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, TYPE_CHECKING, TypeVar
+
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application
+
+
+@dataclass
+class CacheStats:
+    """
+    Класс, содержащий счетчики попаданий и промахов кэша.
+    Args:
+        hits: Количество попаданий.
+        misses: Количество промахов.
+    """
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["hit_rate"] = round(self.hit_rate, 4)
+        return data
+
+
+@dataclass
+class DedupStats(CacheStats):
+    """
+    Счетчики кэша конвертированных файлов.
+    Args:
+        saved_bytes: Количество байт исходных файлов, которые не пришлось конвертировать повторно.
+    """
+    saved_bytes: int = 0
+
+
+@dataclass
+class PoolStats:
+    """
+    Счетчики пула соединений с базой данных.
+    Args:
+        checkouts: Количество выданных пулом соединений.
+        timeouts: Количество запросов соединения, завершившихся по таймауту.
+        wait_time: Суммарное время ожидания соединения в секундах, включая установку новых соединений.
+        max_wait: Максимальное время ожидания соединения в секундах.
+        capacity: Максимальное количество соединений (pool_size + max_overflow).
+        checked_out: Количество соединений, используемых в данный момент.
+        peak_checked_out: Максимальное количество одновременно используемых соединений.
+    """
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+    capacity: int = 0
+    checked_out: int = 0
+    peak_checked_out: int = 0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_time / self.checkouts if self.checkouts else 0.0
+
+    @property
+    def saturation(self) -> float:
+        return self.checked_out / self.capacity if self.capacity else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["wait_time"] = round(self.wait_time, 6)
+        data["max_wait"] = round(self.max_wait, 6)
+        data["avg_wait"] = round(self.avg_wait, 6)
+        data["saturation"] = round(self.saturation, 4)
+        return data
+
+
+S = TypeVar("S", CacheStats, PoolStats)
+
+
+def register_stats(app: "Application", name: str, stats: S) -> S:
+    """
+    Регистрирует счетчики, которые отдает конечная точка /service.stats.
+    """
+    app.setdefault("stats", {})[name] = stats
+    return stats
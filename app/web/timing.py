@@ -0,0 +1,127 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, TYPE_CHECKING
+
+from aiohttp.web_middlewares import middleware
+
+from app.web.metrics import route_name
+
+if TYPE_CHECKING:
+    from aiohttp.web import Application, Request, StreamResponse
+    from app.web.config import Config
+
+
+SERVER_TIMING = "Server-Timing"
+# Логгер, который пишет одну JSON строку на запрос.
+logger = logging.getLogger("app.timing")
+
+_current: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Класс, накапливающий длительность этапов обработки одного запроса (чтение из сокета, ffmpeg,
+    запросы к базе данных и т.д.). Если этап выполнялся несколько раз (например, несколько запросов
+    к базе данных или параллельные процессы ffmpeg), длительности суммируются.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """
+        Возвращает значение заголовка Server-Timing. Длительности указываются в миллисекундах.
+        """
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def record_phase(name: str, seconds: float) -> None:
+    """
+    Добавляет длительность этапа к текущему запросу. Вне запроса (фоновые задачи, CLI) ничего не делает.
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Контекстный менеджер, измеряющий длительность этапа текущего запроса.
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+@middleware
+async def timing_middleware(request: "Request", handler):
+    """
+    Промежуточное ПО, которое создает RequestTiming для запроса и после его обработки пишет
+    в лог app.timing одну JSON строку с длительностью запроса и его этапов.
+    RequestTiming хранится в contextvars, поэтому задачи, созданные обработчиком, пишут в тот же объект.
+    """
+    timing = RequestTiming()
+    token = _current.set(timing)
+    request["timing"] = timing
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    finally:
+        _current.reset(token)
+        if request.app["config"].app_config.timing_log:
+            logger.info(json.dumps({
+                "method": request.method,
+                "route": route_name(request),
+                "path": request.path,
+                "status": status,
+                "duration_ms": round(timing.elapsed() * 1000, 1),
+                "phases": {name: round(seconds * 1000, 1) for name, seconds in timing.phases.items()},
+            }))
+
+
+async def add_server_timing(request: "Request", response: "StreamResponse") -> None:
+    """
+    Добавляет заголовок Server-Timing перед отправкой заголовков ответа (сигнал on_response_prepare),
+    поэтому заголовок есть и у потоковых ответов. Этапы, выполняемые после отправки заголовков
+    (например, передача файла), в заголовок не попадают, но есть в JSON строке лога.
+    """
+    timing: Optional[RequestTiming] = request.get("timing")
+    if timing is not None:
+        response.headers[SERVER_TIMING] = timing.server_timing()
+
+
+def setup_timing(app: "Application"):
+    """
+    Включает заголовок Server-Timing и JSON лог запросов в соответствии с настройками application.
+    JSON строки пишутся в stderr без префикса уровня логирования.
+    """
+    config: "Config" = app["config"]
+    if config.app_config.server_timing:
+        app.on_response_prepare.append(add_server_timing)
+    if config.app_config.timing_log and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
@@ -3,25 +3,29 @@ from typing import Any, Optional, TYPE_CHECKING
 
 from aiohttp.web import json_response as aiohttp_json_response
 from aiohttp.web_response import Response
-import aiofiles
 
 
 if TYPE_CHECKING:
+    from uuid import UUID
+    from aiohttp.web import Application
     from marshmallow import Schema
+    from app.web.config import Config
 
 
-def json_response(schema: "Schema", data: Optional[dict[Any, Any]] = None) -> Response:
+def json_response(schema: "Schema", data: Optional[dict[Any, Any]] = None, http_status: int = 200) -> Response:
     """
     Создает ответ в формате "application/json" для клиента на успешный get или post запросы.
 
     Args:
         schema (Schema): Класс schema, представляющий ответ на запрос от клиента.
         data (Optional[dict[Any, Any]], optional): Словарь, содержащий данные ответа на запрос клиента.
+        http_status (int, optional): Код ответа.
 
     Returns:
         Response: Возвращает экземпляр класса aiohttp.web_response.Response.
     """
     return Response(
+        status=http_status,
         body=schema.dumps(data),
         headers={
             "Content-Type": "application/json",
@@ -34,6 +38,7 @@ def error_json_response(
     status: str,
     message: Optional[str] = None,
     data: Optional[dict] = None,
+    headers: Optional[dict] = None,
 ) -> Response:
     """
     Создает ответ в формате "application/json" для клиента на неуспешный get или post запросы.
@@ -44,6 +49,7 @@ def error_json_response(
         message (Optional[str], optional): Подробное описание ошибки. Почему она произошла.
         data (Optional[dict], optional): Словарь, содержащий в качестве ключа название переданного поля,
         а значением является описание ошибки для данного поля.
+        headers (Optional[dict], optional): Дополнительные заголовки ответа (например, Retry-After).
 
     Returns:
         _type_: Возвращает экземпляр класса aiohttp.web_response.Response.
@@ -52,22 +58,35 @@ def error_json_response(
         data = {}
     return aiohttp_json_response(
         status=http_status,
+        headers=headers,
         data={"code": http_status, "status": status, "message": message, "data": data},
     )
 
 
-async def file_sender(file_name: str):
+def base_url(app: "Application") -> str:
+    """
+    Возвращает базовый url адрес веб-приложения вида http://host:port.
     """
-    Асинхронный генератор для чтения данных из файлов частями.
+    config: "Config" = app["config"]
+    return f"{config.app_config.base_url}:{config.app_config.port}"
 
-    Args:
-        file_name (str): Путь к файлу.
 
-    Yields:
-        _type_: Возвращает прочитанные байты.
+def record_url(app: "Application", record_id: int, user_id: int) -> str:
+    """
+    Создает url адрес для скачивания mp3 файла.
+    """
+    return f"{base_url(app)}/files.record?record_id={record_id}&user_id={user_id}"
+
+
+def job_status_url(app: "Application", job_id: int, user_id: int) -> str:
+    """
+    Создает url адрес для получения статуса фоновой задачи на конвертацию.
+    """
+    return f"{base_url(app)}/files.status?job_id={job_id}&user_id={user_id}"
+
+
+def upload_url(app: "Application", upload_id: "UUID", user_id: int, endpoint: str = "chunk") -> str:
+    """
+    Создает url адрес конечной точки /uploads.chunk (или /uploads.<endpoint>) для загрузки файла по частям.
     """
-    async with aiofiles.open(file_name, mode='rb') as f:
-        chunk = await f.read(5*1024*1024)
-        while chunk:
-            yield chunk
-            chunk = await f.read(5*1024*1024)
+    return f"{base_url(app)}/uploads.{endpoint}?upload_id={upload_id}&user_id={user_id}"
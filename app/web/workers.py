@@ -0,0 +1,202 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from multiprocessing.context import SpawnProcess
+    from multiprocessing.synchronize import Event
+
+
+logger = logging.getLogger(__name__)
+
+# Время ожидания запуска нового процесса в секундах.
+STARTUP_TIMEOUT = 60
+
+
+@dataclass
+class WorkerInfo:
+    """
+    Класс, содержащий данные процесса-обработчика. Хранится в app["worker"].
+    Args:
+        index: Номер процесса среди процессов одного поколения.
+        generation: Номер поколения процессов. Увеличивается при каждом перезапуске (SIGHUP).
+        recovers_jobs: Восстанавливать ли фоновые задачи, прерванные остановкой приложения. Это делает только
+            первый процесс при запуске пула: при перезапуске (SIGHUP) задачи старого поколения еще выполняются,
+            а при замене аварийно завершившегося процесса их выполняют остальные процессы.
+    """
+    index: int
+    generation: int
+    recovers_jobs: bool = False
+
+
+def run_worker(config_path: str, host: str, port: int, shutdown_timeout: float, workers: int, info: WorkerInfo,
+               ready: "Event") -> None:
+    """
+    Точка входа процесса-обработчика. Приложение (и пул соединений с базой данных) создается в самом процессе.
+    Сокет открывается с SO_REUSEPORT, поэтому ядро распределяет входящие соединения между процессами.
+    """
+    from aiohttp.web import run_app
+    from app.web.app import setup_app
+
+    # Количество процессов нужно до создания приложения: по нему делятся CPUs между процессами ffmpeg.
+    app = setup_app(config_path, workers)
+    app["worker"] = info
+    app["metrics"].const_labels["worker"] = str(info.index)
+    app["config"].app_config.shutdown_timeout = shutdown_timeout
+    # run_app вызывает print после запуска сайта: в этот момент процесс уже принимает соединения.
+    run_app(app, host=host, port=port, reuse_port=True, shutdown_timeout=shutdown_timeout,
+            print=lambda *_: ready.set())
+
+
+class WorkerPool:
+    """
+    Главный процесс, запускающий workers процессов-обработчиков и следящий за ними.
+    Сигналы:
+        SIGTERM, SIGINT - остановить процессы (каждый процесс дожидается завершения текущих запросов
+        не дольше shutdown_timeout секунд) и завершиться.
+        SIGHUP - плавный перезапуск: запускается новое поколение процессов (с новым кодом и настройками),
+        и только после того, как оно начало принимать соединения, останавливается старое.
+    Процесс, завершившийся без команды, перезапускается.
+
+    Args:
+        config_path: Путь к конфигурационному файлу.
+        workers: Количество процессов.
+        host: Хост.
+        port: Порт.
+        shutdown_timeout: Время ожидания завершения текущих запросов при остановке процесса в секундах.
+    """
+
+    def __init__(self, config_path: str, workers: int, host: str, port: int, shutdown_timeout: float):
+        self.config_path = config_path
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.shutdown_timeout = shutdown_timeout
+        # spawn: новые процессы импортируют код заново, поэтому перезапуск применяет изменения кода.
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional["SpawnProcess"]] = []
+        self._generation = -1
+        self._stopping = False
+        self._reloading = False
+
+    def run(self) -> int:
+        """
+        Запускает процессы и следит за ними до получения SIGTERM или SIGINT.
+
+        Returns:
+            Код завершения главного процесса.
+        """
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        processes = self._start_generation(recover_jobs=True)
+        if processes is None:
+            return 1
+        self._processes = processes
+        while not self._stopping:
+            if self._reloading:
+                self._reloading = False
+                self._reload()
+            self._respawn()
+            time.sleep(0.5)
+        self._stop(self._processes)
+        return 0
+
+    def _on_stop(self, *_) -> None:
+        self._stopping = True
+
+    def _on_reload(self, *_) -> None:
+        self._reloading = True
+
+    def _start(self, index: int, recover_jobs: bool = False) -> Optional["SpawnProcess"]:
+        """
+        Запускает процесс и ожидает, пока он начнет принимать соединения.
+        recover_jobs передается только первому процессу при запуске пула (см. WorkerInfo.recovers_jobs).
+
+        Returns:
+            Процесс или None, если он не запустился.
+        """
+        ready = self._context.Event()
+        info = WorkerInfo(index=index, generation=self._generation, recovers_jobs=recover_jobs)
+        process = self._context.Process(target=run_worker, name=f"mp3-converter-worker-{index}",
+                                        args=(self.config_path, self.host, self.port, self.shutdown_timeout,
+                                              self.workers, info, ready))
+        process.start()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while not ready.wait(0.1):
+            if not process.is_alive() or time.monotonic() > deadline or self._stopping:
+                logger.error("Worker %s failed to start (exit code %s)", index, process.exitcode)
+                self._stop([process])
+                return None
+        logger.info("Worker %s (pid %s, generation %s) started", index, process.pid, self._generation)
+        return process
+
+    def _start_generation(self, recover_jobs: bool = False) -> Optional[List[Optional["SpawnProcess"]]]:
+        """
+        Запускает новое поколение процессов. Если хотя бы один процесс не запустился, останавливает остальные.
+        """
+        self._generation += 1
+        processes: List[Optional["SpawnProcess"]] = []
+        for index in range(self.workers):
+            process = self._start(index, recover_jobs=recover_jobs and index == 0)
+            if process is None:
+                self._stop(processes)
+                return None
+            processes.append(process)
+        return processes
+
+    def _reload(self) -> None:
+        """
+        Плавный перезапуск. Если новое поколение не запустилось, продолжает работать старое.
+        """
+        logger.info("Reloading workers")
+        processes = self._start_generation()
+        if processes is None:
+            logger.error("Reload failed, keeping the previous workers")
+            return
+        old, self._processes = self._processes, processes
+        self._stop(old)
+
+    def _respawn(self) -> None:
+        """
+        Перезапускает процессы, завершившиеся без команды главного процесса.
+        """
+        for index, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.error("Worker %s (pid %s) exited with code %s, restarting", index, process.pid,
+                             process.exitcode)
+            self._processes[index] = self._start(index)
+
+    def _stop(self, processes: List[Optional["SpawnProcess"]]) -> None:
+        """
+        Отправляет процессам SIGTERM и ожидает их завершения. Процессы, не завершившиеся
+        за shutdown_timeout секунд (с запасом на остановку приложения), завершаются принудительно.
+        """
+        alive = [process for process in processes if process is not None and process.is_alive()]
+        for process in alive:
+            os.kill(process.pid, signal.SIGTERM)  # type: ignore
+        deadline = time.monotonic() + self.shutdown_timeout + 10
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error("Worker pid %s did not stop in time, killing", process.pid)
+                process.kill()
+                process.join()
+
+
+def serve(config_path: str, workers: int, host: str, port: int, shutdown_timeout: float) -> int:
+    """
+    Запускает веб-сервис. При workers > 1 запускается WorkerPool, иначе приложение работает в текущем процессе.
+    """
+    if workers <= 1:
+        run_worker(config_path, host, port, shutdown_timeout, 1, WorkerInfo(index=0, generation=0, recovers_jobs=True),
+                   multiprocessing.Event())
+        return 0
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    return WorkerPool(config_path, workers, host, port, shutdown_timeout).run()
@@ -0,0 +1,351 @@
+"""
+Нагрузочный тест веб-сервиса. Запускает приложение в текущем процессе (как app/main.py, с той же
+базой данных из конфигурационного файла), создает синтетические WAV файлы и выполняет сценарии
+/users.create, /files.convert и /files.record с заданным количеством одновременных запросов.
+Для каждого сценария выводятся пропускная способность, задержки p50/p95/p99, процессорное время
+(приложения и дочерних процессов ffmpeg) и пиковый объем памяти.
+
+Запуск (из корня проекта, база данных должна быть доступна и мигрирована):
+    python -m benchmarks.run [--requests 200] [--concurrency 16] [--wav-seconds 10] [--output result.json]
+    python -m benchmarks.run --compare baseline.json  # сравнить с результатом другого коммита
+
+Параметры, версия кода (git commit) и результаты сохраняются в JSON, поэтому запуски на разных
+коммитах можно сравнивать. Клиент работает в том же процессе и событийном цикле, что и приложение,
+и его процессорное время входит в результат; при сравнении коммитов это постоянная составляющая.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from os import path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.synthetic import write_wav
+
+
+SCENARIOS = ("users.create", "files.convert", "files.record")
+ROOT = path.dirname(path.dirname(path.realpath(__file__)))
+
+
+@dataclass
+class ScenarioResult:
+    """
+    Результат одного сценария.
+    Args:
+        requests: Количество выполненных запросов.
+        concurrency: Количество одновременных запросов.
+        wall_time: Длительность сценария в секундах.
+        throughput: Количество запросов в секунду.
+        p50, p95, p99, max: Задержки запросов в миллисекундах.
+        cpu_time: Процессорное время текущего процесса (user + system) в секундах.
+        children_cpu_time: Процессорное время завершившихся дочерних процессов (ffmpeg) в секундах.
+        peak_rss: Пиковый объем памяти текущего процесса в Мб за время сценария.
+        statuses: Количество ответов по кодам статуса.
+    """
+    requests: int
+    concurrency: int
+    wall_time: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    cpu_time: float
+    children_cpu_time: float
+    peak_rss: float
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class BenchmarkState:
+    """
+    Данные, которые сценарии передают друг другу: созданные пользователи и конвертированные файлы.
+    """
+    users: List[Tuple[int, str]] = field(default_factory=list)
+    records: List[Tuple[int, int]] = field(default_factory=list)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Возвращает перцентиль q (0..100) методом ближайшего ранга.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сбрасывает пиковый объем памяти процесса (VmHWM). Поддерживается только в Linux.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> float:
+    """
+    Возвращает пиковый объем памяти процесса в Мб.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux указывается в Кб, в macOS - в байтах.
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+async def drive(requests: int, concurrency: int,
+                send: Callable[[int], Awaitable[int]]) -> Tuple[List[float], Counter]:
+    """
+    Выполняет requests запросов, не больше concurrency одновременно.
+    send(index) отправляет запрос и возвращает код статуса ответа.
+
+    Returns:
+        Задержки запросов в миллисекундах и количество ответов по кодам статуса.
+    """
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                status = str(await send(index))
+            except aiohttp.ClientError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] += 1
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    return latencies, statuses
+
+
+class Benchmark:
+    """
+    Класс, выполняющий сценарии нагрузочного теста.
+
+    Args:
+        session: Клиентская сессия aiohttp.
+        base_url: Адрес веб-сервиса.
+        wav_path: Путь к синтетическому WAV файлу.
+        args: Параметры командной строки.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, wav_path: str, args: argparse.Namespace):
+        self.session = session
+        self.base_url = base_url
+        self.wav_path = wav_path
+        self.args = args
+        self.state = BenchmarkState()
+        self.run_id = uuid4().hex[:8]
+
+    async def run(self, scenario: str) -> ScenarioResult:
+        send = {
+            "users.create": self._create_user,
+            "files.convert": self._convert_file,
+            "files.record": self._download_file,
+        }[scenario]
+        await self._prepare(scenario)
+        reset_peak_rss()
+        times = os.times()
+        start = time.perf_counter()
+        latencies, statuses = await drive(self.args.requests, self.args.concurrency, send)
+        wall_time = time.perf_counter() - start
+        after = os.times()
+        return ScenarioResult(
+            requests=len(latencies),
+            concurrency=self.args.concurrency,
+            wall_time=round(wall_time, 3),
+            throughput=round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+            p50=round(percentile(latencies, 50), 2),
+            p95=round(percentile(latencies, 95), 2),
+            p99=round(percentile(latencies, 99), 2),
+            max=round(max(latencies, default=0.0), 2),
+            cpu_time=round(after.user + after.system - times.user - times.system, 3),
+            children_cpu_time=round(max(0.0, after.children_user + after.children_system
+                                        - times.children_user - times.children_system), 3),
+            peak_rss=round(peak_rss(), 1),
+            statuses=dict(statuses),
+        )
+
+    async def _prepare(self, scenario: str) -> None:
+        """
+        Создает данные, необходимые сценарию, если предыдущие сценарии их не создали.
+        Подготовка не входит в замер.
+        """
+        if scenario == "users.create":
+            return
+        if not self.state.users:
+            await self._create_user(0)
+        if scenario == "files.record" and not self.state.records and self.state.users:
+            await self._convert_file(0)
+        if not self.state.users or (scenario == "files.record" and not self.state.records):
+            raise RuntimeError(f"Failed to prepare data for scenario {scenario}")
+
+    async def _create_user(self, index: int) -> int:
+        async with self.session.post(f"{self.base_url}/users.create",
+                                     json={"username": f"bench-{self.run_id}-{index}"}) as response:
+            body = await response.read()
+            if response.status == 200:
+                data = json.loads(body)["data"]
+                self.state.users.append((data["id"], data["uuid"]))
+            return response.status
+
+    async def _convert_file(self, index: int) -> int:
+        user_id, user_uuid = self.state.users[index % len(self.state.users)]
+        with open(self.wav_path, "rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("file", f, filename="bench.wav", content_type="audio/wav")
+            async with self.session.post(f"{self.base_url}/files.convert", data=form,
+                                         headers={"user_id": str(user_id), "user_uuid": user_uuid}) as response:
+                body = await response.read()
+        if response.status == 200:
+            query = dict(item.split("=", 1) for item in urlsplit(json.loads(body)["url"]).query.split("&"))
+            self.state.records.append((int(query["user_id"]), int(query["record_id"])))
+        return response.status
+
+    async def _download_file(self, index: int) -> int:
+        user_id, record_id = self.state.records[index % len(self.state.records)]
+        async with self.session.get(f"{self.base_url}/files.record",
+                                    params={"user_id": user_id, "record_id": record_id}) as response:
+            async for _ in response.content.iter_chunked(256 * 1024):
+                pass
+            return response.status
+
+
+async def start_app(config_path: str) -> Tuple[web.AppRunner, str]:
+    """
+    Запускает приложение в текущем процессе на свободном порту 127.0.0.1.
+    """
+    from app.web.app import setup_app
+
+    runner = web.AppRunner(setup_app(config_path), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: Dict[str, ScenarioResult]) -> None:
+    print(f"{'scenario':<15}{'req':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'cpu s':>9}{'ffmpeg s':>10}{'rss Mb':>9}  statuses")
+    for name, result in results.items():
+        print(f"{name:<15}{result.requests:>7}{result.throughput:>10.1f}{result.p50:>10.1f}{result.p95:>10.1f}"
+              f"{result.p99:>10.1f}{result.cpu_time:>9.2f}{result.children_cpu_time:>10.2f}{result.peak_rss:>9.1f}"
+              f"  {result.statuses}")
+
+
+def print_comparison(results: Dict[str, ScenarioResult], baseline: Dict[str, Any]) -> None:
+    """
+    Выводит изменение показателей относительно baseline в процентах.
+    Положительное изменение rps и отрицательное изменение задержек означают улучшение.
+    """
+    print(f"\ncompared with {baseline.get('commit') or 'baseline'}:")
+    for name, result in results.items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ("throughput", "p50", "p95", "p99", "cpu_time", "peak_rss"):
+            before, after = old[key], getattr(result, key)
+            if before:
+                changes.append(f"{key} {(after - before) / before * 100:+.1f}%")
+        print(f"{name:<15}" + ", ".join(changes))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Load benchmark for the mp3 converter web service.")
+    parser.add_argument("--config", default=path.join(ROOT, "app", "config.yml"))
+    parser.add_argument("--url", help="Benchmark an already running service instead of an in-process app.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run (may be repeated). All scenarios by default.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--wav-seconds", type=float, default=10, help="Duration of the synthetic WAV file.")
+    parser.add_argument("--wav-rate", type=int, default=44100)
+    parser.add_argument("--wav-channels", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to a JSON file.")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        wav_path = path.join(directory, "bench.wav")
+        wav_size = write_wav(wav_path, args.wav_seconds, args.wav_rate, args.wav_channels, args.seed)
+        runner = None
+        base_url = args.url
+        if base_url is None:
+            runner, base_url = await start_app(args.config)
+        results: Dict[str, ScenarioResult] = {}
+        try:
+            connector = aiohttp.TCPConnector(limit=args.concurrency)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                benchmark = Benchmark(session, base_url.rstrip("/"), wav_path, args)
+                for scenario in args.scenario or SCENARIOS:
+                    results[scenario] = await benchmark.run(scenario)
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+
+    print_results(results)
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "in_process": args.url is None,
+        "params": {"requests": args.requests, "concurrency": args.concurrency, "wav_seconds": args.wav_seconds,
+                   "wav_rate": args.wav_rate, "wav_channels": args.wav_channels, "wav_size": wav_size,
+                   "seed": args.seed},
+        "scenarios": {name: asdict(result) for name, result in results.items()},
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != report["params"]:
+            print("warning: baseline was run with different parameters", file=sys.stderr)
+        print_comparison(results, baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
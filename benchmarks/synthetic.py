@@ -0,0 +1,35 @@
+import math
+import random
+import struct
+from os import path
+
+
+def write_wav(file_path: str, seconds: float, sample_rate: int = 44100, channels: int = 2, seed: int = 0) -> int:
+    """
+    Записывает синтетический WAV файл (PCM, 16 бит): синусоида 440 Гц с детерминированным шумом.
+    Содержимое зависит только от параметров и seed, поэтому результаты замеров на разных коммитах сравнимы.
+    Файл пишется блоками по одной секунде, поэтому можно создавать файлы размером в несколько гигабайт.
+
+    Returns:
+        Размер файла в байтах.
+    """
+    frames = int(seconds * sample_rate)
+    block_size = channels * 2
+    data_size = frames * block_size
+    rng = random.Random(seed)
+    # Одна секунда сигнала повторяется: генерация на Python медленнее, чем кодирование в ffmpeg.
+    second = bytearray()
+    for frame in range(sample_rate):
+        value = int(12000 * math.sin(2 * math.pi * 440 * frame / sample_rate) + rng.randint(-2000, 2000))
+        second += struct.pack("<h", value) * channels
+    with open(file_path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE")
+        f.write(b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_size,
+                                      block_size, 16))
+        f.write(b"data" + struct.pack("<I", data_size))
+        left = data_size
+        while left > 0:
+            chunk = second[:min(left, len(second))]
+            f.write(chunk)
+            left -= len(chunk)
+    return path.getsize(file_path)
@@ -0,0 +1,26 @@
+from os import path
+
+import pytest
+from aiohttp.web import Application
+
+from app.store.storage import layout
+from app.web.app import setup_app
+
+
+CONFIG_PATH = path.join(path.dirname(path.dirname(path.abspath(__file__))), "app", "config.yml")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch) -> Application:
+    """
+    Приложение без подключения к базе данных. Файлы приложения создаются во временной директории,
+    обращения к базе данных подменяются в тестах.
+    """
+    monkeypatch.chdir(tmp_path)
+    # Относительные пути директорий, созданных в предыдущих тестах, указывают на другие временные директории.
+    monkeypatch.setattr(layout, "_created_directories", set())
+    application = setup_app(CONFIG_PATH)
+    application.on_startup.clear()
+    application.on_shutdown.clear()
+    application.on_cleanup.clear()
+    return application
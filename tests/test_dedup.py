@@ -0,0 +1,87 @@
+from typing import List, Optional
+
+import pytest
+
+from app.mp3_files.models import Mp3ContentModel
+from app.wav_file.wav import WavFile
+
+
+@pytest.fixture
+def calls(app, monkeypatch) -> List[str]:
+    """
+    Подменяет обращения к таблицам "mp3_contents" и "mp3_files" и возвращает список вызовов.
+    """
+    made: List[str] = []
+    app["existing"] = None
+    app["concurrent"] = None
+
+    async def reuse(database, content_hash, params) -> Optional[Mp3ContentModel]:
+        made.append("reuse")
+        return app["existing"]
+
+    async def add_reference(database, content_hash, params, file_path) -> Mp3ContentModel:
+        made.append("add_reference")
+        return app["concurrent"] or Mp3ContentModel(id=1, file_path=file_path)
+
+    async def insert(user_id, file_path, filename, content_id=None, size=None, etag=None, uuid=None):
+        made.append(f"insert {file_path}")
+        return None
+
+    monkeypatch.setattr(Mp3ContentModel, "reuse", staticmethod(reuse))
+    monkeypatch.setattr(Mp3ContentModel, "add_reference", staticmethod(add_reference))
+    monkeypatch.setattr(app["mp3_file_writer"], "insert", insert)
+    return made
+
+
+def make_wav_file(app, monkeypatch, out_file) -> WavFile:
+    wav_file = WavFile("song", app, 1)
+    wav_file._dedup = True
+
+    async def convert_file(in_file, out, bounded=True):
+        out_file.write_bytes(b"mp3")
+        return 0
+
+    monkeypatch.setattr(wav_file, "_convert_file", convert_file)
+    return wav_file
+
+
+async def test_miss_is_counted_once(app, calls, monkeypatch, tmp_path):
+    out_file = tmp_path / "out.mp3"
+    wav_file = make_wav_file(app, monkeypatch, out_file)
+    assert await wav_file._convert_temp_file("in.wav", str(out_file)) == 0
+    await wav_file._save(str(out_file))
+    assert calls == ["reuse", "add_reference", f"insert {out_file}"]
+    assert (app["dedup_stats"].hits, app["dedup_stats"].misses) == (0, 1)
+
+
+async def test_concurrent_insert_reuses_existing_file(app, calls, monkeypatch, tmp_path):
+    out_file = tmp_path / "out.mp3"
+    app["concurrent"] = Mp3ContentModel(id=2, file_path="existing.mp3")
+    wav_file = make_wav_file(app, monkeypatch, out_file)
+    await wav_file._convert_temp_file("in.wav", str(out_file))
+    await wav_file._save(str(out_file))
+    assert calls == ["reuse", "add_reference", "insert existing.mp3"]
+    assert not out_file.exists()
+    # Конвертация уже выполнена, поэтому параллельная вставка не считается попаданием.
+    assert (app["dedup_stats"].hits, app["dedup_stats"].misses) == (0, 1)
+
+
+async def test_hit_skips_conversion(app, calls, monkeypatch, tmp_path):
+    out_file = tmp_path / "out.mp3"
+    app["existing"] = Mp3ContentModel(id=3, file_path="existing.mp3")
+    wav_file = make_wav_file(app, monkeypatch, out_file)
+    wav_file._received = 100
+    await wav_file._convert_temp_file("in.wav", str(out_file))
+    await wav_file._save(str(out_file))
+    assert calls == ["reuse", "insert existing.mp3"]
+    assert not out_file.exists()
+    assert (app["dedup_stats"].hits, app["dedup_stats"].misses, app["dedup_stats"].saved_bytes) == (1, 0, 100)
+
+
+async def test_streamed_conversion_is_a_miss(app, calls, monkeypatch, tmp_path):
+    out_file = tmp_path / "out.mp3"
+    out_file.write_bytes(b"mp3")
+    wav_file = make_wav_file(app, monkeypatch, out_file)
+    await wav_file._save(str(out_file))
+    assert calls == ["add_reference", f"insert {out_file}"]
+    assert (app["dedup_stats"].hits, app["dedup_stats"].misses) == (0, 1)
@@ -0,0 +1,169 @@
+from typing import Dict, Optional
+
+import pytest
+
+from app.mp3_files.cache import RecordMeta
+from app.store.storage import ObjectStream, StorageBackend, StoredObject
+
+URL = "/files.record?user_id=1&record_id=1"
+DATA = bytes(range(256)) * 4
+
+
+class MemoryObjectStream(ObjectStream):
+    def __init__(self, data: bytes):
+        self.size = len(data)
+        self._data = data
+
+    async def read(self, chunk_size: int) -> bytes:
+        chunk, self._data = self._data[:chunk_size], self._data[chunk_size:]
+        return chunk
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Объектное хранилище в памяти: файлы передаются потоком, без sendfile.
+    """
+
+    def __init__(self, objects: Dict[str, bytes]):
+        self.objects = objects
+        self.opened = []
+
+    async def output_path(self, name: str) -> str:
+        raise NotImplementedError
+
+    async def commit(self, partial: str, name: str) -> None:
+        raise NotImplementedError
+
+    async def stat(self, name: str) -> Optional[StoredObject]:
+        if name not in self.objects:
+            return None
+        return StoredObject(size=len(self.objects[name]), etag="stored")
+
+    async def open(self, name: str, offset: int = 0, length: Optional[int] = None) -> Optional[ObjectStream]:
+        if name not in self.objects:
+            return None
+        self.opened.append((offset, length))
+        data = self.objects[name]
+        return MemoryObjectStream(data[offset:] if length is None else data[offset:offset + length])
+
+    async def delete(self, name: str) -> None:
+        self.objects.pop(name, None)
+
+    def local_path(self, name: str) -> Optional[str]:
+        return None
+
+
+def serve_record(app, record: Optional[RecordMeta]):
+    async def get(user_id: int, record_id: int) -> Optional[RecordMeta]:
+        return record
+
+    app["record_cache"].get = get
+    app["record_cache"].invalidate = lambda user_id, record_id: None
+
+
+@pytest.fixture
+def storage(app) -> MemoryStorage:
+    app["storage"] = MemoryStorage({"a.mp3": DATA, "empty.mp3": b""})
+    return app["storage"]
+
+
+async def test_stream_whole_file(app, storage, aiohttp_client):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL)
+    assert response.status == 200
+    assert response.headers["ETag"] == '"abc"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == str(len(DATA))
+    assert await response.read() == DATA
+
+
+@pytest.mark.parametrize("range_header, start, stop", [
+    ("bytes=2-5", 2, 6),
+    ("bytes=1000-", 1000, len(DATA)),
+    ("bytes=-10", len(DATA) - 10, len(DATA)),
+    ("bytes=1020-5000", 1020, len(DATA)),
+])
+async def test_stream_range(app, storage, aiohttp_client, range_header, start, stop):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"Range": range_header})
+    assert response.status == 206
+    assert response.headers["Content-Range"] == f"bytes {start}-{stop - 1}/{len(DATA)}"
+    assert await response.read() == DATA[start:stop]
+    # Из хранилища запрашивается только нужная часть файла.
+    assert storage.opened == [(start, stop - start)]
+
+
+@pytest.mark.parametrize("range_header", ["bytes=5000-", "bytes=1024-1030"])
+async def test_unsatisfiable_range(app, storage, aiohttp_client, range_header):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"Range": range_header})
+    assert response.status == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(DATA)}"
+    assert storage.opened == []
+
+
+async def test_stream_empty_file(app, storage, aiohttp_client):
+    serve_record(app, RecordMeta(file_path="empty.mp3", filename="empty", size=0, etag="e"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL)
+    assert response.status == 200
+    assert await response.read() == b""
+
+
+async def test_size_is_taken_from_storage(app, storage, aiohttp_client):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=None, etag=None))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"Range": "bytes=-4"})
+    assert response.status == 206
+    assert response.headers["Content-Range"] == f"bytes {len(DATA) - 4}-{len(DATA) - 1}/{len(DATA)}"
+    assert "ETag" not in response.headers
+
+
+@pytest.mark.parametrize("if_none_match", ['"abc"', 'W/"abc"', '"other", "abc"', "*"])
+async def test_not_modified(app, storage, aiohttp_client, if_none_match):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"If-None-Match": if_none_match})
+    assert response.status == 304
+    assert response.headers["ETag"] == '"abc"'
+    assert storage.opened == []
+
+
+async def test_etag_mismatch_sends_file(app, storage, aiohttp_client):
+    serve_record(app, RecordMeta(file_path="a.mp3", filename="a", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"If-None-Match": '"other"'})
+    assert response.status == 200
+    assert await response.read() == DATA
+
+
+async def test_missing_object(app, storage, aiohttp_client):
+    serve_record(app, RecordMeta(file_path="gone.mp3", filename="gone", size=10, etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL)
+    assert response.status == 404
+
+
+async def test_missing_record(app, storage, aiohttp_client):
+    serve_record(app, None)
+    client = await aiohttp_client(app)
+    response = await client.get(URL)
+    assert response.status == 404
+
+
+async def test_local_file_range_and_not_modified(app, aiohttp_client, tmp_path):
+    file_path = tmp_path / "local.mp3"
+    file_path.write_bytes(DATA)
+    serve_record(app, RecordMeta(file_path=str(file_path), filename="local", size=len(DATA), etag="abc"))
+    client = await aiohttp_client(app)
+    response = await client.get(URL, headers={"Range": "bytes=10-19"})
+    assert response.status == 206
+    assert await response.read() == DATA[10:20]
+    response = await client.get(URL, headers={"If-None-Match": '"abc"'})
+    assert response.status == 304
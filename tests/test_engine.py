@@ -0,0 +1,121 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+import pytest
+import yaml
+from aiohttp.web_exceptions import HTTPServiceUnavailable
+
+from app.wav_file.engine import ConversionEngine
+from app.web.config import setup_converter_config
+
+
+async def run_queued(engine: ConversionEngine, jobs: List[Tuple[str, Optional[int], float]],
+                     delay: float = 0) -> List[str]:
+    """
+    Ставит конвертации jobs (название, пользователь, стоимость) в очередь, пока единственный слот занят,
+    и возвращает порядок, в котором они получили слот.
+    """
+    order: List[str] = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with engine.slot():
+            await release.wait()
+
+    async def job(name: str, user_id: Optional[int], cost: float):
+        async with engine.slot(user_id=user_id, cost=cost):
+            order.append(name)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = []
+    for name, user_id, cost in jobs:
+        tasks.append(asyncio.create_task(job(name, user_id, cost)))
+        await asyncio.sleep(delay)
+    await asyncio.sleep(0)
+    assert engine.waiting == len(jobs)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+async def test_shortest_job_first_within_user():
+    engine = ConversionEngine(max_concurrency=1, max_queue=10, retry_after=1)
+    order = await run_queued(engine, [("long", 1, 30), ("short", 1, 10), ("medium", 1, 20)])
+    assert order == ["short", "medium", "long"]
+
+
+async def test_users_are_interleaved():
+    engine = ConversionEngine(max_concurrency=1, max_queue=10, retry_after=1)
+    jobs = [(f"a{index}", 1, 10) for index in range(1, 5)] + [(f"b{index}", 2, 10) for index in range(1, 3)]
+    order = await run_queued(engine, jobs)
+    assert order == ["a1", "b1", "a2", "b2", "a3", "a4"]
+
+
+async def test_weight_gives_more_slots():
+    engine = ConversionEngine(max_concurrency=1, max_queue=10, retry_after=1, weights={1: 2.0})
+    # Пользователь 2 встает в очередь первым, но пользователь 1 с весом 2 получает вдвое больше слотов.
+    jobs = [(f"b{index}", 2, 10) for index in range(1, 5)] + [(f"a{index}", 1, 10) for index in range(1, 5)]
+    order = await run_queued(engine, jobs)
+    assert [name[0] for name in order[:6]].count("a") == 4
+    assert order[0] == "a1"
+
+
+async def test_aging_lets_long_job_run():
+    engine = ConversionEngine(max_concurrency=1, max_queue=10, retry_after=1, aging=1000)
+    order = await run_queued(engine, [("long", 1, 100), ("short", 1, 1)], delay=0.2)
+    assert order == ["long", "short"]
+
+
+async def test_full_queue_is_rejected():
+    engine = ConversionEngine(max_concurrency=1, max_queue=1, retry_after=7)
+    async with engine.slot():
+        waiter = asyncio.create_task(engine.slot().__aenter__())
+        await asyncio.sleep(0)
+        assert engine.waiting == 1
+        with pytest.raises(HTTPServiceUnavailable) as error:
+            async with engine.slot():
+                pass
+        assert error.value.headers["Retry-After"] == "7"
+        # Фоновые задачи ожидают слот без ограничения очереди.
+        background = asyncio.create_task(engine.slot(bounded=False).__aenter__())
+        await asyncio.sleep(0)
+        assert engine.waiting == 2
+        waiter.cancel()
+        background.cancel()
+        await asyncio.gather(waiter, background, return_exceptions=True)
+    assert engine.waiting == 0
+    assert engine.running == 0
+
+
+async def test_cancelled_waiter_gives_slot_to_next():
+    engine = ConversionEngine(max_concurrency=1, max_queue=10, retry_after=1)
+    order = []
+
+    async def job(name: str):
+        async with engine.slot(cost=1):
+            order.append(name)
+
+    async with engine.slot():
+        cancelled = asyncio.create_task(job("cancelled"))
+        waiting = asyncio.create_task(job("waiting"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+    await waiting
+    assert order == ["waiting"]
+    assert engine.running == 0
+
+
+@pytest.mark.parametrize("weight", [0, -1, "2", None])
+def test_invalid_weight_fails_at_startup(tmp_path, weight):
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.safe_dump({"converter": {"user_weights": {5: weight}}}))
+    with pytest.raises(ValueError, match="user 5"):
+        setup_converter_config(str(config_path))
+
+
+def test_positive_weights_are_accepted(tmp_path):
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.safe_dump({"converter": {"user_weights": {5: 2, 6: 0.5}}}))
+    assert setup_converter_config(str(config_path)).user_weights == {5: 2, 6: 0.5}
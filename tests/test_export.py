@@ -0,0 +1,90 @@
+import io
+import zipfile
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.mp3_files.export import ZIP64_LIMIT, ZipStream, write_zip
+from app.store.storage import LocalStorage
+
+MODIFIED = datetime(2023, 5, 17, 12, 30, 10)
+
+
+def add_entry(archive: ZipStream, out, name: str, data: bytes, size_hint: int = -1) -> None:
+    out.write(archive.start_entry(name, MODIFIED, len(data) if size_hint < 0 else size_hint))
+    out.write(data)
+    out.write(archive.end_entry(zlib.crc32(data), len(data)))
+
+
+def test_small_archive_is_readable():
+    out = io.BytesIO()
+    archive = ZipStream()
+    add_entry(archive, out, "first.mp3", b"a" * 1000)
+    add_entry(archive, out, "второй.mp3", b"")
+    out.write(archive.finish())
+    assert archive.offset == len(out.getvalue())
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["first.mp3", "второй.mp3"]
+        assert zf.read("first.mp3") == b"a" * 1000
+        assert zf.read("второй.mp3") == b""
+        assert zf.getinfo("first.mp3").date_time == (2023, 5, 17, 12, 30, 10)
+
+
+def test_zip64_entry_with_small_content():
+    # Размер файла известен только приблизительно: заголовок в формате ZIP64, а содержимое небольшое.
+    out = io.BytesIO()
+    archive = ZipStream()
+    add_entry(archive, out, "hinted.mp3", b"data", size_hint=ZIP64_LIMIT)
+    add_entry(archive, out, "plain.mp3", b"more")
+    out.write(archive.finish())
+    with zipfile.ZipFile(out) as zf:
+        assert zf.testzip() is None
+        assert zf.read("hinted.mp3") == b"data"
+        assert zf.read("plain.mp3") == b"more"
+
+
+def test_entry_and_offsets_above_4gb(tmp_path):
+    big = 5 * 1024 ** 3
+    file_path = tmp_path / "big.zip"
+    archive = ZipStream()
+    with open(file_path, "wb") as out:
+        out.write(archive.start_entry("big.mp3", MODIFIED, big))
+        # Содержимое первого файла не записывается (разреженный файл), CRC-32 нулевых байт не проверяется.
+        out.seek(big, io.SEEK_CUR)
+        out.write(archive.end_entry(0, big))
+        add_entry(archive, out, "after.mp3", b"tail")
+        out.write(archive.finish())
+        assert archive.offset == out.tell()
+    with zipfile.ZipFile(file_path) as zf:
+        assert zf.getinfo("big.mp3").file_size == big
+        after = zf.getinfo("after.mp3")
+        assert after.header_offset > ZIP64_LIMIT
+        assert zf.read("after.mp3") == b"tail"
+
+
+class Response:
+    def __init__(self):
+        self.body = io.BytesIO()
+
+    async def write(self, data: bytes) -> None:
+        self.body.write(data)
+
+
+async def test_write_zip_renames_duplicates_and_skips_missing(tmp_path):
+    first = tmp_path / "1.mp3"
+    second = tmp_path / "2.mp3"
+    first.write_bytes(b"first")
+    second.write_bytes(b"second")
+    files = [
+        SimpleNamespace(id=1, filename="song", file_path=str(first), created_at=MODIFIED),
+        SimpleNamespace(id=2, filename="gone", file_path=str(tmp_path / "gone.mp3"), created_at=MODIFIED),
+        SimpleNamespace(id=3, filename="song", file_path=str(second), created_at=None),
+    ]
+    response = Response()
+    await write_zip(response, LocalStorage(), files, chunk_size=2)
+    with zipfile.ZipFile(response.body) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["song.mp3", "song_3.mp3"]
+        assert zf.read("song.mp3") == b"first"
+        assert zf.read("song_3.mp3") == b"second"
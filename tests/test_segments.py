@@ -0,0 +1,90 @@
+import pytest
+
+from app.wav_file.header import WavHeader
+from app.wav_file.segments import Segment, iter_mp3_frames, join_segments, plan_segments, samples_per_frame
+
+
+def make_header(sample_rate: int, seconds: int, channels: int = 2) -> WavHeader:
+    return WavHeader(audio_format=1, channels=channels, sample_rate=sample_rate, bits_per_sample=16,
+                     block_align=channels * 2, data_offset=44, data_size=sample_rate * seconds * channels * 2)
+
+
+def mp3_frame(index: int, padding: bool = False) -> bytes:
+    """
+    MPEG-1 Layer III фрейм 128 кбит/с, 44.1 кГц (417 байт, 418 с байтом заполнения), данные которого
+    содержат номер фрейма.
+    """
+    header = bytes([0xFF, 0xFB, 0x92 if padding else 0x90, 0x00])
+    return header + bytes([index]) * (413 + padding)
+
+
+def kept_ranges(header: WavHeader, segments, out_sample_rate: int):
+    """
+    Возвращает диапазоны mp3 фреймов файла целиком, которые сегменты оставляют в результате.
+    """
+    frame = samples_per_frame(out_sample_rate)
+    ranges = []
+    for segment in segments:
+        start_sample = (segment.offset - header.data_offset) // header.block_align
+        start_frame = start_sample * out_sample_rate // (header.sample_rate * frame)
+        first = start_frame + segment.skip_frames
+        ranges.append((first, None if segment.keep_frames is None else first + segment.keep_frames))
+    return ranges
+
+
+@pytest.mark.parametrize("sample_rate, out_sample_rate", [(44100, 44100), (48000, 44100), (22050, 44100)])
+def test_segments_cover_file_without_gaps(sample_rate, out_sample_rate):
+    header = make_header(sample_rate, 600)
+    segments = plan_segments(header, out_sample_rate, 128000, 4)
+    assert len(segments) == 4
+    assert segments[0].offset == header.data_offset
+    assert segments[0].skip_frames == 0
+    assert segments[-1].keep_frames is None
+    for segment in segments:
+        assert (segment.offset - header.data_offset) % header.block_align == 0
+        assert segment.offset + segment.samples * header.block_align <= header.data_offset + header.data_size
+    ranges = kept_ranges(header, segments, out_sample_rate)
+    assert ranges[0][0] == 0
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    last = segments[-1]
+    assert last.offset + last.samples * header.block_align == header.data_offset + header.data_size
+
+
+def test_boundaries_fall_on_sample_and_frame_boundaries():
+    header = make_header(48000, 600)
+    segments = plan_segments(header, 44100, 128000, 3)
+    frame = samples_per_frame(44100)
+    for first, _ in kept_ranges(header, segments, 44100)[1:]:
+        # Граница сегмента в сэмплах исходного файла - целое число.
+        assert first * frame * 48000 % 44100 == 0
+
+
+def test_short_file_is_one_segment():
+    header = make_header(44100, 1)
+    assert plan_segments(header, 44100, 128000, 8) == [
+        Segment(offset=44, samples=44100, skip_frames=0, keep_frames=None)]
+
+
+def test_join_segments_drops_overlap_frames(tmp_path):
+    total, overlap, boundary = 40, 8, 16
+    frames = [mp3_frame(index, padding=index % 3 == 0) for index in range(total)]
+    first = tmp_path / "0.mp3"
+    second = tmp_path / "1.mp3"
+    # Каждый сегмент кодируется с перекрытием: первый - до boundary + overlap, второй - с boundary - overlap.
+    first.write_bytes(b"".join(frames[:boundary + overlap]))
+    second.write_bytes(b"".join(frames[boundary - overlap:]))
+    segments = [Segment(offset=0, samples=0, skip_frames=0, keep_frames=boundary),
+                Segment(offset=0, samples=0, skip_frames=overlap, keep_frames=None)]
+    out = tmp_path / "out.mp3"
+    join_segments([str(first), str(second)], segments, str(out))
+    assert out.read_bytes() == b"".join(frames)
+    with open(out, "rb") as f:
+        assert len(list(iter_mp3_frames(f))) == total
+
+
+def test_iter_mp3_frames_rejects_garbage(tmp_path):
+    file_path = tmp_path / "bad.mp3"
+    file_path.write_bytes(mp3_frame(0) + b"ID3\x00")
+    with open(file_path, "rb") as f, pytest.raises(ValueError):
+        list(iter_mp3_frames(f))
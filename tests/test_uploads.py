@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import hashlib
+from typing import Dict, List
+
+import aiofiles
+import pytest
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPConflict, HTTPNotFound
+
+from app.mp3_files.models import UploadSessionModel
+from app.mp3_files.uploads import UploadManager, parse_checksum
+
+
+class Content:
+    """
+    Тело запроса, которое отдается частями chunks. Исключение в списке возбуждается при чтении.
+    """
+
+    def __init__(self, *chunks):
+        self._chunks = list(chunks)
+
+    async def read(self, _: int) -> bytes:
+        if not self._chunks:
+            return b""
+        chunk = self._chunks.pop(0)
+        if isinstance(chunk, BaseException):
+            raise chunk
+        await asyncio.sleep(0)
+        return chunk
+
+
+@pytest.fixture
+def sessions(monkeypatch) -> Dict[int, UploadSessionModel]:
+    """
+    Сессии загрузки в памяти вместо таблицы upload_sessions.
+    """
+    rows: Dict[int, UploadSessionModel] = {}
+    # Блокировка строки сессии (SELECT ... FOR UPDATE SKIP LOCKED).
+    row_lock = asyncio.Lock()
+
+    def copy(row: UploadSessionModel, **changes) -> UploadSessionModel:
+        values = {name: getattr(row, name) for name in ("id", "filename", "size", "offset", "part_path", "user_id")}
+        return UploadSessionModel(**{**values, **changes})
+
+    async def insert_session(database, user_id, filename, size, part_path, expires_at):
+        rows[len(rows) + 1] = UploadSessionModel(id=len(rows) + 1, user_id=user_id, filename=filename, size=size,
+                                                 offset=0, part_path=part_path)
+        return copy(rows[len(rows)])
+
+    async def advance_offset(database, session_id, offset, expires_at, locked):
+        row = rows.get(session_id)
+        if row is None or row.offset != offset or row_lock.locked():
+            return None
+        async with row_lock:
+            row.offset = offset + await locked()
+            return copy(row)
+
+    async def delete_session(database, session_id):
+        return rows.pop(session_id, None)
+
+    monkeypatch.setattr(UploadSessionModel, "insert_session", staticmethod(insert_session))
+    monkeypatch.setattr(UploadSessionModel, "advance_offset", staticmethod(advance_offset))
+    monkeypatch.setattr(UploadSessionModel, "delete_session", staticmethod(delete_session))
+    return rows
+
+
+@pytest.fixture
+def manager(app, sessions) -> UploadManager:
+    return app["upload_manager"]
+
+
+def checksum(algorithm: str, data: bytes) -> str:
+    return f"{algorithm} {base64.b64encode(hashlib.new(algorithm, data).digest()).decode()}"
+
+
+def read_part(upload: UploadSessionModel) -> bytes:
+    with open(upload.part_path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("algorithm", ["md5", "sha1", "sha256", "SHA256"])
+def test_parse_checksum(algorithm):
+    assert parse_checksum(checksum(algorithm.lower(), b"data").replace(algorithm.lower(), algorithm)) == (
+        algorithm.lower(), hashlib.new(algorithm.lower(), b"data").digest())
+
+
+@pytest.mark.parametrize("value", [
+    "crc32 AAAAAA==",
+    "md5 not*base64",
+    "md5 " + base64.b64encode(b"short").decode(),
+    "sha1",
+])
+def test_parse_checksum_rejects_invalid_values(value):
+    with pytest.raises(HTTPBadRequest):
+        parse_checksum(value)
+
+
+async def test_chunks_are_appended_in_order(manager):
+    upload = await manager.create(1, "song", 10)
+    upload = await manager.write(upload, 0, Content(b"abc", b"de"))
+    assert upload.offset == 5
+    upload = await manager.write(upload, 5, Content(b"fghij"), parse_checksum(checksum("sha256", b"fghij")))
+    assert upload.offset == 10
+    assert read_part(upload) == b"abcdefghij"
+
+
+async def test_offset_mismatch_is_conflict(manager):
+    upload = await manager.create(1, "song", 10)
+    with pytest.raises(HTTPConflict):
+        await manager.write(upload, 3, Content(b"abc"))
+    assert read_part(upload) == b""
+
+
+async def test_checksum_mismatch_keeps_offset(manager, sessions):
+    upload = await manager.create(1, "song", 10)
+    upload = await manager.write(upload, 0, Content(b"abc"))
+    with pytest.raises(HTTPBadRequest):
+        await manager.write(upload, 3, Content(b"def"), parse_checksum(checksum("md5", b"xyz")))
+    assert sessions[upload.id].offset == 3
+    assert read_part(upload) == b"abc"
+
+
+async def test_chunk_beyond_declared_size_is_rejected(manager, sessions):
+    upload = await manager.create(1, "song", 4)
+    with pytest.raises(HTTPBadRequest):
+        await manager.write(upload, 0, Content(b"abc", b"de"))
+    assert sessions[upload.id].offset == 0
+    assert read_part(upload) == b""
+
+
+async def test_interrupted_chunk_keeps_received_bytes(manager, sessions):
+    upload = await manager.create(1, "song", 10)
+    with pytest.raises(ConnectionResetError):
+        await manager.write(upload, 0, Content(b"abc", ConnectionResetError()))
+    assert sessions[upload.id].offset == 3
+    assert read_part(upload) == b"abc"
+
+
+async def test_interrupted_chunk_with_checksum_is_discarded(manager, sessions):
+    upload = await manager.create(1, "song", 10)
+    with pytest.raises(ConnectionResetError):
+        await manager.write(upload, 0, Content(b"abc", ConnectionResetError()),
+                            parse_checksum(checksum("md5", b"abcdef")))
+    assert sessions[upload.id].offset == 0
+    assert read_part(upload) == b""
+
+
+async def test_concurrent_writes_accept_one_chunk(manager):
+    upload = await manager.create(1, "song", 10)
+    results: List[object] = await asyncio.gather(manager.write(upload, 0, Content(b"aaa", b"aa")),
+                                                 manager.write(upload, 0, Content(b"bbb")),
+                                                 return_exceptions=True)
+    conflicts = [result for result in results if isinstance(result, HTTPConflict)]
+    accepted = [result for result in results if isinstance(result, UploadSessionModel)]
+    assert len(conflicts) == 1 and len(accepted) == 1
+    assert read_part(upload) == (b"aaaaa" if accepted[0].offset == 5 else b"bbb")
+
+
+async def test_rejected_chunk_is_cut_from_part_file(manager, sessions):
+    upload = await manager.create(1, "song", 10)
+    upload = await manager.write(upload, 0, Content(b"abc"))
+    with pytest.raises(HTTPBadRequest):
+        await manager.write(upload, 3, Content(b"defg", b"hijk"))
+    assert read_part(upload) == b"abc"
+    # Следующая попытка пишет часть на то же место.
+    upload = await manager.write(upload, 3, Content(b"DEF"))
+    assert read_part(upload) == b"abcDEF"
+
+
+async def test_chunk_is_written_once(manager, monkeypatch):
+    opened = []
+    real_open = aiofiles.open
+
+    def spy(file, *args, **kwargs):
+        opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    upload = await manager.create(1, "song", 10)
+    monkeypatch.setattr(aiofiles, "open", spy)
+    await manager.write(upload, 0, Content(b"abc"))
+    # Часть записывается сразу в файл сессии, без промежуточного файла.
+    assert opened == [upload.part_path]
+
+
+async def test_finish_requires_whole_file(manager):
+    upload = await manager.create(1, "song", 10)
+    upload = await manager.write(upload, 0, Content(b"abc"))
+    with pytest.raises(HTTPConflict):
+        await manager.finish(upload)
+
+
+async def test_finish_of_deleted_session_is_not_found(manager, sessions):
+    upload = await manager.create(1, "song", 3)
+    upload = await manager.write(upload, 0, Content(b"abc"))
+    sessions.clear()
+    with pytest.raises(HTTPNotFound):
+        await manager.finish(upload)
+
+
+async def test_create_rejects_too_large_file(manager):
+    with pytest.raises(HTTPBadRequest):
+        await manager.create(1, "song", manager.max_size + 1)
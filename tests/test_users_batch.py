@@ -0,0 +1,55 @@
+import json
+from typing import List
+
+import pytest
+from sqlalchemy.exc import DataError
+
+from app.users.models import UserModel
+
+
+@pytest.fixture
+def inserts(monkeypatch) -> List[List[str]]:
+    """
+    Подменяет добавление пользователей: имена, начинающиеся с "bad", база данных отклоняет.
+    """
+    made: List[List[str]] = []
+
+    def check(usernames: List[str]) -> None:
+        made.append(usernames)
+        if any(username.startswith("bad") for username in usernames):
+            raise DataError("INSERT INTO users", {}, Exception("invalid byte sequence"))
+
+    async def add_users(database, usernames):
+        check(usernames)
+        return [UserModel(id=index, username=username) for index, username in enumerate(usernames, start=1)]
+
+    async def add_user(database, data):
+        check([data["username"]])
+        return UserModel(id=100, username=data["username"])
+
+    monkeypatch.setattr(UserModel, "add_users", staticmethod(add_users))
+    monkeypatch.setattr(UserModel, "add_user", staticmethod(add_user))
+    return made
+
+
+async def post_batch(app, aiohttp_client, items) -> List[dict]:
+    client = await aiohttp_client(app)
+    response = await client.post("/users.create_batch", data=json.dumps(items),
+                                 headers={"Content-Type": "application/json"})
+    assert response.status == 200
+    return [json.loads(line) for line in (await response.text()).splitlines()]
+
+
+async def test_control_characters_are_rejected_per_item(app, aiohttp_client, inserts):
+    lines = await post_batch(app, aiohttp_client, ["alice", "nul\u0000name", {"username": "tab\tname"}, "bob"])
+    assert [line["status"] for line in lines] == ["ok", "error", "error", "ok"]
+    assert lines[1]["errors"] == {"username": ["Field cannot contain control characters"]}
+    assert inserts == [["alice", "bob"]]
+
+
+async def test_rejected_batch_is_retried_one_by_one(app, aiohttp_client, inserts):
+    lines = await post_batch(app, aiohttp_client, ["alice", "bad", "bob"])
+    assert [line["status"] for line in lines] == ["ok", "error", "ok"]
+    assert lines[1]["errors"] == {"_schema": ["Failed to create user."]}
+    assert [line["data"]["username"] for line in lines if line["status"] == "ok"] == ["alice", "bob"]
+    assert inserts == [["alice", "bad", "bob"], ["alice"], ["bad"], ["bob"]]
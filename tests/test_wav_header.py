@@ -0,0 +1,77 @@
+import struct
+
+import pytest
+
+from app.wav_file.header import IncompleteWavHeaderError, WavHeaderError, parse_wav_header
+from tests.utils import wav_bytes
+
+
+def test_parses_pcm_header():
+    header = parse_wav_header(wav_bytes(b"\x00\x00" * 16000, channels=2, sample_rate=8000))
+    assert header.audio_format == 1
+    assert header.channels == 2
+    assert header.sample_rate == 8000
+    assert header.bits_per_sample == 16
+    assert header.block_align == 4
+    assert header.data_offset == 44
+    assert header.data_size == 32000
+    assert header.frames == 8000
+    assert header.duration == 1.0
+
+
+def test_skips_chunks_before_data_with_padding():
+    # Чанк нечетного размера дополняется одним байтом.
+    extra = b"LIST" + struct.pack("<I", 3) + b"abc" + b"\x00"
+    header = parse_wav_header(wav_bytes(b"\x00\x00", extra_chunks=extra))
+    assert header.data_offset == 44 + len(extra)
+    assert header.data_size == 2
+
+
+def test_extensible_format_uses_subformat():
+    fmt = struct.pack("<HHIIHH", 0xFFFE, 2, 48000, 48000 * 8, 8, 32)
+    fmt += struct.pack("<HHI", 22, 32, 3) + struct.pack("<H", 3) + b"\x00" * 14
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", 8) + b"\x00" * 8
+    header = parse_wav_header(b"RIFF" + struct.pack("<I", len(body)) + body)
+    assert header.audio_format == 3
+    assert header.bits_per_sample == 32
+
+
+@pytest.mark.parametrize("data_size", [0, 0xFFFFFFFF])
+def test_unknown_data_size(data_size):
+    header = parse_wav_header(wav_bytes(b"", data_size=data_size))
+    assert header.data_size is None
+    assert header.frames is None
+    assert header.duration is None
+
+
+@pytest.mark.parametrize("length", [0, 3, 11, 20, 43])
+def test_truncated_header_is_incomplete(length):
+    with pytest.raises(IncompleteWavHeaderError):
+        parse_wav_header(wav_bytes(b"\x00\x00")[:length])
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"ID3\x03" + b"\x00" * 40, "not a RIFF file"),
+    (b"RIFF\x00\x00\x00\x00AVI " + b"\x00" * 32, "not a WAVE file"),
+    (b"RIFF\x00\x00\x00\x00WAVEdata\x00\x00\x00\x00", "data chunk before fmt chunk"),
+])
+def test_rejects_non_wav(data, message):
+    with pytest.raises(WavHeaderError, match=message):
+        parse_wav_header(data)
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"bits": 12}, "unsupported bit depth"),
+    ({"channels": 9}, "unsupported number of channels"),
+    ({"sample_rate": 500}, "unsupported sample rate"),
+])
+def test_rejects_unsupported_format(kwargs, message):
+    with pytest.raises(WavHeaderError, match=message):
+        parse_wav_header(wav_bytes(b"", **kwargs))
+
+
+def test_rejects_invalid_block_align():
+    data = bytearray(wav_bytes(b"\x00\x00"))
+    struct.pack_into("<H", data, 32, 3)
+    with pytest.raises(WavHeaderError, match="invalid block align"):
+        parse_wav_header(bytes(data))
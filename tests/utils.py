@@ -0,0 +1,14 @@
+import struct
+
+
+def wav_bytes(pcm: bytes = b"", channels: int = 1, sample_rate: int = 8000, bits: int = 16,
+              data_size: int = -1, extra_chunks: bytes = b"") -> bytes:
+    """
+    Возвращает WAV файл с PCM данными pcm. data_size - значение размера в data чанке (по умолчанию len(pcm)).
+    """
+    block_align = channels * bits // 8
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    size = len(pcm) if data_size < 0 else data_size
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + extra_chunks + \
+        b"data" + struct.pack("<I", size) + pcm
+    return b"RIFF" + struct.pack("<I", len(body)) + body